@@ -0,0 +1,166 @@
+import sys
+import os
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import argparse
+import math
+import random
+from results_store import HIGHER_IS_BETTER, TRIAL_METRICS, ResultsStore
+
+
+def median(values):
+    ordered = sorted(values)
+    n = len(ordered)
+    mid = n // 2
+    return ordered[mid] if n % 2 else (ordered[mid - 1] + ordered[mid]) / 2
+
+
+def mann_whitney_u(a, b):
+    """Two-sided Mann-Whitney U with tie-corrected normal approximation. Returns (U, p)."""
+    n1, n2 = len(a), len(b)
+    combined = sorted([(x, 0) for x in a] + [(x, 1) for x in b])
+    ranks = [0.0] * len(combined)
+    tie_term = 0
+    i = 0
+    while i < len(combined):
+        j = i
+        while j + 1 < len(combined) and combined[j + 1][0] == combined[i][0]:
+            j += 1
+        avg_rank = (i + j) / 2 + 1
+        for k in range(i, j + 1):
+            ranks[k] = avg_rank
+        t = j - i + 1
+        tie_term += t ** 3 - t
+        i = j + 1
+
+    r1 = sum(r for r, (_, group) in zip(ranks, combined) if group == 0)
+    u1 = r1 - n1 * (n1 + 1) / 2
+    n = n1 + n2
+    mu = n1 * n2 / 2
+    sigma = math.sqrt(n1 * n2 / 12 * ((n + 1) - tie_term / (n * (n - 1))))
+    if sigma == 0:
+        return u1, 1.0
+    z = (abs(u1 - mu) - 0.5) / sigma
+    return u1, math.erfc(max(z, 0) / math.sqrt(2))
+
+
+def bootstrap_median_diff(a, b, n_boot=1000, confidence=0.95, seed=0):
+    """Percentile bootstrap CI for median(b) - median(a)."""
+    rng = random.Random(seed)
+    diffs = sorted(
+        median(rng.choices(b, k=len(b))) - median(rng.choices(a, k=len(a)))
+        for _ in range(n_boot)
+    )
+    lo = diffs[int((1 - confidence) / 2 * n_boot)]
+    hi = diffs[min(int((1 + confidence) / 2 * n_boot), n_boot - 1)]
+    return lo, hi
+
+
+def compare_runs(store, run_a, run_b, threshold=0.05, alpha=0.05, n_boot=1000):
+    """
+    Compares the per-trial metrics of two runs. A metric regresses when the
+    median moves the wrong way by more than `threshold` (relative) and the
+    Mann-Whitney test says the shift is significant at `alpha`. Inter-token
+    latency is tested on each trial's median, not on pooled tokens: tokens of
+    one generation are correlated, so pooling them overstates the sample
+    size and flags noise as significant. Runs served
+    differently (model host vs in-process) time different things, so they
+    are not compared.
+    """
+    serving_a, serving_b = store.run(run_a)[-1], store.run(run_b)[-1]
+    if serving_a != serving_b:
+        raise ValueError(f"Run {run_a} was served {serving_a or 'unknown'} and run {run_b} "
+                         f"{serving_b or 'unknown'}; rerun one of them so both use the same mode "
+                         f"(latency_check.py --no-host loads in-process)")
+    rows = []
+    for metric in TRIAL_METRICS:
+        a, b = store.samples(run_a, metric), store.samples(run_b, metric)
+        if len(a) < 2 or len(b) < 2:
+            continue
+        med_a, med_b = median(a), median(b)
+        change = (med_b - med_a) / med_a if med_a else 0.0
+        _, p = mann_whitney_u(a, b)
+        lo, hi = bootstrap_median_diff(a, b, n_boot)
+        worse = -change if metric in HIGHER_IS_BETTER else change
+        if p < alpha and worse > threshold:
+            verdict = "REGRESSION"
+        elif p < alpha and worse < -threshold:
+            verdict = "improved"
+        else:
+            verdict = "no change"
+        rows.append({"metric": metric, "n_a": len(a), "n_b": len(b), "median_a": med_a, "median_b": med_b,
+                     "change": change, "p_value": p, "ci": (lo, hi), "verdict": verdict})
+    return rows
+
+
+def model_name(model_path, model_ref):
+    # Runs recorded before model_ref only know their base; an adapter run among them looks like the base
+    return model_ref or f"{model_path} (adapter unknown)"
+
+
+def print_runs(store):
+    print(f"  {'Run':>4}  {'When':<19}  {'Commit':<9} {'Backend':<7} {'Serving':<10} Model")
+    for run_id, created_at, label, model_path, model_ref, backend, commit, sampler, trials, serving in store.runs():
+        print(f"  {run_id:>4}  {created_at:<19}  {commit:<9} {backend:<7} {serving or 'unknown':<10} "
+              f"{model_name(model_path, model_ref)} ({label}, {trials} trials, {sampler})")
+
+
+def print_comparison(store, run_a, run_b, rows):
+    for tag, run_id in (("A", run_a), ("B", run_b)):
+        _, created_at, label, model_path, model_ref, adapter_path, backend, commit, sampler, serving = store.run(run_id)
+        lora = f" + {adapter_path}" if adapter_path else ""
+        print(f"  {tag}: run {run_id} · {label} · {model_name(model_path, model_ref)}{lora} · {commit} · "
+              f"{serving or 'unknown'} · {sampler}")
+    print(f"\n  {'Metric':<12} {'Median A':>10} {'Median B':>10} {'Δ':>8} {'p':>8}  {'95% CI (B-A)':<22} Verdict")
+    print(f"  {'-'*88}")
+    for r in rows:
+        ci = f"[{r['ci'][0]:.3f}, {r['ci'][1]:.3f}]"
+        print(f"  {r['metric']:<12} {r['median_a']:>10.3f} {r['median_b']:>10.3f} {r['change']:>+7.1%} "
+              f"{r['p_value']:>8.4f}  {ci:<22} {r['verdict']}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare stored benchmark runs for regressions.")
+    parser.add_argument("--store", default="results/benchmarks.sqlite")
+    sub = parser.add_subparsers(dest="command", required=True)
+    sub.add_parser("list", help="Show recent runs")
+    cmp_parser = sub.add_parser("compare", help="Compare run B against baseline run A")
+    cmp_parser.add_argument("run_a", nargs="?", type=int)
+    cmp_parser.add_argument("run_b", nargs="?", type=int)
+    cmp_parser.add_argument("--model-a", help="Use the latest run of this model (as given to latency_check --model) as A")
+    cmp_parser.add_argument("--model-b", help="Use the latest run of this model (as given to latency_check --model) as B")
+    cmp_parser.add_argument("--threshold", type=float, default=0.05, help="Relative median change that counts")
+    cmp_parser.add_argument("--alpha", type=float, default=0.05)
+    cmp_parser.add_argument("--bootstrap", type=int, default=1000)
+    args = parser.parse_args()
+
+    store = ResultsStore(args.store)
+
+    if args.command == "list":
+        print_runs(store)
+        sys.exit(0)
+
+    # Lookups match the model ref, so an adapter's runs are never taken for its base model's or vice versa
+    try:
+        if args.model_a and args.run_a is None and args.run_b is None and not args.model_b:
+            # Same model: previous run as baseline, latest as candidate
+            run_a, run_b = store.latest_run_id(args.model_a, offset=1), store.latest_run_id(args.model_a)
+        else:
+            run_a = args.run_a if args.run_a is not None else args.model_a and store.latest_run_id(args.model_a)
+            run_b = args.run_b if args.run_b is not None else args.model_b and store.latest_run_id(args.model_b)
+    except KeyError as e:
+        parser.error(e.args[0])
+    if not run_a or not run_b:
+        parser.error("give two run ids, --model-a/--model-b, or --model-a alone for previous vs latest")
+
+    try:
+        rows = compare_runs(store, run_a, run_b, args.threshold, args.alpha, args.bootstrap)
+    except ValueError as e:
+        parser.error(str(e))
+    print_comparison(store, run_a, run_b, rows)
+
+    regressions = [r["metric"] for r in rows if r["verdict"] == "REGRESSION"]
+    if regressions:
+        print(f"\n❌ Regression in: {', '.join(regressions)}")
+        sys.exit(1)
+    print("\n✅ No regressions past threshold")
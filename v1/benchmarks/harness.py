@@ -0,0 +1,237 @@
+# benchmarks/harness.py
+import gc
+import json
+import os
+import resource
+import sys
+import threading
+import time
+
+from scripts.backends import get_backend
+from scripts.streaming import collect_until_stop
+from scripts.utils import SAMPLER_PARAMS, clean_response, format_prompt, parse_response
+
+
+def current_rss():
+    """Resident set size in bytes, or None where /proc is unavailable (macOS)."""
+    try:
+        with open("/proc/self/statm", "r") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        return None
+
+
+def max_rss():
+    # ru_maxrss is KiB on Linux and bytes on macOS
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak if sys.platform == "darwin" else peak * 1024
+
+
+class RSSSampler:
+    """Samples process RSS on a background thread while a block runs."""
+
+    def __init__(self, interval=0.05):
+        self.interval = interval
+        self.samples = []
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def _run(self):
+        while not self._stop.is_set():
+            rss = current_rss()
+            if rss is not None:
+                self.samples.append(rss)
+            self._stop.wait(self.interval)
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+
+    @property
+    def peak(self):
+        return max(self.samples) if self.samples else max_rss()
+
+
+def percentile(values, q):
+    """Linear-interpolated percentile, q in [0, 100]."""
+    if not values:
+        return None
+    ordered = sorted(values)
+    k = (len(ordered) - 1) * q / 100
+    lo = int(k)
+    hi = min(lo + 1, len(ordered) - 1)
+    return ordered[lo] + (ordered[hi] - ordered[lo]) * (k - lo)
+
+
+def _timed(segments, stamps):
+    try:
+        for segment in segments:
+            stamps.append(time.perf_counter())
+            yield segment
+    finally:
+        segments.close()
+
+
+def run_trial(backend, prompt, max_tokens, sampler_params=SAMPLER_PARAMS):
+    """One generation with per-token timestamps. Token counts come from the backend, not word splits."""
+    text = format_prompt(backend.tokenizer, prompt)
+    prompt_tokens = len(backend.encode(text))
+    stamps = []
+    start = time.perf_counter()
+    result = collect_until_stop(_timed(backend.stream(text, max_tokens, sampler_params), stamps), max_tokens)
+    end = time.perf_counter()
+
+    ttft = stamps[0] - start if stamps else None
+    itl = [b - a for a, b in zip(stamps, stamps[1:])]
+    decode_time = stamps[-1] - stamps[0] if len(stamps) > 1 else None
+    return {
+        "prompt_tokens": prompt_tokens,
+        "generated_tokens": result.tokens,
+        "tokens_saved": result.tokens_saved,
+        "total_s": end - start,
+        "ttft_s": ttft,
+        "prefill_tps": prompt_tokens / ttft if ttft else None,
+        "decode_tps": (len(stamps) - 1) / decode_time if decode_time else None,
+        "itl_s": itl,
+        "response": clean_response(result.text),
+    }
+
+
+def to_cached(record):
+    """A trial in the response cache's entry shape (inference.Generation), plus its per-token timings."""
+    return {"text": record["response"], "tokens": record["generated_tokens"], "elapsed": record["total_s"],
+            "ttft": record["ttft_s"], "tokens_saved": record["tokens_saved"],
+            "prompt_tokens": record["prompt_tokens"], "itl_s": record["itl_s"]}
+
+
+def from_cached(entry, prompt_tokens):
+    """Trial record from a cache entry; entries the UI wrote have no per-token timings."""
+    itl = entry.get("itl_s", [])
+    ttft = entry["ttft"]
+    return {
+        "prompt_tokens": prompt_tokens,
+        "generated_tokens": entry["tokens"],
+        "tokens_saved": entry["tokens_saved"],
+        "total_s": entry["elapsed"],
+        "ttft_s": ttft,
+        "prefill_tps": prompt_tokens / ttft if ttft else None,
+        "decode_tps": len(itl) / sum(itl) if itl and sum(itl) else None,
+        "itl_s": itl,
+        "response": entry["text"],
+    }
+
+
+def summarize(trials):
+    itl = [x for t in trials for x in t["itl_s"]]
+    ttft = [t["ttft_s"] for t in trials if t["ttft_s"] is not None]
+    decode_tokens = sum(max(t["generated_tokens"] - 1, 0) for t in trials)
+    decode_time = sum(sum(t["itl_s"]) for t in trials)
+    prefill_tokens = sum(t["prompt_tokens"] for t in trials)
+    return {
+        "trials": len(trials),
+        "generated_tokens": sum(t["generated_tokens"] for t in trials),
+        "tokens_saved": sum(t["tokens_saved"] for t in trials),
+        "ttft_p50_s": percentile(ttft, 50),
+        "ttft_p95_s": percentile(ttft, 95),
+        "itl_p50_ms": percentile(itl, 50) * 1000 if itl else None,
+        "itl_p95_ms": percentile(itl, 95) * 1000 if itl else None,
+        "itl_p99_ms": percentile(itl, 99) * 1000 if itl else None,
+        "decode_tps": decode_tokens / decode_time if decode_time else None,
+        "prefill_tps": prefill_tokens / sum(ttft) if ttft else None,
+        "structured": sum(t["structured"] for t in trials),
+    }
+
+
+def measure_load(backend_name, model_path, host=None, **backend_kwargs):
+    """
+    Loads the model twice: the first load is cold (weights read from disk or
+    downloaded), the second is warm (OS page cache hot). Returns the second instance.
+    Through a model host, "cold" is the first attach (a real load only if the
+    host didn't have the model yet) and "warm" attaches to the resident copy.
+    """
+    load = host.backend if host is not None else get_backend
+    start = time.perf_counter()
+    backend = load(backend_name, model_path, **backend_kwargs)
+    cold = time.perf_counter() - start
+
+    del backend
+    gc.collect()
+
+    start = time.perf_counter()
+    backend = load(backend_name, model_path, **backend_kwargs)
+    warm = time.perf_counter() - start
+    return backend, {"cold_s": cold, "warm_s": warm, "host": host is not None}
+
+
+def benchmark_model(backend_name, model_path, label, prompts, trials=3, warmup=1, max_tokens=500,
+                    on_trial=None, cache=None, adapter_path=None, host=None, **backend_kwargs):
+    """
+    Cold/warm load, warmup, then `trials` timed passes over `prompts`. With a
+    ResponseCache, repeated (model, prompt, trial) combinations are replayed
+    from it and flagged "cached" — their timings are not fresh measurements.
+    With a running model host the model is served from there, so this
+    process's RSS says nothing about it and is reported as n/a.
+    """
+    with RSSSampler() as rss:
+        if adapter_path:
+            backend_kwargs["adapter_path"] = adapter_path
+        backend, load = measure_load(backend_name, model_path, host, **backend_kwargs)
+        rss_after_load = current_rss() if host is None else None
+        fingerprint = cache.model_fingerprint(backend, adapter_path) if cache is not None else None
+
+        # Warmup compiles kernels / fills allocator pools; not recorded
+        for _ in range(warmup):
+            for prompt in prompts:
+                run_trial(backend, prompt, max_tokens)
+
+        backend.reset_peak_memory()
+        records = []
+        for trial in range(trials):
+            for i, prompt in enumerate(prompts):
+                record = None
+                if cache:
+                    # Same key as the UI: the formatted prompt, so template changes invalidate entries
+                    text = format_prompt(backend.tokenizer, prompt)
+                    key = cache.key(fingerprint, text, SAMPLER_PARAMS, max_tokens, seed=trial)
+                    entry = cache.get(key)
+                    if entry is not None:
+                        record = from_cached(entry, len(backend.encode(text)))
+                        record["cached"] = True
+                if record is None:
+                    backend.seed(trial)
+                    record = run_trial(backend, prompt, max_tokens)
+                    if cache:
+                        cache.put(key, to_cached(record))
+                    record["cached"] = False
+                record.update({"prompt_index": i, "trial": trial,
+                               "structured": parse_response(record["response"]).structured})
+                records.append(record)
+                if on_trial is not None:
+                    on_trial(record)
+
+    summary = summarize(records)
+    device_peak = backend.peak_memory()
+    return {
+        "label": label,
+        "model_path": model_path,
+        "adapter_path": adapter_path,
+        "backend": backend_name,
+        "load": load,
+        "memory": {
+            "rss_after_load_bytes": rss_after_load,
+            "rss_peak_bytes": rss.peak if host is None else None,
+            "device_peak_bytes": device_peak,
+        },
+        "summary": summary,
+        "trials": records,
+    }
+
+
+def write_json(path, results):
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    with open(path, "w") as f:
+        json.dump(results, f, indent=2)
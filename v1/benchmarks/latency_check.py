@@ -2,10 +2,14 @@ import sys
 import os
 sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 
+import argparse
 import time
-import mlx.core as mx
-from mlx_lm import load, generate
-from scripts.utils import has_structure, format_prompt, clean_response, get_sampler
+from harness import benchmark_model, write_json
+from results_store import ResultsStore
+from scripts.artifacts import ArtifactStore
+from scripts.backends import BACKENDS
+from scripts.response_cache import ResponseCache
+from scripts.utils import SAMPLER_PARAMS
 
 TEST_PROMPTS = [
     "Kafka consumer lag spiking to 48 hours under peak load with strict per-user event ordering. Recover throughput without violating ordering constraints.",
@@ -13,82 +17,152 @@ TEST_PROMPTS = [
     "A single malformed event repeatedly crashing Kafka consumers and blocking the entire partition from progressing. Isolate and handle poison pill messages without manual intervention or partition stall."
 ]
 
+MODELS = [
+    ("mlx-community/Llama-3.2-3B-Instruct-4bit", "Vanilla Llama 3.2 3B"),
+    ("models/neural-edge-3b", "Neural Edge 3B (Fine-tuned)"),
+]
 
-def run_benchmark(model_path, label):
-    print(f"\n{'='*60}")
-    print(f"  MODEL: {label}")
-    print(f"  PATH:  {model_path}")
-    print(f"{'='*60}")
 
-    model, tokenizer = load(model_path)
-    sampler = get_sampler()
+def _gb(n):
+    return f"{n / 1e9:.2f}" if n is not None else "n/a"
 
-    total_tokens = 0
-    total_time = 0
-    responses = []
 
-    for i, prompt in enumerate(TEST_PROMPTS):
-        print(f"\n── Prompt {i+1} ──────────────────────────────────────────")
-        print(f"Q: {prompt}\n")
+def _fmt(x, spec):
+    return format(x, spec) if x is not None else format("n/a", ">" + spec.split(".")[0])
 
-        start = time.time()
-        response = generate(model, tokenizer, prompt=format_prompt(tokenizer, prompt), max_tokens=500, sampler=sampler)
-        elapsed = time.time() - start
 
-        response = clean_response(response)
-        token_count = len(response.split())
-        tps = token_count / elapsed
-        total_tokens += token_count
-        total_time += elapsed
-        responses.append(response)
+def print_trial(record):
+    if record["trial"] == 0:
+        print(f"\n── Prompt {record['prompt_index']+1} ──────────────────────────────────────────")
+        print(f"Q: {TEST_PROMPTS[record['prompt_index']]}\n")
+        print(record["response"])
+    structured = "✅ Structured" if record["structured"] else "❌ Unstructured"
+    cached = " | ♻️  cached" if record["cached"] else ""
+    print(f"\n⏱  Trial {record['trial']+1}: {record['total_s']:.2f}s | TTFT: {_fmt(record['ttft_s'], '.3f')}s | "
+          f"Decode: {_fmt(record['decode_tps'], '.1f')} tok/s | Tokens: {record['generated_tokens']} | {structured}{cached}")
 
-        print(response)
-        structured = "✅ Structured" if has_structure(response) else "❌ Unstructured"
-        print(f"\n⏱  Time: {elapsed:.2f}s | Tokens/sec: {tps:.1f} | Format: {structured}")
 
-    peak_mem = mx.device_info()["max_recommended_working_set_size"] / 1e9
-    avg_tps = total_tokens / total_time
-    structured_count = sum(has_structure(r) for r in responses)
+def run_benchmark(model_ref, label, args, cache=None, store=None, host=None):
+    model_path, adapter_path = store.resolve(model_ref) if store is not None else (model_ref, None)
+    print(f"\n{'='*60}")
+    print(f"  MODEL: {label}")
+    if model_ref != model_path:
+        print(f"  REF:   {model_ref}")
+    print(f"  PATH:  {model_path}")
+    if adapter_path:
+        print(f"  LORA:  {adapter_path}")
+    print(f"{'='*60}")
+
+    backend_kwargs = {}
+    if args.backend == "fake":
+        backend_kwargs = {"prefill_delay": args.fake_prefill_ms / 1000, "decode_delay": args.fake_decode_ms / 1000}
+
+    result = benchmark_model(args.backend, model_path, label, TEST_PROMPTS, trials=args.trials,
+                             warmup=args.warmup, max_tokens=args.max_tokens, on_trial=print_trial,
+                             cache=cache, adapter_path=adapter_path, host=host, **backend_kwargs)
+    # The run history keys on what was asked for; an adapter shares model_path with its base
+    result["model_ref"] = model_ref
+    s, load, mem = result["summary"], result["load"], result["memory"]
 
     print(f"\n{'='*60}")
     print(f"  SUMMARY — {label}")
-    print(f"  Avg Tokens/sec      : {avg_tps:.1f}")
-    print(f"  Peak Memory         : {peak_mem:.2f} GB")
-    print(f"  Structured responses: {structured_count}/{len(responses)}")
+    via = " (model host)" if load["host"] else ""
+    print(f"  Load (cold / warm)  : {load['cold_s']:.2f}s / {load['warm_s']:.2f}s{via}")
+    print(f"  TTFT p50 / p95      : {_fmt(s['ttft_p50_s'], '.3f')}s / {_fmt(s['ttft_p95_s'], '.3f')}s")
+    print(f"  ITL p50 / p95 / p99 : {_fmt(s['itl_p50_ms'], '.1f')} / {_fmt(s['itl_p95_ms'], '.1f')} / {_fmt(s['itl_p99_ms'], '.1f')} ms")
+    print(f"  Prefill tokens/sec  : {_fmt(s['prefill_tps'], '.1f')}")
+    print(f"  Decode tokens/sec   : {_fmt(s['decode_tps'], '.1f')}")
+    print(f"  Peak RSS            : {_gb(mem['rss_peak_bytes'])} GB")
+    print(f"  Peak device memory  : {_gb(mem['device_peak_bytes'])} GB")
+    print(f"  Structured responses: {s['structured']}/{s['trials']}")
+    print(f"  Tokens saved (stop) : {s['tokens_saved']}")
     print(f"{'='*60}\n")
 
-    return avg_tps, peak_mem, structured_count, responses
+    return result
 
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Before/after latency and format benchmark.")
+    parser.add_argument("--backend", choices=sorted(BACKENDS), default="mlx")
+    parser.add_argument("--trials", type=int, default=3)
+    parser.add_argument("--warmup", type=int, default=1)
+    parser.add_argument("--max-tokens", type=int, default=500)
+    parser.add_argument("--json", default="results/benchmark_results.json")
+    parser.add_argument("--store", default="results/benchmarks.sqlite", help="Run history for benchmarks/compare.py")
+    parser.add_argument("--no-store", action="store_true")
+    parser.add_argument("--cache", action="store_true",
+                        help="Replay repeated generations from the response cache (timings are then not real)")
+    parser.add_argument("--cache-path", default="data/cache/responses.sqlite")
+    parser.add_argument("--model", default=MODELS[1][0],
+                        help="Fine-tuned model: a path, or experiment:<id> / artifact:<id> from the artifact store")
+    parser.add_argument("--artifacts", default=None, help="Artifact store root (default: $NED_ARTIFACTS or models/store)")
+    parser.add_argument("--no-host", action="store_true",
+                        help="Load models in this process even if scripts/model_host.py is running")
+    parser.add_argument("--fake-prefill-ms", type=float, default=0.05, help="Per prompt token, fake backend only")
+    parser.add_argument("--fake-decode-ms", type=float, default=25.0, help="Per generated token, fake backend only")
+    args = parser.parse_args()
+
     print("\n🔬 NEURAL EDGE DISTILLER — Before/After Benchmark")
     print("Comparing vanilla 3B vs fine-tuned Neural Edge 3B\n")
 
-    vanilla_tps, vanilla_mem, vanilla_struct, vanilla_responses = run_benchmark(
-        "mlx-community/Llama-3.2-3B-Instruct-4bit",
-        "Vanilla Llama 3.2 3B"
-    )
-
-    finetuned_tps, finetuned_mem, finetuned_struct, finetuned_responses = run_benchmark(
-        "models/neural-edge-3b",
-        "Neural Edge 3B (Fine-tuned)"
-    )
+    # The cache is off by default: a cached trial measures a SQLite lookup, not the model
+    cache = ResponseCache(args.cache_path) if args.cache else None
+    store = ArtifactStore(args.artifacts) if args.model.startswith(("experiment:", "artifact:")) else None
+    host = None
+    if not args.no_host:
+        from scripts.model_host import ModelHostClient
+        host = ModelHostClient()
+        host = host if host.available() else None
+        print(f"Model host: {host.address}" if host else "Model host not running; loading models in-process")
+    models = [MODELS[0], (args.model, MODELS[1][1])]
+    vanilla, finetuned = (run_benchmark(path, label, args, cache, store, host) for path, label in models)
+    v, f = vanilla["summary"], finetuned["summary"]
 
     print("\n" + "="*60)
     print("  FINAL COMPARISON")
     print("="*60)
     print(f"  {'Metric':<28} {'Vanilla 3B':>12} {'Neural Edge':>12}")
     print(f"  {'-'*54}")
-    print(f"  {'Avg Tokens/sec':<28} {vanilla_tps:>11.1f} {finetuned_tps:>11.1f}")
-    print(f"  {'Peak Memory (GB)':<28} {vanilla_mem:>11.2f} {finetuned_mem:>11.2f}")
-    print(f"  {'Structured responses':<28} {f'{vanilla_struct}/3':>12} {f'{finetuned_struct}/3':>12}")
+    print(f"  {'Decode tokens/sec':<28} {_fmt(v['decode_tps'], '11.1f')} {_fmt(f['decode_tps'], '11.1f')}")
+    print(f"  {'TTFT p50 (s)':<28} {_fmt(v['ttft_p50_s'], '11.3f')} {_fmt(f['ttft_p50_s'], '11.3f')}")
+    print(f"  {'ITL p95 (ms)':<28} {_fmt(v['itl_p95_ms'], '11.1f')} {_fmt(f['itl_p95_ms'], '11.1f')}")
+    print(f"  {'Peak RSS (GB)':<28} {_gb(vanilla['memory']['rss_peak_bytes']):>11} {_gb(finetuned['memory']['rss_peak_bytes']):>11}")
+    v_struct = f"{v['structured']}/{v['trials']}"
+    f_struct = f"{f['structured']}/{f['trials']}"
+    print(f"  {'Structured responses':<28} {v_struct:>12} {f_struct:>12}")
     print("="*60)
 
     print("\n📊 FORMAT QUALITY PER PROMPT")
     print("-"*60)
     for i in range(len(TEST_PROMPTS)):
-        v = "✅" if has_structure(vanilla_responses[i]) else "❌"
-        f = "✅" if has_structure(finetuned_responses[i]) else "❌"
-        print(f"  Prompt {i+1}: Vanilla={v}  Neural Edge={f}")
+        v_ok = all(t["structured"] for t in vanilla["trials"] if t["prompt_index"] == i)
+        f_ok = all(t["structured"] for t in finetuned["trials"] if t["prompt_index"] == i)
+        print(f"  Prompt {i+1}: Vanilla={'✅' if v_ok else '❌'}  Neural Edge={'✅' if f_ok else '❌'}")
     print("-"*60)
-    print()
\ No newline at end of file
+    print()
+
+    write_json(args.json, {
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "backend": args.backend,
+        "trials": args.trials,
+        "warmup": args.warmup,
+        "max_tokens": args.max_tokens,
+        "models": [vanilla, finetuned],
+    })
+    print(f"JSON results: {args.json}")
+
+    if cache is not None:
+        st = cache.stats
+        print(f"Response cache: {st['hits']} hits / {st['misses']} misses ({cache.hit_rate:.0%}), "
+              f"{st['expired']} expired, {st['evictions']} evicted")
+        cache.close()
+
+    any_cached = any(t["cached"] for r in (vanilla, finetuned) for t in r["trials"])
+    if any_cached and not args.no_store:
+        print("Not recording to the run history: some trials were served from the response cache")
+    elif not args.no_store:
+        store = ResultsStore(args.store)
+        run_ids = [store.record(r, SAMPLER_PARAMS, args.max_tokens) for r in (vanilla, finetuned)]
+        store.close()
+        print(f"Recorded runs {run_ids[0]}, {run_ids[1]} -> {args.store}")
+    print()
@@ -0,0 +1,213 @@
+import sys
+import os
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import argparse
+import hashlib
+import json
+import sqlite3
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from harness import write_json
+from scoring import SCORER_VERSION, aggregate, score_batch
+from scripts.backends import BACKENDS
+from scripts.utils import SAMPLER_PARAMS, clean_response, format_prompt
+
+
+def load_samples(path):
+    """
+    [(sample_id, question, reference)] from a chat-format split
+    (valid.jsonl), factory output (instruction/response) or a scenario set
+    ({"scenarios": [...]}, no reference answers).
+    """
+    records = []
+    if path.endswith(".json"):
+        with open(path, "r") as f:
+            records = [(s["description"], None) for s in json.load(f)["scenarios"]]
+    else:
+        with open(path, "r") as f:
+            for line in f:
+                if not line.strip():
+                    continue
+                r = json.loads(line)
+                if "messages" in r:
+                    question = next(m["content"] for m in r["messages"] if m["role"] == "user")
+                    reference = next((m["content"] for m in reversed(r["messages"]) if m["role"] == "assistant"), None)
+                else:
+                    question, reference = r["instruction"], r.get("response")
+                records.append((question, reference))
+    return [(hashlib.sha256(f"{q}\0{ref or ''}".encode()).hexdigest()[:24], q, ref) for q, ref in records]
+
+
+class EvalCache:
+    """Generations and scores per (model key, sample id), so reruns only do new samples."""
+
+    def __init__(self, path="data/cache/eval.sqlite"):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self.db = sqlite3.connect(path)
+        self.db.executescript("""
+            CREATE TABLE IF NOT EXISTS results (
+                model_key TEXT,
+                sample_id TEXT,
+                response TEXT,
+                score TEXT,
+                created_at REAL,
+                PRIMARY KEY (model_key, sample_id)
+            );
+        """)
+
+    def get_many(self, model_key, sample_ids):
+        found = {}
+        ids = list(sample_ids)
+        for start in range(0, len(ids), 500):
+            chunk = ids[start:start + 500]
+            rows = self.db.execute(
+                f"SELECT sample_id, response, score FROM results WHERE model_key = ? "
+                f"AND sample_id IN ({','.join('?' * len(chunk))})", [model_key, *chunk]).fetchall()
+            found.update({sid: (response, json.loads(s)) for sid, response, s in rows})
+        return found
+
+    def put_many(self, model_key, rows):
+        now = time.time()
+        self.db.executemany("INSERT OR REPLACE INTO results VALUES (?, ?, ?, ?, ?)",
+                            [(model_key, sid, response, json.dumps(s), now) for sid, response, s in rows])
+        self.db.commit()
+
+    def close(self):
+        self.db.close()
+
+
+def model_key(backend, adapter_path, args):
+    """Content hash of the weights (shared with the response cache) plus everything that changes outputs."""
+    from scripts.response_cache import ResponseCache
+    fingerprints = ResponseCache(args.response_cache)
+    weights = fingerprints.model_fingerprint(backend, adapter_path)
+    fingerprints.db.close()
+    config = json.dumps({"weights": weights, "sampler": SAMPLER_PARAMS, "max_tokens": args.max_tokens,
+                         "seed": args.seed, "scorer": SCORER_VERSION}, sort_keys=True)
+    return hashlib.sha256(config.encode()).hexdigest()
+
+
+def evaluate(backend, samples, key, cache, args):
+    """
+    Generates the uncached samples in batches; each finished batch goes to
+    the process pool for scoring while the next one decodes. Scored batches
+    are written to the cache as they complete, so an interrupted run keeps
+    everything it generated.
+    """
+    cached = cache.get_many(key, [sid for sid, _, _ in samples])
+    todo = [s for s in samples if s[0] not in cached]
+    print(f"{len(samples)} samples · {len(cached)} cached · {len(todo)} to generate")
+
+    results = dict(cached)
+    pending = {}
+
+    def save(future):
+        batch, texts = pending.pop(future)
+        rows = [(sid, text, s) for (sid, _, _), text, s in zip(batch, texts, future.result())]
+        cache.put_many(key, rows)
+        results.update({sid: (text, s) for sid, text, s in rows})
+
+    start = time.perf_counter()
+    with ProcessPoolExecutor(max_workers=args.workers) as pool:
+        try:
+            for i in range(0, len(todo), args.batch_size):
+                batch = todo[i:i + args.batch_size]
+                prompts = [format_prompt(backend.tokenizer, question) for _, question, _ in batch]
+                backend.seed(args.seed)
+                texts = [clean_response(t) for t in backend.generate_batch(prompts, args.max_tokens, SAMPLER_PARAMS)]
+                pending[pool.submit(score_batch, [(t, ref) for t, (_, _, ref) in zip(texts, batch)])] = (batch, texts)
+                for future in [f for f in pending if f.done()]:
+                    save(future)
+                print(f"  generated {min(i + args.batch_size, len(todo))}/{len(todo)} "
+                      f"({time.perf_counter() - start:.1f}s)", flush=True)
+        finally:
+            for future in as_completed(list(pending)):
+                save(future)
+    return [(sid, question, ref, *results[sid]) for sid, question, ref in samples]
+
+
+def print_report(label, summary):
+    print(f"\n{'='*60}")
+    print(f"  QUALITY — {label}")
+    print(f"  Samples               : {summary['samples']}")
+    print(f"  Structured            : {summary['structured']:.1%}  (markers in order: {summary['in_order']:.1%})")
+    for section, rate in summary["sections"].items():
+        print(f"    {section:<20}: {rate:.1%}")
+    if summary["arch_similarity"] is not None:
+        print(f"  Architecture vs teacher ({summary['with_reference']} samples)")
+        print(f"    similarity          : {summary['arch_similarity']:.3f}")
+        print(f"    edit distance (avg) : {summary['arch_distance']:.2f} components")
+        print(f"    exact chain match   : {summary['arch_exact']:.1%}")
+    print(f"{'='*60}\n")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Structure and architecture-chain evaluation over a sample set.")
+    parser.add_argument("--backend", choices=sorted(BACKENDS), default="mlx")
+    parser.add_argument("--model", default="models/neural-edge-3b",
+                        help="A path or hub id, or experiment:<id> / artifact:<id> from the artifact store")
+    parser.add_argument("--adapter", default=None, help="LoRA adapter directory on top of --model")
+    parser.add_argument("--artifacts", default=None, help="Artifact store root (default: $NED_ARTIFACTS or models/store)")
+    parser.add_argument("--samples", default="data/training/valid.jsonl",
+                        help="Chat-format or factory JSONL, or a scenario set like data/raw/curriculum_goals.json")
+    parser.add_argument("--limit", type=int, default=None)
+    parser.add_argument("--batch-size", type=int, default=8)
+    parser.add_argument("--max-tokens", type=int, default=500)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--workers", type=int, default=None, help="Scoring processes (default: CPU count)")
+    parser.add_argument("--cache-path", default="data/cache/eval.sqlite")
+    parser.add_argument("--response-cache", default="data/cache/responses.sqlite", help="Where weight digests are memoised")
+    parser.add_argument("--json", default="results/eval_results.json")
+    parser.add_argument("--min-structured", type=float, default=None, help="Exit 1 below this structured rate (0-1)")
+    parser.add_argument("--min-arch-similarity", type=float, default=None, help="Exit 1 below this mean similarity (0-1)")
+    parser.add_argument("--no-host", action="store_true", help="Load in-process even if a model host is running")
+    args = parser.parse_args()
+
+    model_path, adapter_path = args.model, args.adapter
+    if model_path.startswith(("experiment:", "artifact:")):
+        from scripts.artifacts import ArtifactStore
+        model_path, adapter_path = ArtifactStore(args.artifacts).resolve(model_path)
+
+    samples = load_samples(args.samples)[:args.limit]
+    if not samples:
+        raise SystemExit(f"No samples in {args.samples}")
+    if args.no_host:
+        from scripts.backends import get_backend
+        backend = get_backend(args.backend, model_path, **({"adapter_path": adapter_path} if adapter_path else {}))
+    else:
+        from scripts.model_host import connect_backend
+        backend = connect_backend(args.backend, model_path, adapter_path)
+
+    cache = EvalCache(args.cache_path)
+    results = evaluate(backend, samples, model_key(backend, adapter_path, args), cache, args)
+    cache.close()
+
+    label = f"{model_path}{' + ' + adapter_path if adapter_path else ''}"
+    summary = aggregate([s for *_, s in results])
+    print_report(label, summary)
+    write_json(args.json, {
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "model_path": model_path,
+        "adapter_path": adapter_path,
+        "backend": args.backend,
+        "samples_path": args.samples,
+        "max_tokens": args.max_tokens,
+        "seed": args.seed,
+        "summary": summary,
+        "samples": [{"id": sid, "question": q, "response": text, **s} for sid, q, _, text, s in results],
+    })
+    print(f"JSON results: {args.json}")
+
+    failed = []
+    if args.min_structured is not None and summary["structured"] < args.min_structured:
+        failed.append(f"structured {summary['structured']:.1%} < {args.min_structured:.1%}")
+    if args.min_arch_similarity is not None:
+        if summary["arch_similarity"] is None:
+            failed.append("architecture similarity n/a: the samples have no teacher answers")
+        elif summary["arch_similarity"] < args.min_arch_similarity:
+            failed.append(f"architecture similarity {summary['arch_similarity']:.3f} < {args.min_arch_similarity:.3f}")
+    if failed:
+        print(f"❌ Quality gate failed: {'; '.join(failed)}")
+        sys.exit(1)
@@ -0,0 +1,119 @@
+# benchmarks/results_store.py
+import json
+import os
+import sqlite3
+import statistics
+import subprocess
+import time
+
+# One sample per trial for these; itl_p50_ms is the trial's median inter-token latency
+TRIAL_METRICS = ["ttft_s", "total_s", "decode_tps", "prefill_tps", "itl_p50_ms"]
+# itl_ms is also kept per generated token, for the latency distribution
+METRICS = TRIAL_METRICS + ["itl_ms"]
+HIGHER_IS_BETTER = {"decode_tps", "prefill_tps"}
+# Where the model ran: through scripts/model_host.py, or loaded by the benchmark itself
+SERVING_MODES = ("host", "in-process")
+
+
+def current_commit():
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"],
+                                       stderr=subprocess.DEVNULL, text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+class ResultsStore:
+    """Append-only SQLite history of benchmark runs and their raw samples."""
+
+    def __init__(self, path="results/benchmarks.sqlite"):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self.db = sqlite3.connect(path)
+        self.db.executescript("""
+            CREATE TABLE IF NOT EXISTS runs (
+                run_id INTEGER PRIMARY KEY,
+                created_at TEXT,
+                label TEXT,
+                model_path TEXT,
+                backend TEXT,
+                git_commit TEXT,
+                sampler TEXT,
+                max_tokens INTEGER,
+                trials INTEGER,
+                summary TEXT,
+                serving TEXT,
+                model_ref TEXT,
+                adapter_path TEXT
+            );
+            CREATE TABLE IF NOT EXISTS samples (run_id INTEGER, metric TEXT, value REAL);
+            CREATE INDEX IF NOT EXISTS samples_by_run ON samples (run_id, metric);
+            CREATE INDEX IF NOT EXISTS runs_by_model ON runs (model_path, run_id);
+        """)
+        # Histories written before these were recorded: those runs stay NULL (unknown). An old adapter
+        # run carries only its base's model_path, so old runs are reachable by run id, not by model ref.
+        columns = {row[1] for row in self.db.execute("PRAGMA table_info(runs)")}
+        for column in ("serving", "model_ref", "adapter_path"):
+            if column not in columns:
+                self.db.execute(f"ALTER TABLE runs ADD COLUMN {column} TEXT")
+        self.db.execute("CREATE INDEX IF NOT EXISTS runs_by_ref ON runs (model_ref, run_id)")
+        self.db.commit()
+
+    def record(self, result, sampler, max_tokens, commit=None):
+        """
+        Stores one benchmark_model result. model_ref is what the user asked
+        for (a path, or experiment:/artifact: from the artifact store);
+        model_path is the base it resolved to, shared by all its adapters.
+        """
+        cur = self.db.execute(
+            "INSERT INTO runs (created_at, label, model_path, backend, git_commit, sampler, max_tokens, trials, summary, "
+            "serving, model_ref, adapter_path) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            (time.strftime("%Y-%m-%dT%H:%M:%S"), result["label"], result["model_path"], result["backend"],
+             commit or current_commit(), json.dumps(sampler, sort_keys=True), max_tokens,
+             result["summary"]["trials"], json.dumps(result["summary"]),
+             "host" if result["load"]["host"] else "in-process",
+             result.get("model_ref") or result["model_path"], result.get("adapter_path"))
+        )
+        run_id = cur.lastrowid
+        rows = []
+        for trial in result["trials"]:
+            values = dict(trial, itl_p50_ms=statistics.median(trial["itl_s"]) * 1000 if trial["itl_s"] else None)
+            for metric in TRIAL_METRICS:
+                if values.get(metric) is not None:
+                    rows.append((run_id, metric, values[metric]))
+            rows.extend((run_id, "itl_ms", x * 1000) for x in trial["itl_s"])
+        self.db.executemany("INSERT INTO samples (run_id, metric, value) VALUES (?, ?, ?)", rows)
+        self.db.commit()
+        return run_id
+
+    def runs(self, limit=20):
+        return self.db.execute(
+            "SELECT run_id, created_at, label, model_path, model_ref, backend, git_commit, sampler, trials, serving "
+            "FROM runs ORDER BY run_id DESC LIMIT ?", (limit,)
+        ).fetchall()
+
+    def run(self, run_id):
+        row = self.db.execute(
+            "SELECT run_id, created_at, label, model_path, model_ref, adapter_path, backend, git_commit, sampler, "
+            "serving FROM runs WHERE run_id = ?",
+            (run_id,)
+        ).fetchone()
+        if row is None:
+            raise KeyError(f"No benchmark run {run_id}")
+        return row
+
+    def latest_run_id(self, model_ref, offset=0):
+        """Latest run (or the offset-th before it) of the model as it was named to latency_check."""
+        row = self.db.execute(
+            "SELECT run_id FROM runs WHERE model_ref = ? ORDER BY run_id DESC LIMIT 1 OFFSET ?",
+            (model_ref, offset)
+        ).fetchone()
+        if row is None:
+            raise KeyError(f"No {'earlier ' if offset else ''}benchmark runs recorded for {model_ref}")
+        return row[0]
+
+    def samples(self, run_id, metric):
+        return [v for (v,) in self.db.execute(
+            "SELECT value FROM samples WHERE run_id = ? AND metric = ?", (run_id, metric))]
+
+    def close(self):
+        self.db.close()
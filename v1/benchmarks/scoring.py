@@ -0,0 +1,81 @@
+# benchmarks/scoring.py
+import re
+
+from scripts.utils import SECTION_KEYS, STRUCTURE_KEYS, parse_response
+
+# Bump when scores change meaning; cached scores from older versions are ignored
+SCORER_VERSION = 1
+
+_PAREN_RE = re.compile(r"\([^)]*\)")
+_WORD_RE = re.compile(r"[a-z0-9]+")
+
+
+def normalize_component(component):
+    """'Redis Cache (hot keys)' and 'redis-cache' compare equal."""
+    return " ".join(_WORD_RE.findall(_PAREN_RE.sub("", component).lower()))
+
+
+def edit_distance(a, b):
+    """Levenshtein distance over two sequences (here: component chains)."""
+    prev = list(range(len(b) + 1))
+    for i, x in enumerate(a, 1):
+        cur = [i]
+        for j, y in enumerate(b, 1):
+            cur.append(min(prev[j] + 1, cur[j - 1] + 1, prev[j - 1] + (x != y)))
+        prev = cur
+    return prev[-1]
+
+
+def score(response, reference=None):
+    """
+    Structure compliance per section, plus how far the ARCHITECTURE chain is
+    from the teacher's when a reference answer exists. A section counts only
+    if its marker is there and its body isn't empty; ARCHITECTURE needs at
+    least two components.
+    """
+    parsed = parse_response(response)
+    components = [c for c in (normalize_component(c) for c in parsed.components) if c]
+    sections = {k: bool(parsed.section(k)) for k in SECTION_KEYS}
+    sections["ARCHITECTURE"] = len(components) >= 2
+    sections["END_OF_ARCH"] = parsed.end is not None
+    found = [parsed.positions[k] for k in STRUCTURE_KEYS if k in parsed.positions]
+    result = {
+        "structured": parsed.structured,
+        "in_order": parsed.structured and found == sorted(found),
+        "sections": sections,
+        "section_score": sum(sections.values()) / len(sections),
+        "components": components,
+        "arch_distance": None,
+        "arch_similarity": None,
+    }
+    if reference is not None:
+        teacher = [c for c in (normalize_component(c) for c in parse_response(reference).components) if c]
+        if teacher:
+            distance = edit_distance(components, teacher)
+            result["teacher_components"] = teacher
+            result["arch_distance"] = distance
+            result["arch_similarity"] = 1 - distance / max(len(components), len(teacher))
+    return result
+
+
+def score_batch(pairs):
+    """[(response, reference)] -> [score]; one process-pool task per generation batch."""
+    return [score(response, reference) for response, reference in pairs]
+
+
+def aggregate(scores):
+    n = len(scores)
+    if not n:
+        return {"samples": 0}
+    with_ref = [s for s in scores if s["arch_similarity"] is not None]
+    return {
+        "samples": n,
+        "structured": sum(s["structured"] for s in scores) / n,
+        "in_order": sum(s["in_order"] for s in scores) / n,
+        "section_score": sum(s["section_score"] for s in scores) / n,
+        "sections": {k: sum(s["sections"][k] for s in scores) / n for k in SECTION_KEYS + ["ARCHITECTURE", "END_OF_ARCH"]},
+        "with_reference": len(with_ref),
+        "arch_similarity": sum(s["arch_similarity"] for s in with_ref) / len(with_ref) if with_ref else None,
+        "arch_distance": sum(s["arch_distance"] for s in with_ref) / len(with_ref) if with_ref else None,
+        "arch_exact": sum(s["arch_distance"] == 0 for s in with_ref) / len(with_ref) if with_ref else None,
+    }
@@ -0,0 +1,235 @@
+# scripts/artifacts.py
+import argparse
+import hashlib
+import json
+import os
+import shutil
+import time
+
+KINDS = ("base", "adapter", "fused")
+RESOLVE_ORDER = ("adapter", "fused", "base")  # an adapter can share an already-loaded base
+
+
+def _sha256(path):
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def _write_json(path, payload):
+    tmp = f"{path}.tmp{os.getpid()}"
+    with open(tmp, "w") as f:
+        json.dump(payload, f, indent=2, sort_keys=True)
+    os.replace(tmp, path)
+
+
+class ArtifactStore:
+    """
+    Local content-addressed store for base models, LoRA adapters and fused models.
+
+    Every file is stored once under blobs/ by its SHA-256, so identical
+    weights shared by several fused models, or re-registered after a rerun,
+    take no extra disk. An artifact is a manifest of {relative path: digest}
+    plus metadata; its id is the hash of that manifest. Adapters don't copy
+    their base: `base` names a hub repo or another artifact, which serving
+    loads once and reuses for every adapter on top of it.
+
+    Layout (the v2 worker writes the same one into its artifact volume):
+        blobs/ab/abcdef...            file contents
+        manifests/<id>.json           kind, files, base, experiments, metadata
+        experiments/<experiment>.json latest artifact id per kind
+        trees/<id>/...                the files again, loadable as a model dir
+
+    Blobs are read-only. Base and fused trees hard-link to them; adapter
+    trees are copies, so training resumed into one never rewrites a blob.
+    """
+
+    def __init__(self, root=None):
+        self.root = root or os.environ.get("NED_ARTIFACTS", "models/store")
+        for sub in ("blobs", "manifests", "experiments", "trees"):
+            os.makedirs(os.path.join(self.root, sub), exist_ok=True)
+
+    def _blob(self, digest):
+        return os.path.join(self.root, "blobs", digest[:2], digest)
+
+    def _add_blob(self, path):
+        digest = _sha256(path)
+        blob = self._blob(digest)
+        if not os.path.exists(blob):
+            os.makedirs(os.path.dirname(blob), exist_ok=True)
+            tmp = f"{blob}.tmp{os.getpid()}"
+            shutil.copyfile(path, tmp)
+            os.chmod(tmp, 0o444)
+            os.replace(tmp, blob)
+        return digest, os.path.getsize(blob)
+
+    def put(self, source, kind, experiment_id=None, base=None, metadata=None):
+        """source: a directory (every file in it) or a list of files (stored relative to their common directory)."""
+        if kind not in KINDS:
+            raise ValueError(f"Unknown artifact kind '{kind}'. Choose from: {', '.join(KINDS)}")
+        if kind == "adapter" and not base:
+            raise ValueError("Adapters need the base model they were trained on")
+        if base and base.startswith("artifact:"):
+            base = self.get(base.split(":", 1)[1])["id"]
+        if isinstance(source, str):
+            paths = {os.path.relpath(os.path.join(d, n), source): os.path.join(d, n)
+                     for d, _, names in os.walk(source) for n in names}
+        else:
+            common = os.path.commonpath([os.path.dirname(os.path.abspath(p)) for p in source]) if source else ""
+            paths = {os.path.relpath(os.path.abspath(p), common): p for p in source}
+        if not paths:
+            raise ValueError(f"Nothing to store in {source}")
+
+        files, size = {}, 0
+        for rel, path in sorted(paths.items()):
+            files[rel], n = self._add_blob(path)
+            size += n
+        artifact_id = hashlib.sha256(json.dumps({"kind": kind, "base": base, "files": files},
+                                                sort_keys=True).encode()).hexdigest()
+
+        manifest_path = os.path.join(self.root, "manifests", f"{artifact_id}.json")
+        if os.path.exists(manifest_path):
+            manifest = self.get(artifact_id)
+            if experiment_id and experiment_id not in manifest["experiments"]:
+                manifest["experiments"].append(experiment_id)
+                _write_json(manifest_path, manifest)
+        else:
+            manifest = {"id": artifact_id, "kind": kind, "base": base, "files": files, "size": size,
+                        "experiments": [experiment_id] if experiment_id else [], "metadata": metadata or {},
+                        "created_at": time.strftime("%Y-%m-%dT%H:%M:%S")}
+            _write_json(manifest_path, manifest)
+        if experiment_id:
+            self._link_experiment(experiment_id, kind, artifact_id)
+        return manifest
+
+    def _link_experiment(self, experiment_id, kind, artifact_id):
+        path = os.path.join(self.root, "experiments", f"{experiment_id}.json")
+        links = {}
+        if os.path.exists(path):
+            with open(path, "r") as f:
+                links = json.load(f)
+        links[kind] = artifact_id
+        _write_json(path, links)
+
+    def get(self, artifact_id):
+        """Manifest for a full id or a unique prefix of one."""
+        names = [n for n in os.listdir(os.path.join(self.root, "manifests"))
+                 if n.startswith(artifact_id) and n.endswith(".json")]
+        if len(names) != 1:
+            raise KeyError(f"{'Ambiguous' if names else 'Unknown'} artifact '{artifact_id}'")
+        with open(os.path.join(self.root, "manifests", names[0]), "r") as f:
+            return json.load(f)
+
+    def for_experiment(self, experiment_id, kind=None):
+        path = os.path.join(self.root, "experiments", f"{experiment_id}.json")
+        if not os.path.exists(path):
+            raise KeyError(f"No artifacts recorded for experiment {experiment_id}")
+        with open(path, "r") as f:
+            links = json.load(f)
+        for k in (kind,) if kind else RESOLVE_ORDER:
+            if k in links:
+                return self.get(links[k])
+        raise KeyError(f"No {kind} artifact recorded for experiment {experiment_id}")
+
+    def path(self, artifact_id):
+        """
+        A directory with the artifact's files. Base and fused weights are
+        hard-linked to the blobs so they cost no extra disk; adapters are
+        small and copied, since anything writing into an adapter directory
+        in place would otherwise rewrite the shared blob.
+        """
+        manifest = self.get(artifact_id)
+        tree = os.path.join(self.root, "trees", manifest["id"])
+        if os.path.isdir(tree):
+            return tree
+        tmp = f"{tree}.tmp{os.getpid()}"
+        for rel, digest in manifest["files"].items():
+            dest = os.path.join(tmp, rel)
+            os.makedirs(os.path.dirname(dest), exist_ok=True)
+            if manifest["kind"] == "adapter":
+                shutil.copyfile(self._blob(digest), dest)
+                continue
+            try:
+                os.link(self._blob(digest), dest)
+            except OSError:
+                shutil.copyfile(self._blob(digest), dest)
+                os.chmod(dest, 0o444)
+        try:
+            os.rename(tmp, tree)
+        except OSError:
+            shutil.rmtree(tmp)  # another process materialised it first
+        return tree
+
+    def resolve(self, ref):
+        """
+        Turns a model reference into (model_path, adapter_path). ref is
+        "experiment:<id>", "artifact:<id prefix>", or a plain path / hub id,
+        which is returned unchanged.
+        """
+        if ref.startswith("experiment:"):
+            manifest = self.for_experiment(ref.split(":", 1)[1])
+        elif ref.startswith("artifact:"):
+            manifest = self.get(ref.split(":", 1)[1])
+        else:
+            return ref, None
+
+        if manifest["kind"] != "adapter":
+            return self.path(manifest["id"]), None
+        base = manifest["base"]
+        if os.path.exists(os.path.join(self.root, "manifests", f"{base}.json")):
+            base = self.path(base)
+        return base, self.path(manifest["id"])
+
+    def list(self):
+        manifests = []
+        for name in os.listdir(os.path.join(self.root, "manifests")):
+            if name.endswith(".json"):
+                with open(os.path.join(self.root, "manifests", name), "r") as f:
+                    manifests.append(json.load(f))
+        return sorted(manifests, key=lambda m: m["created_at"])
+
+    def usage(self):
+        """Bytes the manifests reference vs bytes actually on disk."""
+        manifests = self.list()
+        stored = sum(os.path.getsize(os.path.join(d, n))
+                     for d, _, names in os.walk(os.path.join(self.root, "blobs")) for n in names)
+        return {"artifacts": len(manifests), "logical_bytes": sum(m["size"] for m in manifests), "stored_bytes": stored}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Content-addressed store for adapters and fused models.")
+    parser.add_argument("--root", default=None, help="Store directory (default: $NED_ARTIFACTS or models/store)")
+    sub = parser.add_subparsers(dest="command", required=True)
+    put_parser = sub.add_parser("put", help="Register a directory")
+    put_parser.add_argument("source")
+    put_parser.add_argument("--kind", choices=KINDS, required=True)
+    put_parser.add_argument("--experiment", help="Experiment id to link the artifact to")
+    put_parser.add_argument("--base", help="Base model (hub id or artifact:<id>), required for adapters")
+    put_parser.add_argument("--meta", action="append", default=[], metavar="KEY=VALUE")
+    sub.add_parser("list", help="Show stored artifacts")
+    resolve_parser = sub.add_parser("resolve", help="Print the model and adapter paths for a reference")
+    resolve_parser.add_argument("ref", help="experiment:<id>, artifact:<id> or a path")
+    sub.add_parser("du", help="Disk usage and dedup savings")
+    args = parser.parse_args()
+
+    store = ArtifactStore(args.root)
+    if args.command == "put":
+        metadata = dict(kv.split("=", 1) for kv in args.meta)
+        manifest = store.put(args.source, args.kind, args.experiment, args.base, metadata)
+        print(f"{manifest['kind']} {manifest['id'][:12]} · {len(manifest['files'])} files · {manifest['size'] / 1e6:.1f} MB")
+    elif args.command == "list":
+        for m in store.list():
+            experiments = ",".join(e[:8] for e in m["experiments"]) or "-"
+            print(f"  {m['id'][:12]}  {m['kind']:<7}  {m['size'] / 1e6:>9.1f} MB  {m['created_at']}  "
+                  f"experiments={experiments}  base={m['base'] or '-'}")
+    elif args.command == "resolve":
+        model_path, adapter_path = store.resolve(args.ref)
+        print(f"model:   {model_path}")
+        print(f"adapter: {adapter_path or '-'}")
+    elif args.command == "du":
+        u = store.usage()
+        saved = u["logical_bytes"] - u["stored_bytes"]
+        print(f"{u['artifacts']} artifacts · {u['logical_bytes'] / 1e9:.2f} GB referenced · "
+              f"{u['stored_bytes'] / 1e9:.2f} GB on disk · {saved / 1e9:.2f} GB saved by dedup")
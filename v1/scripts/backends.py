@@ -0,0 +1,346 @@
+# scripts/backends.py
+import copy
+import hashlib
+import json
+import re
+import time
+
+from scripts.streaming import STOP_SEQUENCE, StopSequenceMatcher, StreamResult, collect_until_stop
+
+PREFILL_STEP = 2048
+
+
+class MLXBackend:
+    """Apple Silicon backend — wraps mlx_lm load/generate."""
+
+    name = "mlx"
+    state_suffix = ".safetensors"
+
+    def __init__(self, model_path, model=None, tokenizer=None, adapter_path=None):
+        self.model_path = model_path
+        self.adapter_path = adapter_path
+        if model is None or tokenizer is None:
+            from mlx_lm import load
+            model, tokenizer = load(model_path, adapter_path=adapter_path)
+        self.model, self.tokenizer = model, tokenizer
+
+    def with_adapter(self, adapter_path):
+        """
+        Another backend over this one's base weights with a LoRA adapter on
+        top. The new model skeleton is loaded lazily and its parameters are
+        pointed at the arrays already in memory, so only the adapter is read.
+        """
+        from mlx_lm.tuner.utils import load_adapters
+        from mlx_lm.utils import get_model_path, load_model
+
+        path = get_model_path(self.model_path)
+        path = path[0] if isinstance(path, tuple) else path
+        loaded = load_model(path, lazy=True)
+        model = loaded[0] if isinstance(loaded, tuple) else loaded
+        model.update(self.model.parameters())  # shares the base arrays; the lazy ones are never evaluated
+        model = load_adapters(model, adapter_path)
+        model.eval()
+        return MLXBackend(self.model_path, model=model, tokenizer=self.tokenizer, adapter_path=adapter_path)
+
+    def encode(self, prompt):
+        # Same rule mlx_lm.generate uses: don't add a second BOS to a templated prompt
+        bos = self.tokenizer.bos_token
+        add_special_tokens = bos is None or not prompt.startswith(bos)
+        return self.tokenizer.encode(prompt, add_special_tokens=add_special_tokens)
+
+    def generate_batch(self, prompts, max_tokens, sampler_params, repetition_penalty=None):
+        from mlx_lm.sample_utils import make_sampler, make_repetition_penalty
+
+        sampler = make_sampler(**sampler_params)
+        processors = [make_repetition_penalty(**repetition_penalty)] if repetition_penalty else None
+
+        try:
+            from mlx_lm import batch_generate
+        except ImportError:
+            # Older mlx-lm without batched decoding — fall back to one prompt at a time
+            from mlx_lm import generate
+            return [
+                generate(self.model, self.tokenizer, prompt=p, max_tokens=max_tokens,
+                         sampler=sampler, logits_processors=processors)
+                for p in prompts
+            ]
+
+        result = batch_generate(
+            self.model,
+            self.tokenizer,
+            [self.encode(p) for p in prompts],
+            max_tokens=max_tokens,
+            sampler=sampler,
+            logits_processors=processors,
+        )
+        return result.texts
+
+    def generate_batch_until_stop(self, prompts, max_tokens, sampler_params, repetition_penalty=None,
+                                  stop=STOP_SEQUENCE):
+        """
+        Like generate_batch, but each sequence leaves the batch as soon as its
+        stop sequence completes instead of decoding to max_tokens. Steps
+        mlx_lm's BatchGenerator by hand, with one matcher per sequence.
+        Returns a StreamResult per prompt.
+        """
+        from mlx_lm.generate import BatchGenerator
+        from mlx_lm.sample_utils import make_sampler, make_repetition_penalty
+
+        processors = [make_repetition_penalty(**repetition_penalty)] if repetition_penalty else None
+        generator = BatchGenerator(self.model, stop_tokens=set(self.tokenizer.eos_token_ids),
+                                   sampler=make_sampler(**sampler_params), logits_processors=processors)
+        uids = generator.insert([self.encode(p) for p in prompts], max_tokens=[max_tokens] * len(prompts))
+        running = {uid: i for i, uid in enumerate(uids)}
+        matchers = [StopSequenceMatcher(stop) for _ in prompts]
+        tokens = [[] for _ in prompts]
+        texts = [""] * len(prompts)
+        counts = [0] * len(prompts)
+        stopped = [False] * len(prompts)
+        try:
+            while running:
+                for response in generator.next():
+                    i = running.get(response.uid)
+                    if i is None:
+                        continue
+                    counts[i] += 1
+                    if response.finish_reason != "stop":  # the EOS token itself isn't text
+                        tokens[i].append(response.token)
+                        decoded = self.tokenizer.decode(tokens[i])
+                        if not decoded.endswith("\ufffd"):  # rest of a multi-byte char still to come
+                            end = matchers[i].feed(decoded[len(texts[i]):])
+                            if end != -1:
+                                decoded = decoded[:len(texts[i]) + end]
+                                stopped[i] = True
+                            texts[i] = decoded
+                    if stopped[i] or response.finish_reason is not None:
+                        del running[response.uid]
+                        if response.finish_reason is None:
+                            generator.remove([response.uid])
+        finally:
+            if hasattr(generator, "close"):
+                generator.close()
+        return [StreamResult(texts[i], counts[i], max_tokens, stopped[i]) for i in range(len(prompts))]
+
+    def seed(self, value):
+        import mlx.core as mx
+        mx.random.seed(value)
+
+    def peak_memory(self):
+        """Peak Metal allocation in bytes since the last reset."""
+        import mlx.core as mx
+        get_peak = getattr(mx, "get_peak_memory", None) or mx.metal.get_peak_memory
+        return get_peak()
+
+    def reset_peak_memory(self):
+        import mlx.core as mx
+        reset_peak = getattr(mx, "reset_peak_memory", None) or mx.metal.reset_peak_memory
+        reset_peak()
+
+    def prefill(self, tokens):
+        """Runs tokens through the model once and returns the filled KV cache."""
+        import mlx.core as mx
+        from mlx_lm.models.cache import make_prompt_cache
+
+        cache = make_prompt_cache(self.model)
+        prompt = mx.array(tokens)
+        for start in range(0, len(tokens), PREFILL_STEP):
+            self.model(prompt[None, start:start + PREFILL_STEP], cache=cache)
+            mx.eval([c.state for c in cache])
+        return cache
+
+    def copy_state(self, state):
+        return copy.deepcopy(state)
+
+    def save_state(self, path, state, metadata):
+        from mlx_lm.models.cache import save_prompt_cache
+        save_prompt_cache(path, state, metadata)
+
+    def load_state(self, path):
+        from mlx_lm.models.cache import load_prompt_cache
+        return load_prompt_cache(path)
+
+    def stream(self, prompt, max_tokens, sampler_params, repetition_penalty=None, state=None):
+        """Yields one text segment per decoded token. With `state`, prompt is the suffix after a prefilled cache."""
+        from mlx_lm import stream_generate
+        from mlx_lm.sample_utils import make_sampler, make_repetition_penalty
+
+        processors = [make_repetition_penalty(**repetition_penalty)] if repetition_penalty else None
+        for response in stream_generate(
+            self.model,
+            self.tokenizer,
+            prompt,
+            max_tokens=max_tokens,
+            sampler=make_sampler(**sampler_params),
+            logits_processors=processors,
+            prompt_cache=state
+        ):
+            yield response.text
+
+
+class FakeTokenizer:
+    """
+    Deterministic stand-in for a HF tokenizer. Splits text into whitespace
+    and <=3 character chunks so decode(encode(x)) == x and sentinels like
+    END_OF_ARCH span several tokens, as they do with real BPE vocabularies.
+    """
+
+    bos_token = "<|begin_of_text|>"
+    eos_token = "<|eot_id|>"
+    eos_token_id = 0
+
+    def __init__(self):
+        self.vocab = {self.eos_token: self.eos_token_id}
+        self.pieces = [self.eos_token]
+
+    def _token_id(self, piece):
+        if piece not in self.vocab:
+            self.vocab[piece] = len(self.pieces)
+            self.pieces.append(piece)
+        return self.vocab[piece]
+
+    def encode(self, text, add_special_tokens=True):
+        if add_special_tokens and not text.startswith(self.bos_token):
+            text = self.bos_token + text
+        return [self._token_id(p) for p in re.findall(r"\s|\S{1,3}", text)]
+
+    def decode(self, tokens):
+        return "".join(self.pieces[t] for t in tokens if t != self.eos_token_id)
+
+    def apply_chat_template(self, messages, tokenize=False, add_generation_prompt=True):
+        prompt = self.bos_token
+        for m in messages:
+            prompt += f"<|start_header_id|>{m['role']}<|end_header_id|>\n\n{m['content']}{self.eos_token}"
+        if add_generation_prompt:
+            prompt += "<|start_header_id|>assistant<|end_header_id|>\n\n"
+        return self.encode(prompt, add_special_tokens=False) if tokenize else prompt
+
+
+class FakeModel:
+    """
+    Deterministic CPU "model": answers every prompt in the distillation format,
+    keyed on the last QUESTION in the prompt, then keeps rambling past
+    END_OF_ARCH the way the real models do until max_tokens runs out.
+    """
+
+    COMPONENTS = ["API Gateway", "Load Balancer", "Redis Cache", "Kafka Topic",
+                  "Worker Pool", "Primary DB", "Read Replica", "CDC Consumer",
+                  "Rate Limiter", "Object Store", "Search Index", "etcd"]
+
+    def __init__(self, prefill_delay=0.0, decode_delay=0.0):
+        # Optional per-token sleeps so benchmarks see realistic prefill/decode shapes on CPU
+        self.prefill_delay = prefill_delay
+        self.decode_delay = decode_delay
+        self.prefill_tokens = 0
+        self.decode_steps = 0
+
+    def prefill(self, tokens):
+        self.prefill_tokens += len(tokens)
+        if self.prefill_delay:
+            time.sleep(self.prefill_delay * len(tokens))
+        return {"tokens": list(tokens)}
+
+    def decode_step(self):
+        self.decode_steps += 1
+        if self.decode_delay:
+            time.sleep(self.decode_delay)
+
+    def respond(self, prompt, seed=0):
+        questions = re.findall(r"QUESTION: (.*)", prompt)
+        if questions:
+            question = questions[-1].split("<|")[0].strip()
+        else:
+            user_turns = re.findall(r"user<\|end_header_id\|>\n\n(.*?)<\|eot_id\|>", prompt, re.S)
+            question = user_turns[-1].strip() if user_turns else prompt.strip()
+
+        digest = hashlib.sha256(f"{seed}:{question}".encode()).digest()
+        chain = " -> ".join(self.COMPONENTS[b % len(self.COMPONENTS)] for b in digest[:5])
+        answer = (
+            f"QUESTION: {question}\n"
+            "THOUGHT:\n"
+            f"1. FAILURE MODE: Contention on {self.COMPONENTS[digest[5] % len(self.COMPONENTS)]} under peak load.\n"
+            "2. NAIVE FIXES: Scaling vertically only moves the bottleneck. Adding retries amplifies the load.\n"
+            f"3. MECHANISM: Route traffic through {chain.split(' -> ')[1]} and isolate the hot path.\n"
+            "4. TRADE-OFF: Extra operational complexity and one more component to monitor.\n"
+            f"ARCHITECTURE: {chain}\n"
+            "END_OF_ARCH"
+        )
+        return answer + "\n\nNote: this design can be extended further. " * 40
+
+
+class FakeBackend:
+    """Deterministic CPU backend for Linux dev boxes and CI — no weights, no MLX."""
+
+    name = "fake"
+    state_suffix = ".json"
+
+    def __init__(self, model_path="fake", prefill_delay=0.0, decode_delay=0.0, adapter_path=None, model=None):
+        self.model_path = model_path
+        self.adapter_path = adapter_path
+        self.model = model or FakeModel(prefill_delay, decode_delay)
+        self.tokenizer = FakeTokenizer()
+
+    def with_adapter(self, adapter_path):
+        return FakeBackend(self.model_path, adapter_path=adapter_path, model=self.model)
+
+    def encode(self, prompt):
+        return self.tokenizer.encode(prompt)
+
+    def _complete(self, prompt, max_tokens):
+        tokens = self.tokenizer.encode(self.model.respond(prompt), add_special_tokens=False)[:max_tokens]
+        for _ in tokens:
+            self.model.decode_step()
+        return self.tokenizer.decode(tokens)
+
+    def generate_batch(self, prompts, max_tokens, sampler_params, repetition_penalty=None):
+        texts = []
+        for p in prompts:
+            self.model.prefill(self.encode(p))
+            texts.append(self._complete(p, max_tokens))
+        return texts
+
+    def generate_batch_until_stop(self, prompts, max_tokens, sampler_params, repetition_penalty=None,
+                                  stop=STOP_SEQUENCE):
+        return [collect_until_stop(self.stream(p, max_tokens, sampler_params, repetition_penalty), max_tokens, stop)
+                for p in prompts]
+
+    def seed(self, value):
+        pass  # already deterministic
+
+    def peak_memory(self):
+        return None
+
+    def reset_peak_memory(self):
+        pass
+
+    def prefill(self, tokens):
+        return self.model.prefill(tokens)
+
+    def copy_state(self, state):
+        return copy.deepcopy(state)
+
+    def save_state(self, path, state, metadata):
+        with open(path, "w") as f:
+            json.dump({"state": state, "metadata": metadata}, f)
+
+    def load_state(self, path):
+        with open(path, "r") as f:
+            return json.load(f)["state"]
+
+    def stream(self, prompt, max_tokens, sampler_params, repetition_penalty=None, state=None):
+        tokens = list(prompt) if isinstance(prompt, list) else self.encode(prompt)
+        self.model.prefill(tokens)
+        if state is not None:
+            tokens = state["tokens"] + tokens
+        answer = self.model.respond(self.tokenizer.decode(tokens))
+        for t in self.tokenizer.encode(answer, add_special_tokens=False)[:max_tokens]:
+            self.model.decode_step()
+            yield self.tokenizer.decode([t])
+
+
+BACKENDS = {"mlx": MLXBackend, "fake": FakeBackend}
+
+
+def get_backend(name, model_path, **kwargs):
+    if name not in BACKENDS:
+        raise ValueError(f"Unknown backend '{name}'. Choose from: {', '.join(BACKENDS)}")
+    return BACKENDS[name](model_path, **kwargs)
@@ -1,44 +1,68 @@
+import sys
+import os
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import argparse
 import json
-from mlx_lm import load
-from generate_curriculum import generate_architecture
 from tqdm import tqdm
+from scripts.backends import BACKENDS, get_backend
+from scripts.generation_engine import GenerationEngine
+from scripts.model_host import connect_backend
+from scripts.prefix_cache import PrefixCache
+from scripts.response_cache import ResponseCache
+from scripts.speculative import MLXLogits, SpeculativeDecoder
+
+parser = argparse.ArgumentParser(description="Generate synthetic CoT data with the teacher model.")
+parser.add_argument("--backend", choices=sorted(BACKENDS), default="mlx")
+parser.add_argument("--model", default="mlx-community/Meta-Llama-3-8B-Instruct-4bit")
+parser.add_argument("--batch-size", type=int, default=8)
+parser.add_argument("--scenarios", default="data/raw/curriculum_goals.json")
+parser.add_argument("--output", default="data/training/synthetic_distillation.jsonl")
+parser.add_argument("--checkpoint", default="data/training/.factory_checkpoint.json")
+parser.add_argument("--retry-skipped", action="store_true", help="Regenerate scenarios skipped as malformed in a previous run")
+parser.add_argument("--prefix-cache", action="store_true", help="Prefill the shared few-shot prefix once and reuse its KV cache per scenario")
+parser.add_argument("--draft-model", help="Speculative decoding: a small model that drafts for the teacher, e.g. models/neural-edge-3b")
+parser.add_argument("--num-draft", type=int, default=4, help="Tokens the draft proposes per teacher pass")
+parser.add_argument("--fresh", action="store_true", help="Discard previous output and checkpoint")
+args = parser.parse_args()
+if args.draft_model and (args.backend != "mlx" or args.prefix_cache):
+    parser.error("--draft-model needs --backend mlx and can't be combined with --prefix-cache")
 
-# 1. Load Model ONCE
-model_path = "mlx-community/Meta-Llama-3-8B-Instruct-4bit"
-model, tokenizer = load(model_path)
+if args.fresh:
+    for path in (args.output, args.checkpoint):
+        if os.path.exists(path):
+            os.remove(path)
+
+# 1. Load Model ONCE — or attach to it in a running model host; KV-cache reuse needs it in-process
+if args.prefix_cache or args.draft_model:
+    backend = get_backend(args.backend, args.model)
+else:
+    backend = connect_backend(args.backend, args.model)
 
 # 2. Load Scenarios
-with open("data/raw/curriculum_goals.json", "r") as f:
+with open(args.scenarios, "r") as f:
     scenarios = json.load(f)["scenarios"]
 
 print(f"Loaded {len(scenarios)} scenarios. Starting generation...\n")
 
-# 3. The Factory Loop
-generated = 0
-skipped = 0
-
-with open("data/training/synthetic_distillation.jsonl", "w") as out_f:
-    for item in tqdm(scenarios, desc="Generating"):
-
-        wisdom = generate_architecture(
-            model, tokenizer,
-            item['title'],
-            item['description']
-        )
-
-        # Only structural check — is the output complete?
-        if not wisdom or "END_OF_ARCH" not in wisdom:
-            print(f"\n[SKIP] Malformed output for: {item['title']}")
-            skipped += 1
-            continue
-
-        entry = {
-            "instruction": item['description'],
-            "response": wisdom
-        }
+# 3. The Factory Loop — batched, resumable
+engine = GenerationEngine(
+    backend,
+    output_path=args.output,
+    checkpoint_path=args.checkpoint,
+    batch_size=args.batch_size,
+    retry_skipped=args.retry_skipped,
+    prefix_cache=PrefixCache(backend, fingerprints=ResponseCache()) if args.prefix_cache else None,
+    speculative=SpeculativeDecoder(MLXLogits(backend), MLXLogits(get_backend("mlx", args.draft_model)),
+                                   args.num_draft) if args.draft_model else None
+)
 
-        out_f.write(json.dumps(entry) + "\n")
-        generated += 1
+with tqdm(total=len(scenarios), desc="Generating") as progress:
+    stats = engine.run(scenarios, progress=progress)
 
-print(f"\nDone. Generated: {generated} | Skipped: {skipped}")
-print(f"Output: data/training/synthetic_distillation.jsonl")
\ No newline at end of file
+print(f"\nDone. Generated: {stats['generated']} | Skipped: {stats['skipped']} | Resumed: {stats['resumed']}")
+if "speculative" in stats:
+    m = stats["speculative"]
+    print(f"Speculative: {m['acceptance_rate']:.1%} of draft tokens accepted, "
+          f"{m['tokens_per_target_pass']:.2f} tokens per teacher pass, ~{m['estimated_speedup']:.2f}x")
+print(f"Output: {args.output}")
@@ -0,0 +1,224 @@
+import sys
+import os
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import argparse
+import hashlib
+import json
+import re
+import sqlite3
+import struct
+
+from scripts.prepare_data import HEAD_BYTES, file_head_sha
+
+NUM_PERM = 128
+BANDS = 16
+ROWS = NUM_PERM // BANDS
+SHINGLE_WORDS = 3
+MERSENNE_PRIME = (1 << 61) - 1
+MAX_HASH = (1 << 32) - 1
+
+
+def _permutations(seed=1):
+    # Fixed (a, b) pairs so signatures stay comparable across runs and processes
+    perms = []
+    for i in range(NUM_PERM):
+        digest = hashlib.sha256(f"minhash:{seed}:{i}".encode()).digest()
+        a = int.from_bytes(digest[:8], "little") % MERSENNE_PRIME or 1
+        b = int.from_bytes(digest[8:16], "little") % MERSENNE_PRIME
+        perms.append((a, b))
+    return perms
+
+
+PERMUTATIONS = _permutations()
+
+
+def reasoning_text(response):
+    """The THOUGHT/ARCHITECTURE body — the restated QUESTION line would make every rerun of a scenario look alike."""
+    start = response.find("THOUGHT:")
+    body = response[start:] if start != -1 else response
+    body = body.split("END_OF_ARCH")[0]
+    return re.sub(r"\s+", " ", body.lower()).strip()
+
+
+def shingles(text):
+    words = text.split()
+    if len(words) <= SHINGLE_WORDS:
+        return {text}
+    return {" ".join(words[i:i + SHINGLE_WORDS]) for i in range(len(words) - SHINGLE_WORDS + 1)}
+
+
+def minhash(text):
+    hashes = [int.from_bytes(hashlib.blake2b(s.encode(), digest_size=4).digest(), "little") for s in shingles(text)]
+    return [min(((a * h + b) % MERSENNE_PRIME) & MAX_HASH for h in hashes) for a, b in PERMUTATIONS]
+
+
+def jaccard_estimate(sig_a, sig_b):
+    return sum(x == y for x, y in zip(sig_a, sig_b)) / NUM_PERM
+
+
+def band_keys(sig):
+    return [hashlib.blake2b(struct.pack(f"<{ROWS}I", *sig[i * ROWS:(i + 1) * ROWS]), digest_size=8).hexdigest()
+            for i in range(BANDS)]
+
+
+class DedupIndex:
+    """
+    Persistent exact + near-duplicate index over accepted samples.
+
+    Exact duplicates are caught by a hash of the normalised reasoning text.
+    Near duplicates use MinHash signatures bucketed by LSH bands, so a lookup
+    only compares against docs that share a band — not the whole corpus.
+    """
+
+    def __init__(self, path, threshold=0.8):
+        self.threshold = threshold
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self.db = sqlite3.connect(path)
+        self.db.executescript("""
+            CREATE TABLE IF NOT EXISTS docs (doc_id INTEGER PRIMARY KEY, key TEXT, content_hash TEXT UNIQUE, signature BLOB);
+            CREATE TABLE IF NOT EXISTS bands (band INTEGER, bucket TEXT, doc_id INTEGER);
+            CREATE INDEX IF NOT EXISTS bands_lookup ON bands (band, bucket);
+            CREATE TABLE IF NOT EXISTS meta (name TEXT PRIMARY KEY, value TEXT);
+        """)
+
+    def get_meta(self, name, default=None):
+        row = self.db.execute("SELECT value FROM meta WHERE name = ?", (name,)).fetchone()
+        return row[0] if row else default
+
+    def set_meta(self, name, value):
+        self.db.execute("INSERT OR REPLACE INTO meta (name, value) VALUES (?, ?)", (name, str(value)))
+
+    def check(self, text):
+        """Returns (verdict, match_key, signature, bands) where verdict is "exact", "near" or None."""
+        content_hash = hashlib.sha256(text.encode()).hexdigest()
+        row = self.db.execute("SELECT key FROM docs WHERE content_hash = ?", (content_hash,)).fetchone()
+        if row:
+            return "exact", row[0], None, None
+
+        sig = minhash(text)
+        bands = band_keys(sig)
+        candidates = set()
+        for band, bucket in enumerate(bands):
+            for (doc_id,) in self.db.execute("SELECT doc_id FROM bands WHERE band = ? AND bucket = ?", (band, bucket)):
+                candidates.add(doc_id)
+
+        for doc_id in candidates:
+            key, blob = self.db.execute("SELECT key, signature FROM docs WHERE doc_id = ?", (doc_id,)).fetchone()
+            if jaccard_estimate(sig, struct.unpack(f"<{NUM_PERM}I", blob)) >= self.threshold:
+                return "near", key, sig, bands
+
+        return None, None, sig, bands
+
+    def add(self, key, text, sig, bands):
+        content_hash = hashlib.sha256(text.encode()).hexdigest()
+        cur = self.db.execute(
+            "INSERT INTO docs (key, content_hash, signature) VALUES (?, ?, ?)",
+            (key, content_hash, struct.pack(f"<{NUM_PERM}I", *sig))
+        )
+        self.db.executemany(
+            "INSERT INTO bands (band, bucket, doc_id) VALUES (?, ?, ?)",
+            [(band, bucket, cur.lastrowid) for band, bucket in enumerate(bands)]
+        )
+
+    def commit(self):
+        self.db.commit()
+
+    def close(self):
+        self.db.close()  # anything not yet committed is dropped along with the uncommitted output tail
+
+
+def input_rewritten(index, input_path, offset):
+    """True when the input was regenerated rather than appended to (e.g. data_factory --fresh)."""
+    if os.path.getsize(input_path) < offset:
+        return True
+    head_len = int(index.get_meta("head_len", 0))
+    return head_len > 0 and index.get_meta("head_sha") != file_head_sha(input_path, head_len)
+
+
+def dedup(input_path, output_path, index_path, threshold=0.8, commit_every=256):
+    """
+    Appends unseen samples from input_path to output_path. Only input past the
+    offset stored in the index is read, so each new batch is checked against
+    the whole accepted corpus without re-reading it.
+
+    Every commit_every lines the output is fsynced, then the index rows, input
+    offset and output size are committed in one transaction. On start the
+    output is truncated back to the committed size, so a crash mid-run never
+    leaves lines the index doesn't know about.
+    """
+    index = DedupIndex(index_path, threshold)
+    offset = int(index.get_meta("input_offset", 0))
+    if input_rewritten(index, input_path, offset):
+        offset = 0  # the index still remembers what was accepted, so old samples come back as exact dups
+
+    output_size = int(index.get_meta("output_size", 0))
+    if os.path.exists(output_path) and os.path.getsize(output_path) > output_size:
+        with open(output_path, "r+b") as f:
+            f.truncate(output_size)
+
+    stats = {"kept": 0, "exact": 0, "near": 0}
+    try:
+        dedup_lines(index, input_path, output_path, offset, commit_every, stats)
+    finally:
+        index.close()
+    return stats
+
+
+def dedup_lines(index, input_path, output_path, offset, commit_every, stats):
+    with open(input_path, "rb") as in_f, open(output_path, "a") as out_f:
+
+        def commit():
+            out_f.flush()
+            os.fsync(out_f.fileno())
+            index.set_meta("input_offset", offset)
+            index.set_meta("output_size", out_f.tell())
+            # Fingerprint of already-consumed bytes only, so appends never look like a rewrite
+            head_len = min(offset, HEAD_BYTES)
+            index.set_meta("head_len", head_len)
+            index.set_meta("head_sha", file_head_sha(input_path, head_len))
+            index.commit()
+
+        in_f.seek(offset)
+        pending = 0
+        for line in iter(in_f.readline, b""):
+            if not line.endswith(b"\n"):
+                break
+            if pending >= commit_every:
+                commit()  # everything before this line is fully processed
+                pending = 0
+            offset += len(line)
+            pending += 1
+            if not line.strip():
+                continue
+            entry = json.loads(line)
+            text = reasoning_text(entry["response"])
+            verdict, match, sig, bands = index.check(text)
+            if verdict:
+                stats[verdict] += 1
+                print(f"[DUP:{verdict}] {entry.get('id', entry['instruction'][:40])} ~ {match}")
+                continue
+            index.add(entry.get("id", entry["instruction"][:80]), text, sig, bands)
+            out_f.write(json.dumps(entry) + "\n")
+            stats["kept"] += 1
+
+        commit()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Drop exact and near-duplicate teacher outputs.")
+    parser.add_argument("--input", default="data/training/synthetic_distillation.jsonl")
+    parser.add_argument("--output", default="data/training/deduped_distillation.jsonl")
+    parser.add_argument("--index", default="data/cache/dedup_index.sqlite")
+    parser.add_argument("--threshold", type=float, default=0.8, help="Estimated Jaccard similarity treated as a near duplicate")
+    parser.add_argument("--reset", action="store_true", help="Forget the index and output and start over")
+    args = parser.parse_args()
+
+    if args.reset:
+        for path in (args.index, args.output):
+            if os.path.exists(path):
+                os.remove(path)
+
+    stats = dedup(args.input, args.output, args.index, args.threshold)
+    print(f"Kept: {stats['kept']} | Exact dups: {stats['exact']} | Near dups: {stats['near']}")
+    print(f"Output: {args.output}")
@@ -1,6 +1,12 @@
 #!/bin/bash
 
+BASE_MODEL=mlx-community/Llama-3.2-3B-Instruct-4bit
+
 mlx_lm.fuse \
-  --model mlx-community/Llama-3.2-3B-Instruct-4bit \
+  --model $BASE_MODEL \
   --adapter-path models/adapters/ \
-  --save-path models/neural-edge-3b/
\ No newline at end of file
+  --save-path models/neural-edge-3b/
+
+# Record both in the artifact store; EXPERIMENT_ID links them to a v2 experiment
+python scripts/artifacts.py put models/adapters/ --kind adapter --base $BASE_MODEL ${EXPERIMENT_ID:+--experiment $EXPERIMENT_ID}
+python scripts/artifacts.py put models/neural-edge-3b/ --kind fused --base $BASE_MODEL ${EXPERIMENT_ID:+--experiment $EXPERIMENT_ID}
\ No newline at end of file
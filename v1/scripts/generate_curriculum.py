@@ -1,7 +1,3 @@
-from mlx_lm import generate
-from mlx_lm.sample_utils import make_sampler, make_repetition_penalty
-
-
 SYSTEM_PROMPT = """You are a distributed systems architect with deep expertise in failure modes, scalability, and real-world trade-offs.
 
 Respond ONLY in this exact format with no preamble, greetings, filler, or advice:
@@ -63,13 +59,13 @@ ARCHITECTURE: Write API -> Primary DB (WAL) -> CDC Consumer -> Change Event Queu
 END_OF_ARCH"""
 
 
-def generate_architecture(model, tokenizer, title, description):
-    """
-    Generates structured CoT architectural reasoning using instruct chat format.
-    Teacher model: Meta-Llama-3-8B-Instruct-4bit via MLX.
-    """
+SAMPLER_PARAMS = {"temp": 0.4, "top_p": 0.9, "min_p": 0.05}
+REPETITION_PENALTY = {"penalty": 1.2, "context_size": 20}
+MAX_TOKENS = 600
+
 
-    messages = [
+def build_messages(description):
+    return [
         {"role": "system", "content": SYSTEM_PROMPT},
         {
             "role": "user",
@@ -77,28 +73,48 @@ def generate_architecture(model, tokenizer, title, description):
         }
     ]
 
-    prompt = tokenizer.apply_chat_template(
-        messages,
+
+def build_prompt(tokenizer, description):
+    return tokenizer.apply_chat_template(
+        build_messages(description),
         tokenize=False,
         add_generation_prompt=True
     )
 
-    sampler = make_sampler(temp=0.4, top_p=0.9, min_p=0.05)
-    rep_penalty = make_repetition_penalty(penalty=1.2, context_size=20)
-
-    response = generate(
-        model,
-        tokenizer,
-        prompt=prompt,
-        max_tokens=600,
-        sampler=sampler,
-        logits_processors=[rep_penalty]
-    )
 
+def enforce_stop(response):
     response = response.strip()
 
     # Enforce hard stop at END_OF_ARCH
     if "END_OF_ARCH" in response:
         response = response.split("END_OF_ARCH")[0].strip() + "\nEND_OF_ARCH"
 
-    return response
\ No newline at end of file
+    return response
+
+
+def generate_architecture(model, tokenizer, title, description, prefix_cache=None, speculative=None):
+    """
+    Generates structured CoT architectural reasoning using instruct chat format.
+    Teacher model: Meta-Llama-3-8B-Instruct-4bit via MLX.
+
+    Decoding stops as soon as END_OF_ARCH is emitted. With a PrefixCache, the
+    SYSTEM_PROMPT + FEW_SHOT_EXAMPLES preamble is prefilled once and only the
+    trailing QUESTION is processed per call. With a SpeculativeDecoder (the
+    distilled 3B drafting for the teacher), tokens are sampled from the same
+    distribution in fewer teacher passes.
+    """
+    from scripts.backends import MLXBackend
+    from scripts.streaming import stream_until_stop
+
+    prompt = build_prompt(tokenizer, description)
+
+    if speculative is not None:
+        result = stream_until_stop(speculative, prompt, MAX_TOKENS, SAMPLER_PARAMS, REPETITION_PENALTY)
+    elif prefix_cache is not None:
+        prefix = prefix_cache.template_prefix(build_prompt)
+        result = prefix_cache.generate(prefix, prompt, MAX_TOKENS, SAMPLER_PARAMS, REPETITION_PENALTY)
+    else:
+        backend = MLXBackend(None, model, tokenizer)
+        result = stream_until_stop(backend, prompt, MAX_TOKENS, SAMPLER_PARAMS, REPETITION_PENALTY)
+
+    return enforce_stop(result.text)
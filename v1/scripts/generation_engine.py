@@ -0,0 +1,143 @@
+# scripts/generation_engine.py
+import json
+import os
+
+from scripts.generate_curriculum import (
+    MAX_TOKENS, REPETITION_PENALTY, SAMPLER_PARAMS, build_prompt, enforce_stop
+)
+from scripts.streaming import stream_until_stop
+
+
+def load_checkpoint(path):
+    if not os.path.exists(path):
+        return {}
+    with open(path, "r") as f:
+        return json.load(f)
+
+
+def save_checkpoint(path, checkpoint):
+    # Write-then-rename so a crash mid-write never leaves a truncated checkpoint
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(checkpoint, f, indent=2)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+
+def completed_ids(output_path):
+    """Scenario ids already present in the output — covers a crash between output and checkpoint writes."""
+    ids = set()
+    if not os.path.exists(output_path):
+        return ids
+    with open(output_path, "r") as f:
+        for line in f:
+            if not line.strip():
+                continue
+            try:
+                ids.add(json.loads(line)["id"])
+            except (ValueError, KeyError):
+                continue  # partial last line from a crash, or a legacy entry without id
+    return ids
+
+
+class GenerationEngine:
+    """
+    Batched, resumable teacher generation over curriculum scenarios.
+
+    Each batch is one backend call, and every sequence stops at END_OF_ARCH.
+    Accepted entries are appended to the output as soon as the batch
+    finishes, and the checkpoint records the outcome per scenario id, so a
+    restarted run only generates what is left.
+    """
+
+    def __init__(self, backend, output_path, checkpoint_path, batch_size=8,
+                 max_tokens=MAX_TOKENS, retry_skipped=False, prefix_cache=None, speculative=None):
+        self.backend = backend
+        self.output_path = output_path
+        self.checkpoint_path = checkpoint_path
+        self.batch_size = batch_size
+        self.max_tokens = max_tokens
+        self.retry_skipped = retry_skipped
+        self.prefix_cache = prefix_cache
+        self.speculative = speculative
+        self.tokens_saved = 0
+
+    def pending(self, scenarios, checkpoint):
+        done = completed_ids(self.output_path)
+        for scenario_id, status in checkpoint.items():
+            if status == "ok" or (status == "skipped" and not self.retry_skipped):
+                done.add(scenario_id)
+        return [s for s in scenarios if s["id"] not in done]
+
+    def generate(self, prompts):
+        if self.speculative is not None:
+            # Draft-and-verify is per sequence; each prompt streams until END_OF_ARCH
+            texts = []
+            for p in prompts:
+                result = stream_until_stop(self.speculative, p, self.max_tokens, SAMPLER_PARAMS, REPETITION_PENALTY)
+                self.tokens_saved += result.tokens_saved
+                texts.append(result.text)
+            return texts
+
+        if self.prefix_cache is None:
+            # One batched decode; each sequence drops out of the batch once its END_OF_ARCH completes
+            results = self.backend.generate_batch_until_stop(prompts, self.max_tokens, SAMPLER_PARAMS,
+                                                            REPETITION_PENALTY)
+            self.tokens_saved += sum(r.tokens_saved for r in results)
+            return [r.text for r in results]
+
+        # Shared few-shot prefix is prefilled once; each prompt only pays for its QUESTION suffix,
+        # and streaming lets each one stop at END_OF_ARCH instead of running to max_tokens
+        prefix = self.prefix_cache.template_prefix(build_prompt)
+        texts = []
+        for p in prompts:
+            result = self.prefix_cache.generate(prefix, p, self.max_tokens, SAMPLER_PARAMS, REPETITION_PENALTY)
+            self.tokens_saved += result.tokens_saved
+            texts.append(result.text)
+        return texts
+
+    def run(self, scenarios, progress=None):
+        os.makedirs(os.path.dirname(self.output_path) or ".", exist_ok=True)
+        checkpoint = load_checkpoint(self.checkpoint_path)
+        todo = self.pending(scenarios, checkpoint)
+        stats = {"total": len(scenarios), "resumed": len(scenarios) - len(todo), "generated": 0, "skipped": 0}
+        if progress is not None:
+            progress.update(stats["resumed"])
+
+        with open(self.output_path, "a") as out_f:
+            for start in range(0, len(todo), self.batch_size):
+                batch = todo[start:start + self.batch_size]
+                prompts = [build_prompt(self.backend.tokenizer, item["description"]) for item in batch]
+                responses = self.generate(prompts)
+
+                for item, response in zip(batch, responses):
+                    wisdom = enforce_stop(response)
+
+                    # Only structural check — is the output complete?
+                    if not wisdom or "END_OF_ARCH" not in wisdom:
+                        print(f"\n[SKIP] Malformed output for: {item['title']}")
+                        checkpoint[item["id"]] = "skipped"
+                        stats["skipped"] += 1
+                        continue
+
+                    entry = {
+                        "id": item["id"],
+                        "instruction": item["description"],
+                        "response": wisdom
+                    }
+                    out_f.write(json.dumps(entry) + "\n")
+                    checkpoint[item["id"]] = "ok"
+                    stats["generated"] += 1
+
+                out_f.flush()
+                os.fsync(out_f.fileno())
+                save_checkpoint(self.checkpoint_path, checkpoint)
+
+                if progress is not None:
+                    progress.update(len(batch))
+
+        stats["tokens_saved"] = self.tokens_saved
+        if self.speculative is not None:
+            stats["speculative"] = self.speculative.metrics()
+        return stats
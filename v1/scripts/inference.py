@@ -0,0 +1,157 @@
+# scripts/inference.py
+import queue
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from scripts.backends import get_backend
+from scripts.streaming import stream_until_stop
+from scripts.utils import SAMPLER_PARAMS, clean_response, format_prompt, has_structure
+
+
+class Generation:
+    __slots__ = ("text", "tokens", "elapsed", "ttft", "tokens_saved", "structured", "cached")
+
+    def __init__(self, text, tokens, elapsed, ttft, tokens_saved, cached=False):
+        self.text = text
+        self.tokens = tokens
+        self.elapsed = elapsed
+        self.ttft = ttft
+        self.tokens_saved = tokens_saved
+        self.structured = has_structure(text)
+        self.cached = cached
+
+    def to_dict(self):
+        return {"text": self.text, "tokens": self.tokens, "elapsed": self.elapsed,
+                "ttft": self.ttft, "tokens_saved": self.tokens_saved}
+
+    @classmethod
+    def from_dict(cls, d, cached=False):
+        # Benchmark entries (harness.to_cached) carry extra timing fields under the same keys
+        return cls(d["text"], d["tokens"], d["elapsed"], d["ttft"], d["tokens_saved"], cached=cached)
+
+    @property
+    def tps(self):
+        return self.tokens / self.elapsed if self.elapsed else 0.0
+
+
+class Cancelled(Exception):
+    """Raised inside a decode thread once the caller has stopped reading the stream."""
+
+
+class InferenceLayer:
+    """
+    Runs the same question through several loaded models at once.
+
+    Each model decodes on its own thread; tokens are funnelled through one
+    queue so the caller (the Streamlit script thread) can render every column
+    as tokens arrive. Wall time is roughly the slowest model, not the sum.
+    Closing the stream (or a Streamlit rerun dropping it) stops every decode
+    thread at its next token. With a ResponseCache, repeat questions are answered from the cache.
+    Models that resolve to the same base plus different adapters share one
+    copy of the base weights.
+    """
+
+    def __init__(self, backends, cache=None):
+        self.backends = backends
+        self.cache = cache
+        self.fingerprints = {}
+
+    @classmethod
+    def load(cls, models, backend_name="mlx", cache=None, store=None, host=None, **backend_kwargs):
+        """
+        models: {label: model_path}. With an ArtifactStore, a path may also be
+        "experiment:<id>" or "artifact:<id>". Each distinct base loads once, in
+        parallel; adapters are then applied on top of the shared weights.
+        With a ModelHostClient whose host is running, the models stay resident
+        there instead and this process only attaches to them.
+        """
+        resolved = {label: store.resolve(path) if store is not None else (path, None)
+                    for label, path in models.items()}
+        bases = {base for base, _ in resolved.values()}
+        load = get_backend
+        if host is not None and host.available():
+            load = host.backend
+        with ThreadPoolExecutor(max_workers=len(bases)) as pool:
+            futures = {base: pool.submit(load, backend_name, base, **backend_kwargs) for base in bases}
+            loaded = {base: f.result() for base, f in futures.items()}
+        return cls({label: loaded[base].with_adapter(adapter) if adapter else loaded[base]
+                    for label, (base, adapter) in resolved.items()}, cache)
+
+    def _cache_key(self, label, backend, prompt, max_tokens, sampler_params, seed):
+        if label not in self.fingerprints:
+            self.fingerprints[label] = self.cache.model_fingerprint(backend, backend.adapter_path)
+        return self.cache.key(self.fingerprints[label], prompt, sampler_params, max_tokens, seed)
+
+    def _decode(self, label, backend, question, max_tokens, sampler_params, seed, use_cache, events, cancel):
+        start = time.perf_counter()
+        first = []
+
+        def on_text(segment):
+            if cancel.is_set():
+                raise Cancelled(label)  # collect_until_stop closes the backend stream on the way out
+            if not first:
+                first.append(time.perf_counter() - start)
+            events.put(("token", label, segment))
+
+        try:
+            prompt = format_prompt(backend.tokenizer, question)
+            key = None
+            if self.cache is not None and use_cache:
+                key = self._cache_key(label, backend, prompt, max_tokens, sampler_params, seed)
+                hit = self.cache.get(key)
+                if hit is not None:
+                    events.put(("token", label, hit["text"]))
+                    events.put(("done", label, Generation.from_dict(hit, cached=True)))
+                    return
+
+            if seed is not None:
+                backend.seed(seed)
+            result = stream_until_stop(backend, prompt, max_tokens, sampler_params, on_text=on_text)
+            elapsed = time.perf_counter() - start
+            generation = Generation(clean_response(result.text), result.tokens, elapsed,
+                                    first[0] if first else None, result.tokens_saved)
+            if key is not None:
+                self.cache.put(key, generation.to_dict())
+            events.put(("done", label, generation))
+        except Cancelled:
+            pass  # nobody is reading the queue any more
+        except Exception as e:
+            events.put(("error", label, e))
+
+    def stream(self, question, max_tokens=500, sampler_params=SAMPLER_PARAMS, seed=None, use_cache=True):
+        """
+        Yields ("token", label, text) as each model emits tokens, then one
+        ("done", label, Generation) or ("error", label, exception) per model.
+        use_cache=False skips the response cache for this call only. Closing
+        the generator early cancels decoding that is still running.
+        """
+        events = queue.Queue()
+        cancel = threading.Event()
+        threads = [
+            threading.Thread(target=self._decode, args=(label, backend, question, max_tokens, sampler_params, seed,
+                                                        use_cache, events, cancel),
+                             daemon=True)
+            for label, backend in self.backends.items()
+        ]
+        for t in threads:
+            t.start()
+
+        remaining = len(threads)
+        try:
+            while remaining:
+                event = events.get()
+                if event[0] != "token":
+                    remaining -= 1
+                yield event
+        finally:
+            cancel.set()
+
+    def run(self, question, max_tokens=500, sampler_params=SAMPLER_PARAMS, seed=None, use_cache=True):
+        results = {}
+        for kind, label, payload in self.stream(question, max_tokens, sampler_params, seed, use_cache):
+            if kind == "error":
+                raise payload
+            if kind == "done":
+                results[label] = payload
+        return results
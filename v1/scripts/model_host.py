@@ -0,0 +1,432 @@
+# scripts/model_host.py
+import argparse
+import gc
+import json
+import os
+import socket
+import socketserver
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+
+# Only the stdlib at import time: clients pay nothing for a host they may not use.
+# scripts.backends (and through it mlx_lm) is imported by the server, or on fallback.
+
+
+def default_address():
+    return os.environ.get("NED_MODEL_HOST") or os.path.join(tempfile.gettempdir(), f"ned-model-host-{os.getuid()}.sock")
+
+
+class ModelHostError(RuntimeError):
+    pass
+
+
+def model_bytes(backend):
+    """Resident size of the weights; 0 for backends without real arrays (fake)."""
+    if not hasattr(backend.model, "parameters"):
+        return 0
+    from mlx.utils import tree_flatten
+    return sum(v.nbytes for _, v in tree_flatten(backend.model.parameters()))
+
+
+def release_memory(backend_name):
+    gc.collect()
+    if backend_name == "mlx":
+        import mlx.core as mx
+        clear = getattr(mx, "clear_cache", None) or mx.metal.clear_cache
+        clear()
+
+
+class _Resident:
+    __slots__ = ("backend", "size", "adapters", "lock", "loaded_at", "uses")
+
+    def __init__(self, backend, size):
+        self.backend = backend
+        self.size = size
+        self.adapters = {}
+        self.lock = threading.Lock()  # one generation at a time per set of weights
+        self.loaded_at = time.time()
+        self.uses = 0
+
+
+class ModelHost:
+    """
+    Keeps loaded backends resident across client processes.
+
+    Models are keyed by (backend, path, load options). Adapters are applied
+    on top of an already-resident base and live and die with it. When a new
+    load would push the total past `budget_bytes`, least recently used
+    bases are dropped first; the model being loaded is always kept, even if
+    it alone exceeds the budget.
+    """
+
+    def __init__(self, budget_bytes):
+        self.budget = budget_bytes
+        self.resident = OrderedDict()
+        self.lock = threading.Lock()
+        self.loading = {}  # key -> [lock, waiters] while a first load is in progress
+        self.stats = {"hits": 0, "loads": 0, "evictions": 0, "load_s": 0.0, "requests": 0}
+
+    def used(self):
+        return sum(r.size for r in self.resident.values())
+
+    def _evict_for(self, size, keep):
+        evicted = []
+        while self.resident and self.used() + size > self.budget:
+            key = next(iter(self.resident))
+            if key == keep:
+                break
+            self.resident.pop(key)
+            evicted.append(key)
+            self.stats["evictions"] += 1
+        return evicted
+
+    def acquire(self, backend_name, model_path, adapter_path=None, options=None):
+        """Returns (resident entry, backend), loading the base and/or adapter on first use."""
+        key = (backend_name, model_path, json.dumps(options or {}, sort_keys=True))
+        with self.lock:
+            entry = self.resident.get(key)
+            if entry is not None:
+                self.resident.move_to_end(key)
+                self.stats["hits"] += 1
+            else:
+                loading = self.loading.setdefault(key, [threading.Lock(), 0])
+                loading[1] += 1
+
+        if entry is None:
+            try:
+                entry = self._load(key, loading[0], backend_name, model_path, options)
+            finally:
+                with self.lock:  # the last waiter drops the lock, so keys don't accumulate
+                    loading[1] -= 1
+                    if not loading[1]:
+                        del self.loading[key]
+
+        if not adapter_path:
+            return entry, entry.backend
+        with entry.lock:
+            if adapter_path not in entry.adapters:
+                entry.adapters[adapter_path] = entry.backend.with_adapter(adapter_path)
+            return entry, entry.adapters[adapter_path]
+
+    def _load(self, key, load_lock, backend_name, model_path, options):
+        with load_lock:  # concurrent first requests for one model load it once
+            with self.lock:
+                entry = self.resident.get(key)
+            if entry is None:
+                from scripts.backends import get_backend
+                start = time.perf_counter()
+                backend = get_backend(backend_name, model_path, **(options or {}))
+                entry = _Resident(backend, model_bytes(backend))
+                with self.lock:
+                    evicted = self._evict_for(entry.size, key)
+                    self.resident[key] = entry
+                    self.stats["loads"] += 1
+                    self.stats["load_s"] += time.perf_counter() - start
+                if evicted:
+                    print(f"[MODEL HOST] evicted {', '.join(k[1] for k in evicted)} to fit {model_path}")
+                    release_memory(backend_name)
+                print(f"[MODEL HOST] loaded {model_path} ({entry.size / 1e9:.2f} GB) "
+                      f"in {time.perf_counter() - start:.1f}s")
+        return entry
+
+    def evict(self, model_path=None):
+        with self.lock:
+            keys = [k for k in self.resident if model_path is None or k[1] == model_path]
+            for key in keys:
+                self.resident.pop(key)
+            self.stats["evictions"] += len(keys)
+        if keys:
+            release_memory("mlx" if any(k[0] == "mlx" for k in keys) else None)
+        return len(keys)
+
+    def status(self):
+        with self.lock:
+            models = [{"backend": k[0], "model_path": k[1], "options": json.loads(k[2]), "bytes": r.size,
+                       "adapters": sorted(r.adapters), "uses": r.uses, "loaded_at": r.loaded_at}
+                      for k, r in reversed(self.resident.items())]
+        return {"budget_bytes": self.budget, "used_bytes": sum(m["bytes"] for m in models), "models": models,
+                **self.stats}
+
+
+class _Handler(socketserver.StreamRequestHandler):
+    """One JSON request line in; JSON lines out, the last one {"done": ...} or {"error": ...}."""
+
+    def send(self, message):
+        self.wfile.write(json.dumps(message).encode() + b"\n")
+        self.wfile.flush()
+
+    def handle(self):
+        line = self.rfile.readline()
+        if not line:
+            return
+        host = self.server.host
+        with host.lock:  # one handler thread per connection (see _Server)
+            host.stats["requests"] += 1
+        try:
+            request = json.loads(line)
+            op = request.pop("op")
+            if op == "status":
+                return self.send({"done": host.status()})
+            if op == "evict":
+                return self.send({"done": host.evict(request.get("model_path"))})
+            if op == "shutdown":
+                self.send({"done": True})
+                return threading.Thread(target=self.server.shutdown, daemon=True).start()
+
+            entry, backend = host.acquire(request.pop("backend"), request.pop("model_path"),
+                                          request.pop("adapter_path", None), request.pop("options", None))
+            if op == "describe":
+                tok = backend.tokenizer
+                return self.send({"done": {"bos_token": getattr(tok, "bos_token", None),
+                                           "eos_token": getattr(tok, "eos_token", None),
+                                           "eos_token_id": getattr(tok, "eos_token_id", None)}})
+            if op == "tokenizer":
+                if request["method"] not in ("apply_chat_template", "encode", "decode"):
+                    raise ModelHostError(f"tokenizer method {request['method']} is not exposed")
+                return self.send({"done": getattr(backend.tokenizer, request["method"])(*request["args"], **request["kwargs"])})
+            if op == "encode":
+                return self.send({"done": backend.encode(request["prompt"])})
+            if op in ("peak_memory", "reset_peak_memory"):
+                return self.send({"done": getattr(backend, op)()})
+
+            with entry.lock:
+                entry.uses += 1
+                if request.get("seed") is not None:
+                    backend.seed(request["seed"])
+                if op == "generate_batch":
+                    return self.send({"done": backend.generate_batch(
+                        request["prompts"], request["max_tokens"], request["sampler_params"],
+                        request.get("repetition_penalty"))})
+                if op == "generate_batch_until_stop":
+                    return self.send({"done": [r.to_dict() for r in backend.generate_batch_until_stop(
+                        request["prompts"], request["max_tokens"], request["sampler_params"],
+                        request.get("repetition_penalty"))]})
+                if op == "stream":
+                    segments = backend.stream(request["prompt"], request["max_tokens"], request["sampler_params"],
+                                              request.get("repetition_penalty"))
+                    try:
+                        for segment in segments:
+                            self.send({"text": segment})
+                    finally:
+                        segments.close()  # client hung up: stop decoding
+                    return self.send({"done": True})
+            raise ModelHostError(f"unknown op {op}")
+        except (BrokenPipeError, ConnectionResetError):
+            pass
+        except Exception as e:
+            try:
+                self.send({"error": f"{type(e).__name__}: {e}"})
+            except OSError:
+                pass
+
+
+class _Server(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+
+def serve(address, budget_bytes, preload=()):
+    if os.path.exists(address):
+        if ModelHostClient(address).available():
+            raise SystemExit(f"A model host is already listening on {address}")
+        os.remove(address)  # stale socket from a crashed host
+    host = ModelHost(budget_bytes)
+    for spec in preload:
+        backend_name, _, model_path = spec.partition(":")
+        host.acquire(backend_name, model_path)
+    server = _Server(address, _Handler)
+    server.host = host
+    os.chmod(address, 0o600)
+    print(f"[MODEL HOST] listening on {address}, budget {budget_bytes / 1e9:.1f} GB")
+    try:
+        server.serve_forever()
+    finally:
+        server.server_close()
+        if os.path.exists(address):
+            os.remove(address)
+
+
+class ModelHostClient:
+    """Talks to a running host. NED_MODEL_HOST=0 turns the host off for every client."""
+
+    def __init__(self, address=None, timeout=None):
+        self.address = address or default_address()
+        self.timeout = timeout
+
+    def _connect(self):
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        sock.settimeout(self.timeout)
+        sock.connect(self.address)
+        return sock
+
+    def messages(self, op, **request):
+        sock = self._connect()
+        try:
+            sock.sendall(json.dumps({"op": op, **request}).encode() + b"\n")
+            with sock.makefile("rb") as f:
+                for line in f:
+                    message = json.loads(line)
+                    if "error" in message:
+                        raise ModelHostError(message["error"])
+                    yield message
+                    if "done" in message:
+                        return
+            raise ModelHostError("model host closed the connection")
+        finally:
+            sock.close()
+
+    def call(self, op, **request):
+        for message in self.messages(op, **request):
+            if "done" in message:
+                return message["done"]
+
+    def available(self):
+        if self.address == "0" or not os.path.exists(self.address):
+            return False
+        try:
+            self.call("status")
+            return True
+        except (OSError, ModelHostError):
+            return False
+
+    def backend(self, name, model_path, adapter_path=None, **options):
+        """Attaches to (loading if needed) a resident model; behaves like the in-process backend."""
+        return RemoteBackend(self, name, model_path, adapter_path, options)
+
+
+class RemoteTokenizer:
+    def __init__(self, backend, info):
+        self._backend = backend
+        self.bos_token = info["bos_token"]
+        self.eos_token = info["eos_token"]
+        self.eos_token_id = info["eos_token_id"]
+
+    def _call(self, method, *args, **kwargs):
+        return self._backend._call("tokenizer", method=method, args=args, kwargs=kwargs)
+
+    def apply_chat_template(self, messages, **kwargs):
+        return self._call("apply_chat_template", messages, **kwargs)
+
+    def encode(self, text, **kwargs):
+        return self._call("encode", text, **kwargs)
+
+    def decode(self, tokens, **kwargs):
+        return self._call("decode", list(tokens), **kwargs)
+
+
+class RemoteBackend:
+    """
+    Backend proxy for a model resident in the host. Covers generation and
+    tokenization; KV-cache operations (prefix cache, speculative decoding)
+    need the model in-process and are not forwarded.
+    """
+
+    def __init__(self, client, name, model_path, adapter_path=None, options=None):
+        self.client = client
+        self.name = name
+        self.model_path = model_path
+        self.adapter_path = adapter_path
+        self.options = options or {}
+        self.pending_seed = None
+        self.tokenizer = RemoteTokenizer(self, self._call("describe"))
+
+    def _call(self, op, **request):
+        return self.client.call(op, backend=self.name, model_path=self.model_path, adapter_path=self.adapter_path,
+                                options=self.options, **request)
+
+    def _take_seed(self):
+        seed, self.pending_seed = self.pending_seed, None
+        return seed
+
+    def with_adapter(self, adapter_path):
+        return RemoteBackend(self.client, self.name, self.model_path, adapter_path, self.options)
+
+    def encode(self, prompt):
+        return self._call("encode", prompt=prompt)
+
+    def seed(self, value):
+        # Sent with the next generation so another client can't reseed in between
+        self.pending_seed = value
+
+    def generate_batch(self, prompts, max_tokens, sampler_params, repetition_penalty=None):
+        return self._call("generate_batch", prompts=prompts, max_tokens=max_tokens, sampler_params=sampler_params,
+                          repetition_penalty=repetition_penalty, seed=self._take_seed())
+
+    def generate_batch_until_stop(self, prompts, max_tokens, sampler_params, repetition_penalty=None):
+        from scripts.streaming import StreamResult
+        results = self._call("generate_batch_until_stop", prompts=prompts, max_tokens=max_tokens,
+                             sampler_params=sampler_params, repetition_penalty=repetition_penalty,
+                             seed=self._take_seed())
+        return [StreamResult(**r) for r in results]
+
+    def stream(self, prompt, max_tokens, sampler_params, repetition_penalty=None, state=None):
+        if state is not None:
+            raise ModelHostError("prompt caches can't be sent to the model host; use an in-process backend")
+        for message in self.client.messages("stream", backend=self.name, model_path=self.model_path,
+                                            adapter_path=self.adapter_path, options=self.options, prompt=prompt,
+                                            max_tokens=max_tokens, sampler_params=sampler_params,
+                                            repetition_penalty=repetition_penalty, seed=self._take_seed()):
+            if "text" in message:
+                yield message["text"]
+
+    def peak_memory(self):
+        return self._call("peak_memory")
+
+    def reset_peak_memory(self):
+        self._call("reset_peak_memory")
+
+
+def connect_backend(name, model_path, adapter_path=None, address=None, quiet=False, **options):
+    """
+    The model from a running host if there is one, otherwise loaded in this
+    process as before. `options` are the backend's constructor arguments.
+    """
+    client = ModelHostClient(address)
+    if client.available():
+        try:
+            return client.backend(name, model_path, adapter_path, **options)
+        except (OSError, ModelHostError) as e:
+            print(f"[MODEL HOST] {e} — loading in-process instead")
+    elif not quiet and client.address != "0":
+        print(f"[MODEL HOST] not running, loading {model_path} in-process "
+              f"(start one with: python -m scripts.model_host serve)")
+    from scripts.backends import get_backend
+    if adapter_path:
+        options["adapter_path"] = adapter_path
+    return get_backend(name, model_path, **options)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Long-lived local host that keeps models loaded between runs.")
+    parser.add_argument("--address", default=None, help="Unix socket (default: $NED_MODEL_HOST or a per-user temp path)")
+    sub = parser.add_subparsers(dest="command", required=True)
+    serve_parser = sub.add_parser("serve", help="Run the host in the foreground")
+    serve_parser.add_argument("--budget-gb", type=float, default=12.0, help="Evict least recently used models beyond this")
+    serve_parser.add_argument("--preload", action="append", default=[], metavar="BACKEND:MODEL",
+                              help="e.g. mlx:mlx-community/Llama-3.2-3B-Instruct-4bit")
+    sub.add_parser("status", help="Show resident models")
+    evict_parser = sub.add_parser("evict", help="Drop one model, or all of them")
+    evict_parser.add_argument("model_path", nargs="?")
+    sub.add_parser("stop", help="Shut the host down")
+    args = parser.parse_args()
+
+    address = args.address or default_address()
+    if args.command == "serve":
+        serve(address, int(args.budget_gb * 1e9), args.preload)
+    else:
+        client = ModelHostClient(address)
+        if not client.available():
+            raise SystemExit(f"No model host on {address}")
+        if args.command == "status":
+            s = client.call("status")
+            print(f"{s['used_bytes'] / 1e9:.2f} / {s['budget_bytes'] / 1e9:.1f} GB · {s['loads']} loads, "
+                  f"{s['hits']} hits, {s['evictions']} evictions, {s['requests']} requests")
+            for m in s["models"]:
+                adapters = f" + {len(m['adapters'])} adapters" if m["adapters"] else ""
+                print(f"  {m['backend']:<5} {m['model_path']}{adapters}  {m['bytes'] / 1e9:.2f} GB  {m['uses']} uses")
+        elif args.command == "evict":
+            print(f"Evicted {client.call('evict', model_path=args.model_path)} model(s)")
+        elif args.command == "stop":
+            client.call("shutdown")
+            print("Model host stopped")
@@ -0,0 +1,199 @@
+# scripts/packed_data.py
+import hashlib
+import json
+import os
+
+import numpy as np
+
+SPLITS = ("train", "valid")
+FORMAT_VERSION = 2
+
+
+def tokenizer_hash(tokenizer):
+    """Changes whenever the vocabulary, special tokens or chat template would tokenize differently."""
+    h = hashlib.sha256(type(tokenizer).__name__.encode())
+    if hasattr(tokenizer, "get_vocab"):
+        h.update(json.dumps(sorted(tokenizer.get_vocab().items())).encode())
+    for attr in ("chat_template", "bos_token", "eos_token"):
+        h.update(f"\0{attr}={getattr(tokenizer, attr, None)}".encode())
+    return h.hexdigest()
+
+
+def load_tokenizer(name):
+    if name == "fake":
+        from scripts.backends import FakeTokenizer
+        return FakeTokenizer()
+    from transformers import AutoTokenizer
+    return AutoTokenizer.from_pretrained(name)
+
+
+def file_sha(path):
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def tokenize_chat(tokenizer, messages):
+    """
+    Applies the chat template once. Returns token ids and a loss mask that is
+    1 only on the assistant reply (and its end-of-turn token), 0 on the
+    system/user prompt.
+    """
+    prompt = list(tokenizer.apply_chat_template(messages[:-1], tokenize=True, add_generation_prompt=True))
+    full = list(tokenizer.apply_chat_template(messages, tokenize=True, add_generation_prompt=False))
+    n = 0
+    while n < min(len(prompt), len(full)) and prompt[n] == full[n]:
+        n += 1
+    return full, [0] * n + [1] * (len(full) - n)
+
+
+def pack(lengths, seq_len):
+    """First-fit decreasing: groups sample indices into rows of at most seq_len tokens."""
+    rows, free = [], []
+    for i in sorted(range(len(lengths)), key=lambda i: -lengths[i]):
+        n = min(lengths[i], seq_len)
+        for r, space in enumerate(free):
+            if n <= space:
+                rows[r].append(i)
+                free[r] -= n
+                break
+        else:
+            rows.append([i])
+            free.append(seq_len - n)
+    return rows
+
+
+def write_split(jsonl_path, out_dir, split, tokenizer, seq_len):
+    """
+    Tokenizes a chat-format split into flat memory-mappable arrays:
+      <split>.tokens.bin  uint32 token ids, samples back to back
+      <split>.mask.bin    uint8 loss mask, same layout
+      <split>.offsets.npy int64 sample boundaries (n + 1)
+      <split>.rows.npy    int64 [row, sample] packing plan, rows in order
+
+    Samples whose assistant reply starts past seq_len would be all prompt
+    after truncation, with nothing to learn from; they are skipped.
+    """
+    tokens_path = os.path.join(out_dir, f"{split}.tokens.bin")
+    mask_path = os.path.join(out_dir, f"{split}.mask.bin")
+    offsets, total, skipped = [0], 0, 0
+    with open(jsonl_path, "r") as in_f, open(tokens_path, "wb") as tok_f, open(mask_path, "wb") as mask_f:
+        for line in in_f:
+            if not line.strip():
+                continue
+            ids, mask = tokenize_chat(tokenizer, json.loads(line)["messages"])
+            if not any(mask[:seq_len]):
+                skipped += 1
+                continue
+            tok_f.write(np.asarray(ids, dtype=np.uint32).tobytes())
+            mask_f.write(np.asarray(mask, dtype=np.uint8).tobytes())
+            total += len(ids)
+            offsets.append(total)
+
+    offsets = np.asarray(offsets, dtype=np.int64)
+    rows = pack(np.diff(offsets).tolist(), seq_len)
+    plan = np.asarray([(r, i) for r, samples in enumerate(rows) for i in samples], dtype=np.int64).reshape(-1, 2)
+    np.save(os.path.join(out_dir, f"{split}.offsets.npy"), offsets)
+    np.save(os.path.join(out_dir, f"{split}.rows.npy"), plan)
+    lengths = np.diff(offsets)
+    if skipped:
+        print(f"[PACK] Skipped {skipped} {split} samples with no assistant tokens in the first {seq_len}")
+    return {"samples": len(lengths), "tokens": int(total), "rows": len(rows), "skipped": skipped,
+            "truncated": int((lengths > seq_len).sum()),
+            "fill": float(np.minimum(lengths, seq_len).sum() / (len(rows) * seq_len)) if rows else 0.0}
+
+
+def build_packed(data_dir, tokenizer, seq_len=2048, cache_root=None):
+    """
+    Pre-tokenizes and packs train/valid.jsonl once per (tokenizer, seq_len,
+    input contents). The result lives in packed/<key>/ and is reused as long
+    as none of those change. Returns the directory.
+    """
+    sources = {split: os.path.join(data_dir, f"{split}.jsonl") for split in SPLITS}
+    fingerprint = {"format": FORMAT_VERSION, "tokenizer": tokenizer_hash(tokenizer), "seq_len": seq_len,
+                   "inputs": {split: file_sha(path) for split, path in sources.items() if os.path.exists(path)}}
+    key = hashlib.sha256(json.dumps(fingerprint, sort_keys=True).encode()).hexdigest()[:16]
+    out_dir = os.path.join(cache_root or os.path.join(data_dir, "packed"), f"{fingerprint['tokenizer'][:12]}-{seq_len}-{key}")
+    meta_path = os.path.join(out_dir, "meta.json")
+    if os.path.exists(meta_path):
+        return out_dir
+
+    tmp_dir = f"{out_dir}.tmp{os.getpid()}"
+    os.makedirs(tmp_dir, exist_ok=True)
+    splits = {split: write_split(path, tmp_dir, split, tokenizer, seq_len)
+              for split, path in sources.items() if os.path.exists(path)}
+    with open(os.path.join(tmp_dir, "meta.json"), "w") as f:
+        json.dump({**fingerprint, "splits": splits}, f, indent=2)
+    os.replace(tmp_dir, out_dir)
+    return out_dir
+
+
+class PackedDataset:
+    """
+    Memory-mapped view of one packed split. Nothing is read until a batch
+    touches it, so opening the dataset costs the same whatever its size.
+
+    Each row holds whole samples back to back, truncated at seq_len and
+    right-padded. `segments` numbers the samples within a row (0 = padding):
+    attention must not cross a segment boundary, and loss is only taken on
+    assistant tokens whose target is in the same segment.
+    """
+
+    def __init__(self, packed_dir, split="train"):
+        with open(os.path.join(packed_dir, "meta.json"), "r") as f:
+            self.meta = json.load(f)
+        self.seq_len = self.meta["seq_len"]
+        self.tokens = np.memmap(os.path.join(packed_dir, f"{split}.tokens.bin"), dtype=np.uint32, mode="r")
+        self.mask = np.memmap(os.path.join(packed_dir, f"{split}.mask.bin"), dtype=np.uint8, mode="r")
+        self.offsets = np.load(os.path.join(packed_dir, f"{split}.offsets.npy"), mmap_mode="r")
+        plan = np.load(os.path.join(packed_dir, f"{split}.rows.npy"))
+        self.rows = np.split(plan[:, 1], np.flatnonzero(np.diff(plan[:, 0])) + 1) if len(plan) else []
+
+    def __len__(self):
+        return len(self.rows)
+
+    def row(self, r, pad_id=0):
+        tokens = np.full(self.seq_len, pad_id, dtype=np.int32)
+        mask = np.zeros(self.seq_len, dtype=np.uint8)
+        segments = np.zeros(self.seq_len, dtype=np.int32)
+        pos = 0
+        for s, i in enumerate(self.rows[r], 1):
+            start, end = int(self.offsets[i]), int(self.offsets[i + 1])
+            n = min(end - start, self.seq_len - pos)
+            tokens[pos:pos + n] = self.tokens[start:start + n]
+            mask[pos:pos + n] = self.mask[start:start + n]
+            segments[pos:pos + n] = s
+            pos += n
+        return tokens, mask, segments
+
+    def batch(self, rows, pad_id=0):
+        """
+        inputs/targets are the row shifted by one. loss_mask keeps assistant
+        targets inside the same sample as their input; segments is per input.
+        """
+        tokens, mask, segments = (np.stack(a) for a in zip(*(self.row(r, pad_id) for r in rows)))
+        same = (segments[:, 1:] == segments[:, :-1]) & (segments[:, 1:] > 0)
+        return {"inputs": tokens[:, :-1], "targets": tokens[:, 1:], "loss_mask": mask[:, 1:] * same,
+                "segments": segments[:, :-1]}
+
+    def iterate(self, batch_size, seed=0):
+        """Endless shuffled batches of rows, reshuffled every epoch."""
+        rng = np.random.default_rng(seed)
+        while True:
+            order = rng.permutation(len(self))
+            for start in range(0, len(order) - batch_size + 1, batch_size):
+                yield self.batch(order[start:start + batch_size])
+
+
+def attention_allowed(segments):
+    """
+    (B, L, L) bool: causal and within the same packed sample. Padding only
+    attends to itself, so no query row is fully masked (softmax over
+    nothing is NaN, which would reach the loss through the padded logits).
+    """
+    L = segments.shape[1]
+    causal = np.tril(np.ones((L, L), dtype=bool))
+    same = segments[:, :, None] == segments[:, None, :]
+    return causal[None] & same & ((segments[:, :, None] > 0) | np.eye(L, dtype=bool)[None])
@@ -0,0 +1,118 @@
+# scripts/prefix_cache.py
+import hashlib
+import json
+import os
+from collections import OrderedDict
+
+from scripts.streaming import STOP_SEQUENCE, stream_until_stop
+
+
+def shared_prefix(a, b):
+    n = 0
+    for x, y in zip(a, b):
+        if x != y:
+            break
+        n += 1
+    return a[:n]
+
+
+class PrefixCache:
+    """
+    Prefilled prompt-prefix state (KV cache), computed once per model and
+    tokenizer and reused for every prompt that starts with the same tokens.
+
+    States are keyed on a content hash of the weights (and adapter), so a
+    model re-fused at the same path never picks up stale state. They live in
+    an in-memory LRU and on disk under cache_dir, both bounded. Callers get a
+    copy of the cached state, since decoding mutates it.
+    """
+
+    def __init__(self, backend, cache_dir="data/cache/prefix", max_memory_entries=2, max_disk_entries=8,
+                 fingerprints=None):
+        self.backend = backend
+        self.fingerprints = fingerprints  # optional ResponseCache that memoises weight digests across runs
+        self.weights = None
+        self.cache_dir = cache_dir
+        self.max_memory_entries = max_memory_entries
+        self.max_disk_entries = max_disk_entries
+        self.memory = OrderedDict()
+        self.prefixes = {}
+        self.stats = {"memory_hits": 0, "disk_hits": 0, "misses": 0, "prefix_tokens_reused": 0, "fallbacks": 0}
+
+    def weights_digest(self):
+        """Content hash of the weights, computed once per instance; opens no cache of its own."""
+        if self.weights is None:
+            from scripts.response_cache import model_fingerprint
+            fingerprint = self.fingerprints.model_fingerprint if self.fingerprints is not None else model_fingerprint
+            self.weights = fingerprint(self.backend, getattr(self.backend, "adapter_path", None))
+        return self.weights
+
+    def key(self, prefix_tokens):
+        tokenizer = self.backend.tokenizer
+        tokenizer_id = getattr(tokenizer, "name_or_path", None) or type(tokenizer).__name__
+        h = hashlib.sha256()
+        h.update(f"{self.weights_digest()}:{tokenizer_id}\n".encode())
+        h.update(json.dumps(prefix_tokens).encode())
+        return h.hexdigest()[:32]
+
+    def template_prefix(self, build_prompt):
+        """Tokens shared by every prompt build_prompt(tokenizer, question) renders, whatever the question."""
+        if build_prompt not in self.prefixes:
+            probes = [self.backend.encode(build_prompt(self.backend.tokenizer, q)) for q in ("A", "B")]
+            self.prefixes[build_prompt] = shared_prefix(*probes)
+        return self.prefixes[build_prompt]
+
+    def _disk_path(self, key):
+        return os.path.join(self.cache_dir, key + self.backend.state_suffix)
+
+    def _remember(self, key, state):
+        self.memory[key] = state
+        self.memory.move_to_end(key)
+        while len(self.memory) > self.max_memory_entries:
+            self.memory.popitem(last=False)
+
+    def _evict_disk(self):
+        suffix = self.backend.state_suffix
+        files = [os.path.join(self.cache_dir, f) for f in os.listdir(self.cache_dir) if f.endswith(suffix)]
+        files.sort(key=os.path.getmtime)
+        for path in files[:max(0, len(files) - self.max_disk_entries)]:
+            os.remove(path)
+
+    def get(self, prefix_tokens):
+        """Returns a private copy of the prefilled state for prefix_tokens, prefilling only on a full miss."""
+        key = self.key(prefix_tokens)
+
+        if key in self.memory:
+            self.stats["memory_hits"] += 1
+            self.memory.move_to_end(key)
+            return self.backend.copy_state(self.memory[key])
+
+        path = self._disk_path(key)
+        if os.path.exists(path):
+            self.stats["disk_hits"] += 1
+            state = self.backend.load_state(path)
+            os.utime(path)
+        else:
+            self.stats["misses"] += 1
+            state = self.backend.prefill(prefix_tokens)
+            os.makedirs(self.cache_dir, exist_ok=True)
+            self.backend.save_state(path, state, {"model_path": self.backend.model_path,
+                                                  "prefix_tokens": str(len(prefix_tokens))})
+            self._evict_disk()
+
+        self._remember(key, state)
+        return self.backend.copy_state(state)
+
+    def generate(self, prefix_tokens, prompt, max_tokens, sampler_params, repetition_penalty=None, stop=STOP_SEQUENCE):
+        """Streams a completion for prompt from the cached prefix state, stopping at `stop`. Returns a StreamResult."""
+        tokens = self.backend.encode(prompt)
+        n = len(prefix_tokens)
+        if n == 0 or n >= len(tokens) or tokens[:n] != prefix_tokens:
+            # Template tokenized differently at the boundary — pay the full prefill rather than guess
+            self.stats["fallbacks"] += 1
+            return stream_until_stop(self.backend, tokens, max_tokens, sampler_params, repetition_penalty, stop)
+
+        state = self.get(prefix_tokens)
+        self.stats["prefix_tokens_reused"] += n
+        return stream_until_stop(self.backend, tokens[n:], max_tokens, sampler_params, repetition_penalty,
+                                 stop, state=state)
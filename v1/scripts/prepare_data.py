@@ -1,5 +1,10 @@
+import sys
+import os
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import argparse
+import hashlib
 import json
-import random
 
 SYSTEM_PROMPT = """You are a distributed systems architect.
 Respond ONLY in this exact format with no preamble, greetings, filler, or advice:
@@ -13,16 +18,9 @@ THOUGHT:
 ARCHITECTURE: <component1> -> <component2> -> ...
 END_OF_ARCH"""
 
-random.seed(42)
-
-with open("data/training/synthetic_distillation.jsonl", "r") as f:
-    entries = [json.loads(line) for line in f if line.strip()]
+SPLITS = ("train", "valid")
+HEAD_BYTES = 4096
 
-# Shuffle and split 80/20 train/valid
-random.shuffle(entries)
-split = int(len(entries) * 0.8)
-train_entries = entries[:split]
-valid_entries = entries[split:]
 
 def to_chat_format(entry):
     return {
@@ -33,13 +31,221 @@ def to_chat_format(entry):
         ]
     }
 
-with open("data/training/train.jsonl", "w") as f:
-    for entry in train_entries:
-        f.write(json.dumps(to_chat_format(entry)) + "\n")
 
-with open("data/training/valid.jsonl", "w") as f:
-    for entry in valid_entries:
-        f.write(json.dumps(to_chat_format(entry)) + "\n")
+def record_key(entry):
+    if "id" in entry:
+        return str(entry["id"])
+    return hashlib.sha256((entry["instruction"] + "\0" + entry["response"]).encode()).hexdigest()
+
+
+def assign_split(key, train_ratio):
+    # Hash, not shuffle: a sample lands in the same split on every rerun and append
+    bucket = int(hashlib.sha256(key.encode()).hexdigest()[:8], 16) / 0x100000000
+    return "train" if bucket < train_ratio else "valid"
+
+
+def file_head_sha(path, length):
+    with open(path, "rb") as f:
+        return hashlib.sha256(f.read(length)).hexdigest()
+
+
+def load_manifest(path):
+    if not os.path.exists(path):
+        return None
+    with open(path, "r") as f:
+        return json.load(f)
+
+
+def save_manifest(path, manifest):
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(manifest, f, indent=2)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+
+def new_manifest(input_path, train_ratio, shard_size):
+    return {
+        "input": {"path": input_path, "offset": 0, "head_len": 0, "head_sha": None},
+        "train_ratio": train_ratio,
+        "shard_size": shard_size,
+        "splits": {split: {"records": 0, "shards": []} for split in SPLITS}
+    }
+
+
+def needs_rebuild(manifest, input_path, train_ratio):
+    """True when the input was rewritten (not appended to) or the split ratio changed."""
+    if manifest is None or manifest["train_ratio"] != train_ratio:
+        return True
+    offset = manifest["input"]["offset"]
+    if os.path.getsize(input_path) < offset:
+        return True
+    head = manifest["input"]
+    return head["head_len"] > 0 and head["head_sha"] != file_head_sha(input_path, head["head_len"])
+
+
+class ShardWriter:
+    """Appends to the last shard of a split, rolling over at shard_size records."""
+
+    def __init__(self, out_dir, split, state, shard_size):
+        self.out_dir = out_dir
+        self.split = split
+        self.state = state
+        self.shard_size = shard_size
+        self.f = None
+
+    def _open_shard(self):
+        shards = self.state["shards"]
+        if not shards or shards[-1]["records"] >= self.shard_size:
+            shards.append({"file": f"{self.split}-{len(shards):05d}.jsonl", "records": 0, "bytes": 0})
+        shard = shards[-1]
+        path = os.path.join(self.out_dir, shard["file"])
+        self.f = open(path, "ab")
+        # Drop anything written after the last committed manifest (crash mid-batch)
+        self.f.truncate(shard["bytes"])
+        self.f.seek(shard["bytes"])
+
+    def write(self, record):
+        if self.f is None or self.state["shards"][-1]["records"] >= self.shard_size:
+            self.close()
+            self._open_shard()
+        line = (json.dumps(record) + "\n").encode()
+        self.f.write(line)
+        shard = self.state["shards"][-1]
+        shard["records"] += 1
+        shard["bytes"] += len(line)
+        self.state["records"] += 1
+
+    def flush(self):
+        if self.f is not None:
+            self.f.flush()
+            os.fsync(self.f.fileno())
+
+    def close(self):
+        if self.f is not None:
+            self.flush()
+            self.f.close()
+            self.f = None
+
+
+def write_flat_splits(out_dir, manifest):
+    """
+    Appends newly sharded records to train.jsonl / valid.jsonl, the layout
+    mlx_lm.lora reads. Each split's "flat" watermark says how much is already there.
+    """
+    for split in SPLITS:
+        state = manifest["splits"][split]
+        flat = state.setdefault("flat", {"records": 0, "bytes": 0})
+        skip = flat["records"]
+        with open(os.path.join(out_dir, f"{split}.jsonl"), "ab") as flat_f:
+            flat_f.truncate(flat["bytes"])
+            for shard in state["shards"]:
+                if skip >= shard["records"]:
+                    skip -= shard["records"]
+                    continue
+                with open(os.path.join(out_dir, "shards", shard["file"]), "rb") as shard_f:
+                    for i, line in enumerate(shard_f):
+                        if i >= shard["records"]:
+                            break
+                        if i >= skip:
+                            flat_f.write(line)
+                            flat["records"] += 1
+                            flat["bytes"] += len(line)
+                skip = 0
+            flat_f.flush()
+            os.fsync(flat_f.fileno())
+
+
+def prepare(input_path, out_dir, train_ratio=0.8, shard_size=50000, flush_every=1000, flat=True, rebuild=False):
+    """
+    Streams new lines of input_path into hash-assigned train/valid shards.
+
+    Only bytes past the manifest's recorded input offset are read, so an
+    append of N samples costs O(N) regardless of corpus size, and memory
+    stays bounded by a single line.
+    """
+    shard_dir = os.path.join(out_dir, "shards")
+    manifest_path = os.path.join(out_dir, "manifest.json")
+    os.makedirs(shard_dir, exist_ok=True)
+
+    manifest = load_manifest(manifest_path)
+    if rebuild or needs_rebuild(manifest, input_path, train_ratio):
+        for name in os.listdir(shard_dir):
+            os.remove(os.path.join(shard_dir, name))
+        manifest = new_manifest(input_path, train_ratio, shard_size)
+
+    manifest["shard_size"] = shard_size
+    writers = {split: ShardWriter(shard_dir, split, manifest["splits"][split], shard_size) for split in SPLITS}
+    added = {split: 0 for split in SPLITS}
+
+    def commit(offset):
+        for w in writers.values():
+            w.flush()
+        manifest["input"]["offset"] = offset
+        # Fingerprint of already-consumed bytes only, so appends never look like a rewrite
+        manifest["input"]["head_len"] = min(offset, HEAD_BYTES)
+        manifest["input"]["head_sha"] = file_head_sha(input_path, manifest["input"]["head_len"])
+        save_manifest(manifest_path, manifest)
+
+    with open(input_path, "rb") as in_f:
+        in_f.seek(manifest["input"]["offset"])
+        offset = in_f.tell()
+        pending = 0
+        for line in iter(in_f.readline, b""):
+            if not line.endswith(b"\n"):
+                break  # generator is mid-write; pick this line up next run
+            offset += len(line)
+            if not line.strip():
+                continue
+            entry = json.loads(line)
+            split = assign_split(record_key(entry), train_ratio)
+            writers[split].write(to_chat_format(entry))
+            added[split] += 1
+            pending += 1
+            if pending >= flush_every:
+                commit(offset)
+                pending = 0
+        commit(offset)
+
+    for w in writers.values():
+        w.close()
+
+    if flat:
+        write_flat_splits(out_dir, manifest)
+        save_manifest(manifest_path, manifest)
+
+    return added, {split: manifest["splits"][split]["records"] for split in SPLITS}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Stream synthetic samples into sharded train/valid splits.")
+    parser.add_argument("--input", default="data/training/deduped_distillation.jsonl")
+    parser.add_argument("--out-dir", default="data/training")
+    parser.add_argument("--train-ratio", type=float, default=0.8)
+    parser.add_argument("--shard-size", type=int, default=50000)
+    parser.add_argument("--no-flat", dest="flat", action="store_false",
+                        help="Skip maintaining train.jsonl/valid.jsonl for mlx_lm.lora")
+    parser.add_argument("--rebuild", action="store_true", help="Ignore the manifest and reprocess the whole input")
+    parser.add_argument("--pack", metavar="TOKENIZER", default=None,
+                        help="Also pre-tokenize and pack the flat splits for scripts/train_packed.py "
+                             "(HF tokenizer path or repo, or 'fake')")
+    parser.add_argument("--seq-len", type=int, default=2048, help="Packed row length in tokens")
+    args = parser.parse_args()
+
+    added, totals = prepare(args.input, args.out_dir, args.train_ratio, args.shard_size,
+                            flat=args.flat, rebuild=args.rebuild)
+
+    print(f"Train: +{added['train']} new, {totals['train']} total -> {args.out_dir}/shards/train-*.jsonl")
+    print(f"Valid: +{added['valid']} new, {totals['valid']} total -> {args.out_dir}/shards/valid-*.jsonl")
+    print(f"Manifest: {args.out_dir}/manifest.json")
 
-print(f"Train: {len(train_entries)} entries -> data/training/train.jsonl")
-print(f"Valid: {len(valid_entries)} entries -> data/training/valid.jsonl")
\ No newline at end of file
+    if args.pack:
+        from scripts.packed_data import build_packed, load_tokenizer
+        packed_dir = build_packed(args.out_dir, load_tokenizer(args.pack), args.seq_len)
+        with open(os.path.join(packed_dir, "meta.json"), "r") as f:
+            splits = json.load(f)["splits"]
+        for split, info in splits.items():
+            print(f"Packed {split}: {info['samples']} samples, {info['tokens']} tokens -> {info['rows']} rows "
+                  f"of {args.seq_len} ({info['fill']:.0%} full, {info['truncated']} truncated)")
+        print(f"Packed dataset: {packed_dir}")
@@ -0,0 +1,153 @@
+# scripts/response_cache.py
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+
+WEIGHT_SUFFIXES = (".safetensors", ".npz", ".json", ".model")
+
+
+def _hf_snapshot(model_path):
+    """Local snapshot dir for a hub repo id, without touching the network."""
+    try:
+        from huggingface_hub import snapshot_download
+        return snapshot_download(model_path, local_files_only=True)
+    except Exception:
+        return None
+
+
+def weight_files(directory):
+    return sorted(
+        os.path.join(root, name)
+        for root, _, names in os.walk(directory)
+        for name in names if name.endswith(WEIGHT_SUFFIXES)
+    )
+
+
+def dir_digest(directory, files=None):
+    """Content hash of the weight files under directory (names relative to it)."""
+    h = hashlib.sha256()
+    for f in weight_files(directory) if files is None else files:
+        h.update(os.path.relpath(f, directory).encode())
+        with open(f, "rb") as fh:
+            for chunk in iter(lambda: fh.read(1 << 20), b""):
+                h.update(chunk)
+    return h.hexdigest()
+
+
+def model_fingerprint(backend, adapter_path=None, digest=dir_digest):
+    """
+    Content hash of a backend's weights plus its adapter. `digest` hashes one
+    directory; ResponseCache passes a memoised one.
+    """
+    parts = [backend.name]
+    local = backend.model_path if backend.model_path and os.path.isdir(backend.model_path) \
+        else _hf_snapshot(backend.model_path)
+    parts.append(digest(local) if local else str(backend.model_path))
+    if adapter_path:
+        parts.append(digest(adapter_path))
+    return hashlib.sha256("\n".join(parts).encode()).hexdigest()
+
+
+class ResponseCache:
+    """
+    Persistent LRU cache of generations keyed by content hashes of the model
+    weights (and adapter), the formatted prompt and the sampler settings.
+
+    Entries expire after `ttl` seconds; once the stored payload exceeds
+    `max_bytes`, least-recently-used entries are evicted. `enabled=False`
+    bypasses every lookup and write — use it for real latency measurements.
+    """
+
+    def __init__(self, path="data/cache/responses.sqlite", max_bytes=64 * 1024 * 1024, ttl=7 * 24 * 3600,
+                 enabled=True):
+        self.enabled = enabled
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.stats = {"hits": 0, "misses": 0, "expired": 0, "evictions": 0, "bypassed": 0}
+        self.lock = threading.Lock()
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self.db = sqlite3.connect(path, check_same_thread=False)
+        self.db.executescript("""
+            CREATE TABLE IF NOT EXISTS entries (key TEXT PRIMARY KEY, value TEXT, size INTEGER, created_at REAL, accessed_at REAL);
+            CREATE INDEX IF NOT EXISTS entries_lru ON entries (accessed_at);
+            CREATE TABLE IF NOT EXISTS fingerprints (path TEXT PRIMARY KEY, stat TEXT, digest TEXT);
+        """)
+
+    def _dir_digest(self, directory):
+        # Hashing multi-GB weights is slow, so digests are memoised against file sizes + mtimes
+        files = weight_files(directory)
+        stat = json.dumps([(f, os.path.getsize(f), os.path.getmtime(f)) for f in files])
+        row = self.db.execute("SELECT stat, digest FROM fingerprints WHERE path = ?", (directory,)).fetchone()
+        if row and row[0] == stat:
+            return row[1]
+
+        digest = dir_digest(directory, files)
+        self.db.execute("INSERT OR REPLACE INTO fingerprints (path, stat, digest) VALUES (?, ?, ?)",
+                        (directory, stat, digest))
+        self.db.commit()
+        return digest
+
+    def model_fingerprint(self, backend, adapter_path=None):
+        with self.lock:
+            return model_fingerprint(backend, adapter_path, self._dir_digest)
+
+    @staticmethod
+    def key(fingerprint, prompt, sampler_params, max_tokens, seed=None):
+        payload = json.dumps({"model": fingerprint, "prompt": prompt, "sampler": sampler_params,
+                              "max_tokens": max_tokens, "seed": seed}, sort_keys=True)
+        return hashlib.sha256(payload.encode()).hexdigest()
+
+    def get(self, key):
+        if not self.enabled:
+            self.stats["bypassed"] += 1
+            return None
+        with self.lock:
+            row = self.db.execute("SELECT value, created_at FROM entries WHERE key = ?", (key,)).fetchone()
+            now = time.time()
+            if row is None:
+                self.stats["misses"] += 1
+                return None
+            if now - row[1] > self.ttl:
+                self.db.execute("DELETE FROM entries WHERE key = ?", (key,))
+                self.db.commit()
+                self.stats["expired"] += 1
+                self.stats["misses"] += 1
+                return None
+            self.db.execute("UPDATE entries SET accessed_at = ? WHERE key = ?", (now, key))
+            self.db.commit()
+            self.stats["hits"] += 1
+            return json.loads(row[0])
+
+    def put(self, key, value):
+        if not self.enabled:
+            return
+        blob = json.dumps(value)
+        now = time.time()
+        with self.lock:
+            self.db.execute(
+                "INSERT OR REPLACE INTO entries (key, value, size, created_at, accessed_at) VALUES (?, ?, ?, ?, ?)",
+                (key, blob, len(blob), now, now)
+            )
+            self._evict()
+            self.db.commit()
+
+    def _evict(self):
+        total = self.db.execute("SELECT COALESCE(SUM(size), 0) FROM entries").fetchone()[0]
+        while total > self.max_bytes:
+            row = self.db.execute("SELECT key, size FROM entries ORDER BY accessed_at LIMIT 1").fetchone()
+            if row is None:
+                break
+            self.db.execute("DELETE FROM entries WHERE key = ?", (row[0],))
+            total -= row[1]
+            self.stats["evictions"] += 1
+
+    @property
+    def hit_rate(self):
+        lookups = self.stats["hits"] + self.stats["misses"]
+        return self.stats["hits"] / lookups if lookups else 0.0
+
+    def close(self):
+        self.db.close()
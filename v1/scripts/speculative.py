@@ -0,0 +1,264 @@
+# scripts/speculative.py
+import time
+
+import numpy as np
+
+
+def sampling_probs(logits, temp, top_p=1.0, min_p=0.0, context=None, repetition_penalty=None):
+    """
+    The distribution mlx_lm's make_sampler draws from: repetition penalty on
+    the raw logits, then top_p and min_p filtering on the untempered
+    distribution, then temperature over the survivors. temp == 0 is argmax.
+    """
+    logits = np.asarray(logits, dtype=np.float64).copy()
+    if repetition_penalty and context:
+        recent = np.unique(np.asarray(context[-repetition_penalty["context_size"]:]))
+        penalty = repetition_penalty["penalty"]
+        logits[recent] = np.where(logits[recent] < 0, logits[recent] * penalty, logits[recent] / penalty)
+    if temp == 0:
+        probs = np.zeros_like(logits)
+        probs[np.argmax(logits)] = 1.0
+        return probs
+
+    probs = np.exp(logits - logits.max())
+    probs /= probs.sum()
+    keep = np.ones_like(probs, dtype=bool)
+    if 0 < top_p < 1:
+        order = np.argsort(-probs)
+        cumulative = np.cumsum(probs[order])
+        # Smallest prefix whose mass reaches top_p; the token that crosses it stays
+        keep[:] = False
+        keep[order[:np.searchsorted(cumulative, top_p) + 1]] = True
+    if min_p > 0:
+        keep &= probs >= min_p * probs.max()
+
+    scaled = np.where(keep, logits / temp, -np.inf)
+    out = np.exp(scaled - scaled[keep].max())
+    return out / out.sum()
+
+
+def sample(probs, rng):
+    return int(min(np.searchsorted(np.cumsum(probs), rng.random() * probs.sum(), side="right"), len(probs) - 1))
+
+
+class LMState:
+    __slots__ = ("cache", "n")
+
+    def __init__(self, cache, n):
+        self.cache = cache
+        self.n = n
+
+
+class MLXLogits:
+    """Next-token logits from an MLXBackend's model over a KV cache that can be rewound."""
+
+    def __init__(self, backend):
+        self.backend = backend
+        self.tokenizer = backend.tokenizer
+        self.vocab_size = None
+
+    def encode(self, prompt):
+        return self.backend.encode(prompt)
+
+    def prefill(self, tokens):
+        return LMState(self.backend.prefill(tokens), len(tokens))
+
+    def forward(self, state, tokens):
+        import mlx.core as mx
+        logits = self.backend.model(mx.array(tokens)[None], cache=state.cache)[0]
+        state.n += len(tokens)
+        logits = np.array(logits.astype(mx.float32))
+        self.vocab_size = logits.shape[-1]
+        return logits
+
+    def rewind(self, state, n):
+        from mlx_lm.models.cache import trim_prompt_cache
+        trim_prompt_cache(state.cache, n)
+        state.n -= n
+
+
+class ToyTokenizer:
+    eos_token_id = None  # toy runs always go to max_tokens
+
+    def encode(self, text):
+        return [(ord(c) - 32) % 96 for c in text]
+
+    def decode(self, tokens):
+        return "".join(chr(32 + t % 96) for t in tokens)
+
+
+class ToyLM:
+    """
+    NumPy bigram language model for exercising speculative decoding on CPU.
+
+    Logits depend only on the previous token. `sharpness` scales how peaked
+    they are (the rigid distillation format is low-entropy); a draft is the
+    teacher's table plus Gaussian noise, like a student that mostly agrees.
+    `delay_s` is charged once per forward call, the way a memory-bound
+    decode pays for reading the weights whatever the number of positions.
+    """
+
+    def __init__(self, vocab_size=96, seed=0, sharpness=4.0, delay_s=0.0, table=None):
+        rng = np.random.default_rng(seed)
+        self.table = table if table is not None else rng.normal(0, sharpness, (vocab_size, vocab_size))
+        self.delay_s = delay_s
+        self.tokenizer = ToyTokenizer()
+        self.vocab_size = self.table.shape[1]
+
+    def noisy(self, noise, seed=1, delay_s=0.0):
+        rng = np.random.default_rng(seed)
+        return ToyLM(table=self.table + rng.normal(0, noise, self.table.shape), delay_s=delay_s)
+
+    def encode(self, prompt):
+        return self.tokenizer.encode(prompt)
+
+    def prefill(self, tokens):
+        return LMState(list(tokens), len(tokens))
+
+    def forward(self, state, tokens):
+        if self.delay_s:
+            time.sleep(self.delay_s)
+        state.cache.extend(tokens)
+        state.n += len(tokens)
+        return self.table[np.asarray(tokens) % self.vocab_size]
+
+    def rewind(self, state, n):
+        del state.cache[len(state.cache) - n:]
+        state.n -= n
+
+
+class SpeculativeDecoder:
+    """
+    Speculative sampling (Leviathan et al. / Chen et al.) with a small draft model.
+
+    Each round the draft proposes `num_draft` tokens one at a time, then the
+    target scores all of them in a single forward pass. Draft token x is
+    accepted with probability min(1, p(x) / q(x)); the first rejection is
+    replaced by a sample from max(0, p - q), and if every proposal survives
+    the target's next-token distribution gives one bonus token. p and q are
+    the sampling distributions after the same temp/top_p/min_p/repetition
+    penalty, so the output follows exactly the distribution of sampling the
+    target on its own; only the number of target passes changes.
+    """
+
+    def __init__(self, target, draft, num_draft=4, seed=None):
+        self.target = target
+        self.draft = draft
+        self.tokenizer = target.tokenizer
+        self.num_draft = num_draft
+        self.rng = np.random.default_rng(seed)
+        self.stats = {"samples": 0, "rounds": 0, "proposed": 0, "accepted": 0, "generated": 0,
+                      "target_s": 0.0, "draft_s": 0.0, "draft_calls": 0}
+
+    def seed(self, value):
+        self.rng = np.random.default_rng(value)
+
+    def _forward(self, model, state, tokens, clock):
+        start = time.perf_counter()
+        logits = model.forward(state, tokens)
+        self.stats[clock] += time.perf_counter() - start
+        return logits
+
+    def _sync(self, model, state, history, clock):
+        """Brings a state to having consumed everything but the last token of history."""
+        want = len(history) - 1
+        if state.n > want:
+            model.rewind(state, state.n - want)
+        elif state.n < want:
+            self._forward(model, state, history[state.n:want], clock)
+
+    def generate_tokens(self, tokens, max_tokens, sampler_params, repetition_penalty=None):
+        """Yields sampled token ids one by one; the caller stops early by closing the generator."""
+        sp = {"temp": sampler_params.get("temp", 0.0), "top_p": sampler_params.get("top_p", 1.0),
+              "min_p": sampler_params.get("min_p", 0.0), "repetition_penalty": repetition_penalty}
+        history = list(tokens)
+        target_state = self.target.prefill(history[:-1])
+        draft_state = self.draft.prefill(history[:-1])
+        self.stats["samples"] += 1
+        generated = 0
+
+        while generated < max_tokens:
+            k = min(self.num_draft, max_tokens - generated - 1)
+            self._sync(self.draft, draft_state, history, "draft_s")
+            proposals, q = [], []
+            feed = [history[-1]]
+            for _ in range(k):
+                logits = self._forward(self.draft, draft_state, feed, "draft_s")[-1]
+                self.stats["draft_calls"] += 1
+                qi = sampling_probs(logits, context=history + proposals, **sp)
+                feed = [sample(qi, self.rng)]
+                proposals.append(feed[0])
+                q.append(qi)
+
+            self._sync(self.target, target_state, history, "target_s")
+            logits = self._forward(self.target, target_state, [history[-1]] + proposals, "target_s")
+            if q and logits.shape[-1] != len(q[0]):
+                raise ValueError(f"Draft vocabulary ({len(q[0])}) doesn't match the target's ({logits.shape[-1]})")
+            self.stats["rounds"] += 1
+            self.stats["proposed"] += k
+
+            accepted = 0
+            for i, x in enumerate(proposals):
+                p = sampling_probs(logits[i], context=history + proposals[:i], **sp)
+                if self.rng.random() * q[i][x] < p[x]:
+                    accepted += 1
+                    continue
+                residual = np.maximum(p - q[i], 0)
+                new = sample(residual if residual.sum() > 0 else p, self.rng)
+                break
+            else:
+                new = sample(sampling_probs(logits[k], context=history + proposals, **sp), self.rng)
+            self.stats["accepted"] += accepted
+
+            for token in proposals[:accepted] + [new]:
+                history.append(token)
+                generated += 1
+                self.stats["generated"] += 1
+                yield token
+                if token == self.tokenizer.eos_token_id:
+                    return
+
+    def stream(self, prompt, max_tokens, sampler_params, repetition_penalty=None, state=None):
+        """Backend-style stream(): one text segment per token, so collect_until_stop can stop at END_OF_ARCH."""
+        tokens = list(prompt) if isinstance(prompt, list) else self.target.encode(prompt)
+        out, text = [], ""
+        for token in self.generate_tokens(tokens, max_tokens, sampler_params, repetition_penalty):
+            out.append(token)
+            decoded = self.tokenizer.decode(out)
+            if decoded.endswith("\ufffd"):
+                yield ""  # rest of a multi-byte char still to come
+                continue
+            yield decoded[len(text):]
+            text = decoded
+
+    def metrics(self):
+        s = self.stats
+        rounds, proposed = s["rounds"], s["proposed"]
+        metrics = {**s, "acceptance_rate": s["accepted"] / proposed if proposed else None,
+                   "tokens_per_target_pass": s["generated"] / rounds if rounds else None}
+        # Leviathan et al.: speedup = tokens per round / (1 + k * c), c = draft / target cost per call
+        if rounds and s["draft_calls"] and s["target_s"]:
+            c = (s["draft_s"] / s["draft_calls"]) / (s["target_s"] / rounds)
+            metrics["estimated_speedup"] = metrics["tokens_per_target_pass"] / (1 + c * proposed / rounds)
+        else:
+            metrics["estimated_speedup"] = None
+        return metrics
+
+
+def plain_tokens(model, tokens, max_tokens, sampler_params, rng):
+    """Reference autoregressive sampling from `model` alone, one forward pass per token."""
+    state = model.prefill(tokens[:-1])
+    last, out = tokens[-1], []
+    for _ in range(max_tokens):
+        probs = sampling_probs(model.forward(state, [last])[-1], sampler_params["temp"], sampler_params["top_p"],
+                               sampler_params["min_p"])
+        last = sample(probs, rng)
+        out.append(last)
+    return out
+
+
+def total_variation(a, b):
+    keys = set(a) | set(b)
+    na, nb = sum(a.values()), sum(b.values())
+    return 0.5 * sum(abs(a.get(x, 0) / na - b.get(x, 0) / nb) for x in keys)
+
@@ -0,0 +1,76 @@
+# scripts/streaming.py
+STOP_SEQUENCE = "END_OF_ARCH"
+
+
+class StopSequenceMatcher:
+    """
+    Incremental stop-sequence detector for streamed text.
+
+    Only the last len(stop) - 1 characters are carried between feeds, so a
+    sentinel split across token boundaries ("END", "_OF", "_AR", "CH") is
+    still caught, at O(len(segment)) cost per token.
+    """
+
+    def __init__(self, stop=STOP_SEQUENCE):
+        self.stop = stop
+        self.tail = ""
+
+    def feed(self, text):
+        """Returns the offset in `text` just past the end of the stop sequence, or -1."""
+        window = self.tail + text
+        i = window.find(self.stop)
+        if i != -1:
+            return i + len(self.stop) - len(self.tail)
+        self.tail = window[-(len(self.stop) - 1):] if len(self.stop) > 1 else ""
+        return -1
+
+
+class StreamResult:
+    __slots__ = ("text", "tokens", "max_tokens", "stopped")
+
+    def __init__(self, text, tokens, max_tokens, stopped):
+        self.text = text
+        self.tokens = tokens
+        self.max_tokens = max_tokens
+        self.stopped = stopped
+
+    def to_dict(self):
+        return {"text": self.text, "tokens": self.tokens, "max_tokens": self.max_tokens, "stopped": self.stopped}
+
+    @property
+    def tokens_saved(self):
+        """Decode steps skipped by stopping at the sentinel instead of running to max_tokens."""
+        return self.max_tokens - self.tokens if self.stopped else 0
+
+
+def collect_until_stop(segments, max_tokens, stop=STOP_SEQUENCE, on_text=None):
+    """
+    Consumes a token-by-token text stream until the stop sequence completes.
+    Closing the generator is what ends decoding on the backend side.
+    """
+    matcher = StopSequenceMatcher(stop)
+    parts = []
+    tokens = 0
+    stopped = False
+    try:
+        for segment in segments:
+            tokens += 1
+            end = matcher.feed(segment)
+            if end != -1:
+                segment = segment[:end]
+                stopped = True
+            parts.append(segment)
+            if on_text is not None and segment:
+                on_text(segment)
+            if stopped:
+                break
+    finally:
+        if hasattr(segments, "close"):
+            segments.close()
+    return StreamResult("".join(parts), tokens, max_tokens, stopped)
+
+
+def stream_until_stop(backend, prompt, max_tokens, sampler_params, repetition_penalty=None,
+                      stop=STOP_SEQUENCE, state=None, on_text=None):
+    segments = backend.stream(prompt, max_tokens, sampler_params, repetition_penalty, state=state)
+    return collect_until_stop(segments, max_tokens, stop, on_text)
@@ -8,4 +8,10 @@ mlx_lm.lora \
   --batch-size 2 \
   --num-layers 8 \
   --learning-rate 1e-4 \
-  --adapter-path models/adapters/
\ No newline at end of file
+  --adapter-path models/adapters/ || exit 1
+
+# Gate the adapter on output structure over the validation split (exits 1 below the threshold)
+python benchmarks/quality_eval.py \
+  --model mlx-community/Llama-3.2-3B-Instruct-4bit \
+  --adapter models/adapters/ \
+  --min-structured 0.9
@@ -0,0 +1,114 @@
+import sys
+import os
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import argparse
+import json
+import time
+
+import numpy as np
+
+from scripts.packed_data import PackedDataset, attention_allowed, build_packed
+
+MODEL_ID = "mlx-community/Llama-3.2-3B-Instruct-4bit"
+
+
+def forward(model, inputs, segments):
+    """Logits with a block-diagonal causal mask so packed samples never attend to each other."""
+    import mlx.core as mx
+    mask = mx.array(attention_allowed(np.asarray(segments)))[:, None]  # boolean, broadcast over heads
+    hidden = model.model(inputs, mask=mask)
+    if getattr(model, "lm_head", None) is not None:
+        return model.lm_head(hidden)
+    return model.model.embed_tokens.as_linear(hidden)
+
+
+def loss_fn(model, inputs, targets, loss_mask, segments):
+    import mlx.core as mx
+    import mlx.nn as nn
+    logits = forward(model, inputs, segments).astype(mx.float32)
+    ce = nn.losses.cross_entropy(logits, targets) * loss_mask
+    ntoks = loss_mask.sum()
+    return ce.sum() / mx.maximum(ntoks, 1), ntoks
+
+
+def to_mx(batch):
+    import mlx.core as mx
+    return (mx.array(batch["inputs"]), mx.array(batch["targets"]),
+            mx.array(batch["loss_mask"].astype(np.float32)), batch["segments"])
+
+
+def evaluate(model, dataset, batch_size):
+    total, ntoks = 0.0, 0
+    for start in range(0, len(dataset), batch_size):
+        inputs, targets, loss_mask, segments = to_mx(dataset.batch(range(start, min(start + batch_size, len(dataset)))))
+        loss, n = loss_fn(model, inputs, targets, loss_mask, segments)
+        total += loss.item() * n.item()
+        ntoks += n.item()
+    return total / max(ntoks, 1)
+
+
+def train(args):
+    import mlx.core as mx
+    import mlx.nn as nn
+    import mlx.optimizers as optim
+    from mlx.utils import tree_flatten
+    from mlx_lm import load
+    from mlx_lm.tuner.utils import linear_to_lora_layers
+
+    model, tokenizer = load(args.model)
+    packed_dir = args.packed or build_packed(args.data, tokenizer, args.seq_len)
+    train_set = PackedDataset(packed_dir, "train")
+    valid_set = PackedDataset(packed_dir, "valid") if "valid" in train_set.meta["splits"] else None
+    print(f"Packed data: {packed_dir} ({len(train_set)} train rows of {train_set.seq_len} tokens)")
+
+    lora_parameters = {"rank": args.rank, "scale": args.scale, "dropout": 0.0}
+    model.freeze()
+    linear_to_lora_layers(model, args.num_layers, lora_parameters)
+    optimizer = optim.Adam(learning_rate=args.learning_rate)
+    loss_and_grad = nn.value_and_grad(model, loss_fn)
+
+    os.makedirs(args.adapter_path, exist_ok=True)
+    with open(os.path.join(args.adapter_path, "adapter_config.json"), "w") as f:
+        json.dump({"model": args.model, "fine_tune_type": "lora", "num_layers": args.num_layers,
+                   "lora_parameters": lora_parameters, "packed": packed_dir}, f, indent=2)
+
+    batches = train_set.iterate(args.batch_size, seed=args.seed)
+    losses, tokens, start = [], 0, time.perf_counter()
+    for it in range(1, args.iters + 1):
+        inputs, targets, loss_mask, segments = to_mx(next(batches))
+        (loss, ntoks), grads = loss_and_grad(model, inputs, targets, loss_mask, segments)
+        optimizer.update(model, grads)
+        mx.eval(model.parameters(), optimizer.state, loss)
+        losses.append(loss.item())
+        tokens += ntoks.item()
+
+        if it % args.steps_per_report == 0 or it == args.iters:
+            elapsed = time.perf_counter() - start
+            print(f"Iter {it}: train loss {np.mean(losses):.3f}, {tokens / elapsed:.0f} loss tok/s")
+            losses = []
+        if valid_set is not None and (it % args.steps_per_eval == 0 or it == args.iters):
+            print(f"Iter {it}: val loss {evaluate(model, valid_set, args.batch_size):.3f}")
+
+    mx.save_safetensors(os.path.join(args.adapter_path, "adapters.safetensors"),
+                        dict(tree_flatten(model.trainable_parameters())))
+    print(f"Saved adapters to {args.adapter_path}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="LoRA fine-tuning on the pre-tokenized, packed dataset.")
+    parser.add_argument("--model", default=MODEL_ID)
+    parser.add_argument("--data", default="data/training", help="Directory with train.jsonl / valid.jsonl")
+    parser.add_argument("--packed", default=None, help="Packed dataset directory (default: build or reuse from --data)")
+    parser.add_argument("--seq-len", type=int, default=2048)
+    parser.add_argument("--iters", type=int, default=100)
+    parser.add_argument("--batch-size", type=int, default=2)
+    parser.add_argument("--num-layers", type=int, default=8)
+    parser.add_argument("--rank", type=int, default=8)
+    parser.add_argument("--scale", type=float, default=20.0)
+    parser.add_argument("--learning-rate", type=float, default=1e-4)
+    parser.add_argument("--steps-per-report", type=int, default=10)
+    parser.add_argument("--steps-per-eval", type=int, default=50)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--adapter-path", default="models/adapters/")
+    train(parser.parse_args())
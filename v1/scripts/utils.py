@@ -1,5 +1,6 @@
 # scripts/utils.py
-from mlx_lm.sample_utils import make_sampler
+import json
+import re
 
 SYSTEM_PROMPT = """You are a distributed systems architect.
 Respond ONLY in this exact format with no preamble, greetings, filler, or advice:
@@ -14,10 +15,107 @@ ARCHITECTURE: <component1> -> <component2> -> ...
 END_OF_ARCH"""
 
 STRUCTURE_KEYS = ["FAILURE MODE", "NAIVE FIXES", "MECHANISM", "TRADE-OFF", "ARCHITECTURE", "END_OF_ARCH"]
+SECTION_KEYS = ["FAILURE MODE", "NAIVE FIXES", "MECHANISM", "TRADE-OFF"]
+SAMPLER_PARAMS = {"temp": 0.4, "top_p": 0.9, "min_p": 0.05}
+
+# Template order; parse_response looks for each one after the previous
+MARKERS = ["QUESTION", "THOUGHT"] + STRUCTURE_KEYS
+_LABEL_TAIL_RE = re.compile(r"[ \t]*:?[ \t]*")
+
+
+class ParsedResponse:
+    """
+    One-pass parse of a structured response. `positions` maps each marker to
+    its first offset; `sections` maps FAILURE MODE .. TRADE-OFF to (start, end)
+    spans of their bodies; `end` is where END_OF_ARCH starts, or None.
+    """
+
+    __slots__ = ("text", "positions", "sections", "components", "end")
+
+    def __init__(self, text, positions, sections, components, end):
+        self.text = text
+        self.positions = positions
+        self.sections = sections
+        self.components = components
+        self.end = end
+
+    @property
+    def structured(self):
+        return all(k in self.positions for k in STRUCTURE_KEYS)
+
+    @property
+    def missing(self):
+        return [k for k in STRUCTURE_KEYS if k not in self.positions]
+
+    def section(self, name):
+        span = self.sections.get(name)
+        return self.text[span[0]:span[1]].strip() if span else None
+
+    def clean(self):
+        if self.end is not None:
+            return self.text[:self.end].strip() + "\nEND_OF_ARCH"
+        return self.text.strip()
+
+
+def _drop_enumerator(r, start, end):
+    """Trims the next item's "3." off the end of a section body, so an empty section reads as empty."""
+    i = end
+    while i > start and r[i - 1] in " \t":
+        i -= 1
+    if i == start or r[i - 1] != ".":
+        return end
+    i -= 1
+    digits = i
+    while i > start and r[i - 1].isdigit():
+        i -= 1
+    if i == digits:
+        return end
+    while i > start and r[i - 1] in " \t":
+        i -= 1
+    return i if i == start or r[i - 1] == "\n" else end
+
+
+def parse_response(r):
+    # str.find from the end of the previous marker: a few C-level scans, and a
+    # marker word quoted inside an earlier section isn't taken for its label
+    positions = {}
+    at = 0
+    for key in MARKERS:
+        pos = r.find(key, at)
+        if pos != -1:
+            at = pos + len(key)
+        else:
+            pos = r.find(key)  # out of order: still recorded, so scoring can tell
+        if pos != -1:
+            positions[key] = pos
+    order = sorted(positions.values())
+
+    # A section body runs from its label to the next marker of any kind
+    sections = {}
+    for key in SECTION_KEYS:
+        pos = positions.get(key)
+        if pos is None:
+            continue
+        start = _LABEL_TAIL_RE.match(r, pos + len(key)).end()
+        end = next((p for p in order if p >= start), len(r))
+        sections[key] = (start, _drop_enumerator(r, start, end))
+
+    end = positions.get("END_OF_ARCH")
+    components = []
+    arch = positions.get("ARCHITECTURE")
+    if arch is not None:
+        start = _LABEL_TAIL_RE.match(r, arch + len("ARCHITECTURE")).end()
+        stop = end if end is not None and end > start else len(r)
+        components = [c.strip() for c in r[start:stop].split("->") if c.strip()]
+
+    return ParsedResponse(r, positions, sections, components, end)
+
 
 def has_structure(r):
+    """Same answer as parse_response(r).structured, without building the record."""
     return all(k in r for k in STRUCTURE_KEYS)
 
+
 def format_prompt(tokenizer, question):
     return tokenizer.apply_chat_template(
         [{"role": "system", "content": SYSTEM_PROMPT},
@@ -25,10 +123,43 @@ def format_prompt(tokenizer, question):
         tokenize=False, add_generation_prompt=True
     )
 
+
 def clean_response(r):
-    if "END_OF_ARCH" in r:
-        return r.split("END_OF_ARCH")[0].strip() + "\nEND_OF_ARCH"
+    end = r.find("END_OF_ARCH")
+    if end != -1:
+        return r[:end].strip() + "\nEND_OF_ARCH"
     return r.strip()
 
-def get_sampler():
-    return make_sampler(temp=0.4, top_p=0.9, min_p=0.05)
\ No newline at end of file
+
+def get_sampler(params=None):
+    from mlx_lm.sample_utils import make_sampler
+    return make_sampler(**(params or SAMPLER_PARAMS))
+
+
+def response_of(record):
+    """Assistant text from either a factory entry or a chat-format training line."""
+    if "response" in record:
+        return record["response"]
+    return next(m["content"] for m in reversed(record["messages"]) if m["role"] == "assistant")
+
+
+def validate_jsonl(path):
+    """
+    Streams a JSONL file of factory entries or chat-format samples, parsing
+    each response once. Returns totals, per-key missing counts and the line
+    numbers that failed.
+    """
+    summary = {"total": 0, "structured": 0, "missing": {k: 0 for k in STRUCTURE_KEYS}, "failed_lines": []}
+    with open(path, "r") as f:
+        for lineno, line in enumerate(f, 1):
+            if not line.strip():
+                continue
+            parsed = parse_response(response_of(json.loads(line)))
+            summary["total"] += 1
+            if parsed.structured:
+                summary["structured"] += 1
+                continue
+            summary["failed_lines"].append(lineno)
+            for k in parsed.missing:
+                summary["missing"][k] += 1
+    return summary
@@ -0,0 +1,23 @@
+import os
+import sys
+import threading
+
+import pytest
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+# Scripts import as `scripts.x`; benchmark modules import each other by bare name
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.join(ROOT, "benchmarks"))
+
+
+@pytest.fixture
+def model_host_server(tmp_path):
+    """A real model host on a temp socket, served from a thread: (ModelHost, client)."""
+    from scripts.model_host import ModelHost, ModelHostClient, _Handler, _Server
+    address = str(tmp_path / "host.sock")
+    server = _Server(address, _Handler)
+    server.host = ModelHost(budget_bytes=1 << 30)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield server.host, ModelHostClient(address)
+    server.shutdown()
+    server.server_close()
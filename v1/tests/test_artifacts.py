@@ -0,0 +1,60 @@
+import os
+import stat
+
+from scripts.artifacts import ArtifactStore
+
+
+def write(path, content):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "w") as f:
+        f.write(content)
+    return str(path)
+
+
+def read(path):
+    with open(path) as f:
+        return f.read()
+
+
+def test_files_with_the_same_name_keep_their_directories(tmp_path):
+    store = ArtifactStore(str(tmp_path / "store"))
+    a = write(tmp_path / "run" / "a" / "adapter_config.json", "a")
+    b = write(tmp_path / "run" / "b" / "adapter_config.json", "b")
+    manifest = store.put([a, b], "adapter", "exp1", base="some/base")
+
+    assert sorted(manifest["files"]) == [os.path.join("a", "adapter_config.json"), os.path.join("b", "adapter_config.json")]
+    _, adapter = store.resolve("experiment:exp1")
+    assert read(os.path.join(adapter, "a", "adapter_config.json")) == "a"
+    assert read(os.path.join(adapter, "b", "adapter_config.json")) == "b"
+
+
+def test_files_from_one_directory_are_stored_by_name(tmp_path):
+    store = ArtifactStore(str(tmp_path / "store"))
+    weights = write(tmp_path / "ckpt" / "adapters.safetensors", "w")
+    config = write(tmp_path / "ckpt" / "adapter_config.json", "{}")
+    manifest = store.put([weights, config], "adapter", "exp1", base="some/base")
+    assert sorted(manifest["files"]) == ["adapter_config.json", "adapters.safetensors"]
+
+
+def test_writing_into_an_adapter_tree_leaves_the_blob_alone(tmp_path):
+    store = ArtifactStore(str(tmp_path / "store"))
+    weights = write(tmp_path / "ckpt" / "adapters.safetensors", "trained")
+    manifest = store.put([weights], "adapter", "exp1", base="some/base")
+    _, adapter = store.resolve("experiment:exp1")
+
+    with open(os.path.join(adapter, "adapters.safetensors"), "w") as f:
+        f.write("resumed")  # what a resumed run does to its adapter file
+
+    assert read(store._blob(manifest["files"]["adapters.safetensors"])) == "trained"
+    assert store.put([weights], "adapter", "exp2", base="some/base")["id"] == manifest["id"]
+
+
+def test_blobs_and_linked_trees_are_read_only(tmp_path):
+    store = ArtifactStore(str(tmp_path / "store"))
+    write(tmp_path / "fused" / "model.safetensors", "weights")
+    manifest = store.put(str(tmp_path / "fused"), "fused", "exp1")
+    tree = store.path(manifest["id"])
+
+    for path in (store._blob(manifest["files"]["model.safetensors"]), os.path.join(tree, "model.safetensors")):
+        assert not os.stat(path).st_mode & (stat.S_IWUSR | stat.S_IWGRP | stat.S_IWOTH)
+    assert read(os.path.join(tree, "model.safetensors")) == "weights"
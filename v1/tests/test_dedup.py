@@ -0,0 +1,76 @@
+import json
+
+import pytest
+
+from scripts import dedup as dedup_module
+from scripts.dedup import dedup
+
+TOPICS = ["cache stampede", "consumer lag", "split brain", "hot partition", "clock skew", "retry storm"]
+
+
+def sample(i, topic):
+    return {"id": f"s{i}", "instruction": f"Question {i}",
+            "response": f"QUESTION: q\nTHOUGHT:\n1. FAILURE MODE: {topic} number {i} in region {i * 7}.\n"
+                        f"ARCHITECTURE: A{i} -> B{i}\nEND_OF_ARCH"}
+
+
+def write_input(path, entries, mode="w"):
+    with open(path, mode) as f:
+        for e in entries:
+            f.write(json.dumps(e) + "\n")
+
+
+def read_ids(path):
+    with open(path) as f:
+        return [json.loads(line)["id"] for line in f]
+
+
+@pytest.fixture
+def paths(tmp_path):
+    return str(tmp_path / "in.jsonl"), str(tmp_path / "out.jsonl"), str(tmp_path / "index.sqlite")
+
+
+def test_crash_mid_run_does_not_duplicate(paths, monkeypatch):
+    input_path, output_path, index_path = paths
+    write_input(input_path, [sample(i, t) for i, t in enumerate(TOPICS)])
+
+    real = dedup_module.reasoning_text
+    calls = []
+
+    def crash_on_fifth(response):
+        calls.append(response)
+        if len(calls) == 5:
+            raise KeyboardInterrupt
+        return real(response)
+
+    monkeypatch.setattr(dedup_module, "reasoning_text", crash_on_fifth)
+    with pytest.raises(KeyboardInterrupt):
+        dedup(input_path, output_path, index_path, commit_every=3)
+    monkeypatch.setattr(dedup_module, "reasoning_text", real)
+
+    stats = dedup(input_path, output_path, index_path, commit_every=3)
+    assert read_ids(output_path) == [f"s{i}" for i in range(len(TOPICS))]
+    assert stats["exact"] == 0 and stats["near"] == 0
+
+
+def test_appended_input_only_reads_new_lines(paths):
+    input_path, output_path, index_path = paths
+    write_input(input_path, [sample(i, t) for i, t in enumerate(TOPICS[:3])])
+    dedup(input_path, output_path, index_path)
+    write_input(input_path, [sample(i + 3, t) for i, t in enumerate(TOPICS[3:])] + [sample(0, TOPICS[0])], "a")
+
+    stats = dedup(input_path, output_path, index_path)
+    assert stats == {"kept": 3, "exact": 1, "near": 0}
+    assert read_ids(output_path) == [f"s{i}" for i in range(6)]
+
+
+def test_regenerated_larger_input_is_rescanned(paths):
+    input_path, output_path, index_path = paths
+    write_input(input_path, [sample(i, t) for i, t in enumerate(TOPICS[:2])])
+    dedup(input_path, output_path, index_path)
+
+    # data_factory --fresh: new content from the start, longer than what was consumed
+    write_input(input_path, [sample(i + 10, t) for i, t in enumerate(TOPICS)] + [sample(0, TOPICS[0])])
+    stats = dedup(input_path, output_path, index_path)
+    assert stats["kept"] == len(TOPICS)
+    assert stats["exact"] == 1
@@ -0,0 +1,107 @@
+import time
+
+import pytest
+
+from scripts.backends import FakeBackend
+from scripts.inference import InferenceLayer
+from scripts.response_cache import ResponseCache
+
+QUESTION = "Kafka consumers fall behind during a partition rebalance."
+DECODE_DELAY = 0.002
+
+
+def make_layer(cache=None, **delays):
+    return InferenceLayer({"vanilla": FakeBackend("vanilla", **delays),
+                           "distilled": FakeBackend("distilled", **delays)}, cache)
+
+
+def wait_until_idle(backends, timeout=2.0):
+    """Decode-step counts once every thread has stopped advancing them."""
+    deadline = time.monotonic() + timeout
+    last = None
+    while time.monotonic() < deadline:
+        steps = [b.model.decode_steps for b in backends]
+        if steps == last:
+            return steps
+        last = steps
+        time.sleep(DECODE_DELAY * 20)
+    raise AssertionError("decode threads never went idle")
+
+
+def test_models_decode_concurrently():
+    layer = make_layer(decode_delay=DECODE_DELAY)
+    order = []
+    start = time.perf_counter()
+    results = {}
+    for kind, label, payload in layer.stream(QUESTION, max_tokens=200, sampler_params={}):
+        order.append((kind, label))
+        if kind == "done":
+            results[label] = payload
+    wall = time.perf_counter() - start
+
+    assert set(results) == {"vanilla", "distilled"}
+    # Tokens from both models interleave before either finishes
+    first_done = next(i for i, (kind, _) in enumerate(order) if kind == "done")
+    assert {label for kind, label in order[:first_done] if kind == "token"} == {"vanilla", "distilled"}
+    serial = sum(g.tokens for g in results.values()) * DECODE_DELAY
+    assert wall < serial
+
+
+def test_streamed_text_matches_result():
+    layer = make_layer()
+    streamed = {"vanilla": "", "distilled": ""}
+    for kind, label, payload in layer.stream(QUESTION, max_tokens=500, sampler_params={}):
+        if kind == "token":
+            streamed[label] += payload
+        elif kind == "done":
+            assert payload.structured
+            assert payload.text == streamed[label].strip()
+            assert payload.tokens_saved > 0
+
+
+def test_closing_the_stream_cancels_decoding():
+    layer = make_layer(decode_delay=DECODE_DELAY)
+    backends = list(layer.backends.values())
+    stream = layer.stream(QUESTION, max_tokens=500, sampler_params={})
+    assert next(stream)[0] == "token"
+    stream.close()
+
+    steps = wait_until_idle(backends)
+    # A full answer is well over 100 decode steps per model
+    assert all(s < 50 for s in steps)
+
+
+def test_abandoned_stream_cancels_decoding():
+    layer = make_layer(decode_delay=DECODE_DELAY)
+    backends = list(layer.backends.values())
+    stream = layer.stream(QUESTION, max_tokens=500, sampler_params={})
+    next(stream)
+    del stream  # a Streamlit rerun drops the generator without closing it
+
+    assert all(s < 50 for s in wait_until_idle(backends))
+
+
+def test_errors_are_reported_per_model():
+    class Broken(FakeBackend):
+        def stream(self, *args, **kwargs):
+            raise RuntimeError("metal OOM")
+
+    layer = InferenceLayer({"ok": FakeBackend(), "broken": Broken()})
+    events = list(layer.stream(QUESTION, sampler_params={}))
+    assert ("done", "ok") in [(k, label) for k, label, _ in events]
+    errors = [payload for kind, _, payload in events if kind == "error"]
+    assert len(errors) == 1 and "metal OOM" in str(errors[0])
+    with pytest.raises(RuntimeError):
+        layer.run(QUESTION, sampler_params={})
+
+
+def test_repeat_question_is_served_from_cache(tmp_path):
+    cache = ResponseCache(str(tmp_path / "responses.sqlite"))
+    layer = make_layer(cache)
+    first = layer.run(QUESTION, sampler_params={}, seed=0)
+    steps = [b.model.decode_steps for b in layer.backends.values()]
+    second = layer.run(QUESTION, sampler_params={}, seed=0)
+
+    assert all(g.cached for g in second.values())
+    assert {k: g.text for k, g in second.items()} == {k: g.text for k, g in first.items()}
+    assert [b.model.decode_steps for b in layer.backends.values()] == steps
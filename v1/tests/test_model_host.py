@@ -0,0 +1,44 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from scripts import backends
+from scripts.model_host import ModelHost
+
+
+def test_concurrent_first_requests_load_once_and_leave_no_lock(model_host_server, monkeypatch):
+    model_host, client = model_host_server
+    started, release = threading.Event(), threading.Event()
+    real = backends.get_backend
+
+    def slow_get_backend(*args, **kwargs):
+        started.set()
+        release.wait(5)
+        return real(*args, **kwargs)
+
+    monkeypatch.setattr(backends, "get_backend", slow_get_backend)
+    with ThreadPoolExecutor(4) as pool:
+        futures = [pool.submit(client.call, "encode", backend="fake", model_path=f"m{i % 2}", prompt="hi")
+                   for i in range(4)]
+        started.wait(5)
+        release.set()
+        results = [f.result() for f in futures]
+
+    assert results[0] == results[2]
+    assert model_host.stats["loads"] == 2
+    assert model_host.stats["requests"] == 4
+    assert model_host.loading == {}
+
+
+def test_failed_load_releases_its_lock(monkeypatch):
+    model_host = ModelHost(budget_bytes=1 << 30)
+
+    def broken(*args, **kwargs):
+        raise OSError("no such model")
+
+    monkeypatch.setattr(backends, "get_backend", broken)
+    for _ in range(3):
+        with pytest.raises(OSError):
+            model_host.acquire("fake", "missing")
+    assert model_host.loading == {}
@@ -0,0 +1,86 @@
+import json
+
+import numpy as np
+import pytest
+
+from scripts.backends import FakeTokenizer
+from scripts.packed_data import PackedDataset, attention_allowed, build_packed, pack, tokenize_chat
+
+
+def chat(question, answer):
+    return [{"role": "system", "content": "You are an architect."},
+            {"role": "user", "content": question},
+            {"role": "assistant", "content": answer}]
+
+
+def write_split(data_dir, split, samples):
+    with open(data_dir / f"{split}.jsonl", "w") as f:
+        for messages in samples:
+            f.write(json.dumps({"messages": messages}) + "\n")
+
+
+@pytest.fixture
+def tokenizer():
+    return FakeTokenizer()
+
+
+def test_pack_first_fit_decreasing():
+    assert pack([5, 3, 4, 2], 8) == [[0, 1], [2, 3]]
+    # A sample longer than a row gets one to itself, truncated
+    assert pack([20, 3, 3], 8) == [[0], [1, 2]]
+    rows = pack([7, 1, 6, 2, 5, 3, 4, 4], 8)
+    assert sorted(i for row in rows for i in row) == list(range(8))
+    assert len(rows) == 4
+
+
+def test_tokenize_chat_masks_everything_but_the_reply(tokenizer):
+    ids, mask = tokenize_chat(tokenizer, chat("Why does Kafka lag?", "ARCHITECTURE: A -> B END_OF_ARCH"))
+    assert len(ids) == len(mask)
+    first = mask.index(1)
+    assert set(mask[:first]) == {0} and set(mask[first:]) == {1}
+    # The reply and its end-of-turn token are trained on; the prompt, system and user turns are not
+    assert tokenizer.decode(ids[first:]) == "ARCHITECTURE: A -> B END_OF_ARCH" + tokenizer.eos_token
+    assert "Why does Kafka lag?" in tokenizer.decode(ids[:first])
+
+
+def test_batch_keeps_loss_inside_each_sample(tmp_path, tokenizer):
+    samples = [chat(f"Question {i}?", " ".join(["word"] * (i + 1))) for i in range(6)]
+    write_split(tmp_path, "train", samples)
+    dataset = PackedDataset(build_packed(str(tmp_path), tokenizer, seq_len=256), "train")
+    assert dataset.meta["splits"]["train"]["samples"] == 6
+    assert len(dataset) < 6  # several samples share a row
+
+    batch = dataset.batch(range(len(dataset)))
+    inputs, targets, loss_mask, segments = batch["inputs"], batch["targets"], batch["loss_mask"], batch["segments"]
+    assert inputs.shape == targets.shape == loss_mask.shape == segments.shape == (len(dataset), 255)
+    np.testing.assert_array_equal(inputs[:, 1:], targets[:, :-1])
+
+    # Every sample contributes exactly its reply + end-of-turn token as targets
+    replies = sum(len(tokenize_chat(tokenizer, m)[0]) - tokenize_chat(tokenizer, m)[1].index(1) for m in samples)
+    assert loss_mask.sum() == replies
+    # No loss on padding, and never on the first token of the next sample
+    assert not (loss_mask * (segments == 0)).any()
+    boundary = np.zeros_like(loss_mask, dtype=bool)
+    boundary[:, :-1] = segments[:, 1:] != segments[:, :-1]
+    assert not (loss_mask[:, :-1] * boundary[:, :-1]).any()
+
+
+def test_attention_stays_in_sample_and_padding_sees_itself():
+    segments = np.array([[1, 1, 2, 2, 2, 0, 0]])
+    allowed = attention_allowed(segments)[0]
+    assert allowed.any(axis=-1).all()  # no fully masked row to turn into NaN
+    for q in range(7):
+        for k in range(7):
+            expected = k <= q and segments[0, q] == segments[0, k] and (segments[0, q] > 0 or q == k)
+            assert allowed[q, k] == expected
+
+
+def test_samples_truncated_before_their_reply_are_skipped(tmp_path, tokenizer, capsys):
+    long_question = " ".join(["padding"] * 200)
+    write_split(tmp_path, "train", [chat("Short?", "Short answer"), chat(long_question, "Lost answer")])
+    dataset = PackedDataset(build_packed(str(tmp_path), tokenizer, seq_len=128), "train")
+
+    stats = dataset.meta["splits"]["train"]
+    assert (stats["samples"], stats["skipped"]) == (1, 1)
+    assert "Skipped 1 train samples" in capsys.readouterr().out
+    assert dataset.batch([0])["loss_mask"].sum() > 0
@@ -0,0 +1,96 @@
+import os
+
+from scripts.backends import FakeBackend
+from scripts.generate_curriculum import build_prompt
+from scripts.prefix_cache import PrefixCache
+from scripts.response_cache import ResponseCache
+
+QUESTIONS = [
+    "A cache stampede takes down the primary database after a deploy.",
+    "Kafka consumers fall behind during a partition rebalance.",
+    "Webhook deliveries are duplicated when the sender retries.",
+]
+
+
+def make_model_dir(tmp_path, content=b"weights-v1"):
+    model_dir = tmp_path / "neural-edge-3b"
+    model_dir.mkdir(exist_ok=True)
+    (model_dir / "model.safetensors").write_bytes(content)
+    return str(model_dir)
+
+
+def make_cache(backend, tmp_path):
+    return PrefixCache(backend, cache_dir=str(tmp_path / "prefix"),
+                       fingerprints=ResponseCache(str(tmp_path / "responses.sqlite")))
+
+
+def test_prefix_is_prefilled_once(tmp_path):
+    backend = FakeBackend(make_model_dir(tmp_path))
+    cache = make_cache(backend, tmp_path)
+    prefix = cache.template_prefix(build_prompt)
+    prompts = [build_prompt(backend.tokenizer, q) for q in QUESTIONS]
+
+    for p in prompts:
+        cache.generate(prefix, p, 400, {})
+
+    suffixes = sum(len(backend.encode(p)) - len(prefix) for p in prompts)
+    assert backend.model.prefill_tokens == len(prefix) + suffixes
+    assert cache.stats["misses"] == 1
+    assert cache.stats["memory_hits"] == len(prompts) - 1
+    assert cache.stats["prefix_tokens_reused"] == len(prefix) * len(prompts)
+
+
+def test_cached_output_matches_full_prefill(tmp_path):
+    backend = FakeBackend(make_model_dir(tmp_path))
+    cache = make_cache(backend, tmp_path)
+    prefix = cache.template_prefix(build_prompt)
+    prompt = build_prompt(backend.tokenizer, QUESTIONS[0])
+
+    cached = cache.generate(prefix, prompt, 400, {})
+    full = FakeBackend(backend.model_path)
+    expected = "".join(full.stream(prompt, 400, {}))
+
+    assert cached.stopped
+    assert cached.text.endswith("END_OF_ARCH")
+    assert expected.startswith(cached.text)
+
+
+def test_disk_state_survives_restart(tmp_path):
+    model_path = make_model_dir(tmp_path)
+    first = make_cache(FakeBackend(model_path), tmp_path)
+    first.get(first.template_prefix(build_prompt))
+
+    backend = FakeBackend(model_path)
+    second = make_cache(backend, tmp_path)
+    prefix = second.template_prefix(build_prompt)
+    second.get(prefix)
+
+    assert second.stats["disk_hits"] == 1
+    assert backend.model.prefill_tokens == 0
+
+
+def test_refused_weights_invalidate_state(tmp_path):
+    model_path = make_model_dir(tmp_path)
+    first = make_cache(FakeBackend(model_path), tmp_path)
+    prefix = first.template_prefix(build_prompt)
+    first.get(prefix)
+
+    # Fuse writes new weights to the same path
+    make_model_dir(tmp_path, b"weights-v2-after-refuse")
+    os.utime(os.path.join(model_path, "model.safetensors"), (1, 1))
+    backend = FakeBackend(model_path)
+    second = make_cache(backend, tmp_path)
+    second.get(prefix)
+
+    assert second.key(prefix) != first.key(prefix)
+    assert second.stats["misses"] == 1
+    assert backend.model.prefill_tokens == len(prefix)
+
+
+def test_weights_digest_opens_no_cache(tmp_path, monkeypatch):
+    backend = FakeBackend(make_model_dir(tmp_path))
+    monkeypatch.chdir(tmp_path)
+    digest = PrefixCache(backend, cache_dir=str(tmp_path / "prefix")).weights_digest()
+
+    assert not (tmp_path / "data").exists()
+    assert digest == ResponseCache(str(tmp_path / "fingerprints.sqlite")).model_fingerprint(backend)
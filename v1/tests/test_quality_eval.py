@@ -0,0 +1,38 @@
+from types import SimpleNamespace
+
+import pytest
+
+from quality_eval import EvalCache, evaluate
+from scripts.backends import FakeBackend
+
+QUESTIONS = [f"Question {i}: why does consumer lag grow after deploy {i}?" for i in range(10)]
+
+
+class InterruptedBackend(FakeBackend):
+    """Fake backend whose generation is interrupted after `batches` batches."""
+
+    def __init__(self, batches):
+        super().__init__("fake")
+        self.batches = batches
+
+    def generate_batch(self, *args, **kwargs):
+        if not self.batches:
+            raise KeyboardInterrupt
+        self.batches -= 1
+        return super().generate_batch(*args, **kwargs)
+
+
+def test_interrupted_run_keeps_scored_batches(tmp_path):
+    samples = [(f"s{i}", q, None) for i, q in enumerate(QUESTIONS)]
+    args = SimpleNamespace(batch_size=3, max_tokens=500, seed=0, workers=2)
+    cache = EvalCache(str(tmp_path / "eval.sqlite"))
+
+    with pytest.raises(KeyboardInterrupt):
+        evaluate(InterruptedBackend(batches=2), samples, "key", cache, args)
+    assert sorted(cache.get_many("key", [sid for sid, _, _ in samples])) == ["s0", "s1", "s2", "s3", "s4", "s5"]
+
+    backend = InterruptedBackend(batches=2)
+    results = evaluate(backend, samples, "key", cache, args)  # only the 4 missing samples: 2 batches
+    assert [sid for sid, *_ in results] == [sid for sid, _, _ in samples]
+    assert all(score["structured"] for *_, score in results)
+    cache.close()
@@ -0,0 +1,31 @@
+from harness import benchmark_model
+from scripts.backends import FakeBackend
+from scripts.inference import InferenceLayer
+from scripts.response_cache import ResponseCache
+
+QUESTION = "Webhook deliveries are duplicated when the sender retries."
+
+
+def test_ui_answer_is_replayed_by_the_benchmark(tmp_path):
+    cache = ResponseCache(str(tmp_path / "responses.sqlite"))
+    ui = InferenceLayer({"model": FakeBackend("fake")}, cache).run(QUESTION, seed=0)["model"]
+
+    result = benchmark_model("fake", "fake", "model", [QUESTION], trials=1, warmup=0, cache=cache)
+    (trial,) = result["trials"]
+    assert trial["cached"]
+    assert trial["response"] == ui.text
+    assert trial["generated_tokens"] == ui.tokens
+
+
+def test_benchmark_answer_is_replayed_by_the_ui(tmp_path):
+    cache = ResponseCache(str(tmp_path / "responses.sqlite"))
+    result = benchmark_model("fake", "fake", "model", [QUESTION], trials=1, warmup=0, cache=cache)
+
+    ui = InferenceLayer({"model": FakeBackend("fake")}, cache).run(QUESTION, seed=0)["model"]
+    assert ui.cached
+    assert ui.text == result["trials"][0]["response"]
+
+    rerun = benchmark_model("fake", "fake", "model", [QUESTION], trials=1, warmup=0, cache=cache)
+    assert rerun["trials"][0]["cached"]
+    assert rerun["trials"][0]["itl_s"] == result["trials"][0]["itl_s"]
+
@@ -0,0 +1,104 @@
+import sqlite3
+
+import pytest
+
+from compare import compare_runs
+from harness import benchmark_model
+from results_store import ResultsStore
+
+PROMPTS = ["Webhook deliveries are duplicated when the sender retries."]
+
+
+def run(host=None):
+    return benchmark_model("fake", "fake", "model", PROMPTS, trials=2, warmup=0, max_tokens=16, host=host)
+
+
+def test_serving_mode_is_recorded(tmp_path, model_host_server):
+    store = ResultsStore(str(tmp_path / "runs.sqlite"))
+    in_process = store.record(run(), {}, 16, commit="abc")
+    hosted = store.record(run(model_host_server[1]), {}, 16, commit="abc")
+    assert store.run(in_process)[-1] == "in-process"
+    assert store.run(hosted)[-1] == "host"
+
+
+def test_runs_with_different_serving_modes_are_not_compared(tmp_path, model_host_server):
+    store = ResultsStore(str(tmp_path / "runs.sqlite"))
+    a, b = (store.record(run(), {}, 16, commit="abc") for _ in range(2))
+    hosted = store.record(run(model_host_server[1]), {}, 16, commit="abc")
+
+    assert compare_runs(store, a, b, n_boot=50)
+    with pytest.raises(ValueError, match="served in-process and run 3 host"):
+        compare_runs(store, a, hosted, n_boot=50)
+
+
+def test_history_from_before_serving_was_recorded(tmp_path):
+    path = str(tmp_path / "runs.sqlite")
+    db = sqlite3.connect(path)
+    db.execute("CREATE TABLE runs (run_id INTEGER PRIMARY KEY, created_at TEXT, label TEXT, model_path TEXT, "
+               "backend TEXT, git_commit TEXT, sampler TEXT, max_tokens INTEGER, trials INTEGER, summary TEXT)")
+    db.execute("INSERT INTO runs (label, model_path, backend) VALUES ('old', 'fake', 'fake')")
+    db.commit()
+    db.close()
+
+    store = ResultsStore(path)
+    assert store.run(1)[-1] is None
+    new = store.record(run(), {}, 16, commit="abc")
+    with pytest.raises(ValueError, match="served unknown"):
+        compare_runs(store, 1, new, n_boot=50)
+
+
+def test_adapter_runs_are_kept_apart_from_their_base(tmp_path):
+    store = ResultsStore(str(tmp_path / "runs.sqlite"))
+    base = store.record(run(), {}, 16, commit="abc")
+    adapter = run()
+    adapter.update(model_ref="experiment:e1", adapter_path="store/trees/123")
+    tuned = store.record(adapter, {}, 16, commit="abc")
+
+    assert store.run(tuned)[3:6] == ("fake", "experiment:e1", "store/trees/123")
+    assert store.latest_run_id("fake") == base
+    assert store.latest_run_id("experiment:e1") == tuned
+    with pytest.raises(KeyError, match="No earlier benchmark runs recorded for fake"):
+        store.latest_run_id("fake", offset=1)
+
+
+def test_runs_from_before_model_refs_are_not_looked_up(tmp_path):
+    path = str(tmp_path / "runs.sqlite")
+    db = sqlite3.connect(path)
+    db.execute("CREATE TABLE runs (run_id INTEGER PRIMARY KEY, created_at TEXT, label TEXT, model_path TEXT, "
+               "backend TEXT, git_commit TEXT, sampler TEXT, max_tokens INTEGER, trials INTEGER, summary TEXT, "
+               "serving TEXT)")
+    db.execute("INSERT INTO runs (label, model_path, backend, serving) VALUES ('old', 'fake', 'fake', 'in-process')")
+    db.commit()
+    db.close()
+
+    store = ResultsStore(path)
+    assert store.run(1)[4:6] == (None, None)
+    new = store.record(run(), {}, 16, commit="abc")
+    assert store.latest_run_id("fake") == new
+    with pytest.raises(KeyError):
+        store.latest_run_id("fake", offset=1)
+
+
+def steady_trial(itl_s, tokens=200):
+    return {"ttft_s": 0.1, "total_s": 0.1 + itl_s * tokens, "decode_tps": 1 / itl_s, "prefill_tps": 100.0,
+            "itl_s": [itl_s * (1 + (i % 7) / 100) for i in range(tokens)]}
+
+
+def steady_run(itl_s, trials=3):
+    return {"label": "steady", "model_path": "fake", "backend": "fake", "load": {"host": None},
+            "summary": {"trials": trials}, "trials": [steady_trial(itl_s * (1 + k / 100)) for k in range(trials)]}
+
+
+def test_itl_is_tested_per_trial_not_per_token(tmp_path):
+    store = ResultsStore(str(tmp_path / "runs.sqlite"))
+    a = store.record(steady_run(0.010), {}, 200, commit="abc")
+    b = store.record(steady_run(0.011), {}, 200, commit="abc")
+    assert len(store.samples(b, "itl_ms")) == 600  # per-token latencies are still kept
+
+    rows = {r["metric"]: r for r in compare_runs(store, a, b, n_boot=50)}
+    assert "itl_ms" not in rows
+    itl = rows["itl_p50_ms"]
+    assert (itl["n_a"], itl["n_b"]) == (3, 3)
+    assert itl["change"] == pytest.approx(0.1, rel=0.05)
+    # 600 pooled tokens would call this significant; three trials a side can't
+    assert itl["verdict"] == "no change"
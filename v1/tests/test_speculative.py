@@ -0,0 +1,67 @@
+from collections import Counter
+
+import numpy as np
+import pytest
+
+from scripts.speculative import SpeculativeDecoder, ToyLM, ToyTokenizer, plain_tokens, total_variation
+from scripts.utils import SAMPLER_PARAMS
+
+GREEDY = {"temp": 0.0, "top_p": 1.0, "min_p": 0.0}
+
+
+@pytest.fixture
+def models():
+    teacher = ToyLM()
+    return teacher, teacher.noisy(1.0)
+
+
+def test_greedy_output_is_exactly_plain_decoding(models):
+    teacher, draft = models
+    prompt = teacher.encode("QUESTION: Kafka lag")
+    expected = plain_tokens(teacher, prompt, 40, GREEDY, np.random.default_rng(0))
+
+    decoder = SpeculativeDecoder(teacher, draft, num_draft=4, seed=0)
+    assert list(decoder.generate_tokens(prompt, 40, GREEDY)) == expected
+    # The noisy draft disagrees sometimes, so this went through rejections and rewinds
+    assert 0 < decoder.metrics()["accepted"] < decoder.metrics()["proposed"]
+
+
+def test_sampled_output_follows_the_target_distribution(models):
+    teacher, draft = models
+    prompt = teacher.encode("QUESTION: Kafka lag")
+    n, rng = 2000, np.random.default_rng(1)
+
+    def plain(model):
+        return Counter(tuple(plain_tokens(model, prompt, 3, SAMPLER_PARAMS, rng)) for _ in range(n))
+
+    plain_a, plain_b, draft_only = plain(teacher), plain(teacher), plain(draft)
+    decoder = SpeculativeDecoder(teacher, draft, num_draft=4, seed=2)
+    spec = Counter(tuple(decoder.generate_tokens(prompt, 3, SAMPLER_PARAMS)) for _ in range(n))
+
+    bound = 2 * total_variation(plain_b, plain_a)
+    assert total_variation(spec, plain_a) <= bound
+    assert total_variation(draft_only, plain_a) > bound  # sampling the draft alone would fail the check
+
+
+def test_draft_with_another_vocabulary_is_rejected(models):
+    teacher, _ = models
+    draft = ToyLM(vocab_size=64)
+    decoder = SpeculativeDecoder(teacher, draft, num_draft=4, seed=0)
+    with pytest.raises(ValueError, match="Draft vocabulary"):
+        list(decoder.generate_tokens(teacher.encode("QUESTION"), 10, GREEDY))
+
+
+def test_generation_stops_at_eos(models):
+    teacher, draft = models
+    prompt = teacher.encode("QUESTION: Kafka lag")
+    expected = plain_tokens(teacher, prompt, 20, GREEDY, np.random.default_rng(0))
+    eos = expected[5]
+    stop = expected.index(eos)
+
+    tokenizer = ToyTokenizer()
+    tokenizer.eos_token_id = eos
+    teacher.tokenizer = tokenizer
+    decoder = SpeculativeDecoder(teacher, draft, num_draft=4, seed=0)
+
+    assert list(decoder.generate_tokens(prompt, 20, GREEDY)) == expected[:stop + 1]
+    assert decoder.metrics()["generated"] == stop + 1
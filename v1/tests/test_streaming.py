@@ -0,0 +1,134 @@
+import pytest
+
+from scripts.backends import FakeBackend, FakeTokenizer
+from scripts.generate_curriculum import build_prompt, enforce_stop
+from scripts.generation_engine import GenerationEngine
+from scripts.model_host import RemoteBackend
+from scripts.streaming import STOP_SEQUENCE, StopSequenceMatcher, collect_until_stop, stream_until_stop
+from scripts.utils import clean_response, format_prompt
+
+QUESTION = "A cache stampede takes down the primary database after a deploy."
+
+
+def test_fake_tokenizer_round_trips():
+    tok = FakeTokenizer()
+    text = "QUESTION: why?\n  ARCHITECTURE: A -> B\nEND_OF_ARCH"
+    ids = tok.encode(text, add_special_tokens=False)
+    assert tok.decode(ids) == text
+    assert tok.encode(text, add_special_tokens=False) == ids
+
+
+def test_fake_tokenizer_adds_bos_once():
+    tok = FakeTokenizer()
+    once = tok.encode("hello")
+    assert tok.decode(once) == tok.bos_token + "hello"
+    assert tok.encode(tok.decode(once)) == once
+
+
+def test_fake_tokenizer_splits_the_sentinel():
+    tok = FakeTokenizer()
+    pieces = [tok.decode([t]) for t in tok.encode(STOP_SEQUENCE, add_special_tokens=False)]
+    assert len(pieces) > 1
+    assert "".join(pieces) == STOP_SEQUENCE
+
+
+def test_fake_tokenizer_drops_eos_on_decode():
+    tok = FakeTokenizer()
+    assert tok.decode(tok.encode("done", add_special_tokens=False) + [tok.eos_token_id]) == "done"
+
+
+def test_chat_template_matches_format_prompt():
+    tok = FakeTokenizer()
+    prompt = format_prompt(tok, QUESTION)
+    assert prompt.startswith(tok.bos_token)
+    assert prompt.endswith("<|start_header_id|>assistant<|end_header_id|>\n\n")
+    messages = [{"role": "user", "content": QUESTION}]
+    assert tok.decode(tok.apply_chat_template(messages, tokenize=True)) == tok.apply_chat_template(messages)
+
+
+@pytest.mark.parametrize("split", range(1, len(STOP_SEQUENCE)))
+def test_matcher_catches_sentinel_across_boundary(split):
+    matcher = StopSequenceMatcher()
+    assert matcher.feed("ARCHITECTURE: A -> B\n" + STOP_SEQUENCE[:split]) == -1
+    assert matcher.feed(STOP_SEQUENCE[split:] + " ramble") == len(STOP_SEQUENCE) - split
+
+
+def test_matcher_one_character_at_a_time():
+    matcher = StopSequenceMatcher()
+    text = "END_OF_AR END_OF_ARCH tail"
+    ends = [matcher.feed(c) for c in text]
+    assert ends.index(1) == text.index(STOP_SEQUENCE) + len(STOP_SEQUENCE) - 1
+    assert all(e == -1 for e in ends[:ends.index(1)])
+
+
+def test_matcher_ignores_near_misses():
+    matcher = StopSequenceMatcher()
+    assert all(matcher.feed(s) == -1 for s in ["END", "_OF", "_AR", "X", "CH", "END_OF", "_ARC"])
+
+
+def test_collect_stops_and_closes_the_stream():
+    closed = []
+
+    def segments():
+        try:
+            yield from ["ARCH", "ITECTURE: A -> B\n", "END", "_OF_", "ARCH", "\n\nNote:", " more"]
+        finally:
+            closed.append(True)
+
+    seen = []
+    result = collect_until_stop(segments(), max_tokens=100, on_text=seen.append)
+    assert result.text == "ARCHITECTURE: A -> B\nEND_OF_ARCH"
+    assert "".join(seen) == result.text
+    assert result.stopped and result.tokens == 5
+    assert result.tokens_saved == 95
+    assert closed == [True]
+
+
+def test_collect_without_sentinel_saves_nothing():
+    result = collect_until_stop(iter(["a", "b", "c"]), max_tokens=3)
+    assert result.text == "abc"
+    assert not result.stopped
+    assert result.tokens_saved == 0
+
+
+def test_fake_backend_decoding_ends_at_sentinel():
+    backend = FakeBackend()
+    prompt = format_prompt(backend.tokenizer, QUESTION)
+    full = backend.generate_batch([prompt], 500, {})[0]
+    steps_full = backend.model.decode_steps
+
+    result = stream_until_stop(backend, prompt, 500, {})
+    steps_streamed = backend.model.decode_steps - steps_full
+
+    assert result.text == clean_response(full)
+    assert steps_streamed == result.tokens < steps_full
+    assert result.tokens_saved == 500 - result.tokens
+
+
+def test_curriculum_prompt_stops_like_enforce_stop():
+    backend = FakeBackend()
+    prompt = build_prompt(backend.tokenizer, QUESTION)
+    result = stream_until_stop(backend, prompt, 600, {})
+    assert enforce_stop(result.text) == enforce_stop(backend.generate_batch([prompt], 600, {})[0])
+    assert result.text.count(STOP_SEQUENCE) == 1
+
+
+def test_default_engine_path_stops_each_sequence_at_sentinel(tmp_path):
+    backend = FakeBackend()
+    prompts = [build_prompt(backend.tokenizer, QUESTION), build_prompt(backend.tokenizer, "Kafka consumers lag.")]
+    engine = GenerationEngine(backend, str(tmp_path / "out.jsonl"), str(tmp_path / "ckpt.json"), max_tokens=600)
+
+    texts = engine.generate(prompts)
+
+    assert all(t.endswith(STOP_SEQUENCE) for t in texts)
+    assert engine.tokens_saved > 0
+    assert [enforce_stop(t) for t in texts] == [enforce_stop(t) for t in backend.generate_batch(prompts, 600, {})]
+
+
+def test_model_host_batch_until_stop_round_trips(model_host_server):
+    _, client = model_host_server
+    remote = RemoteBackend(client, "fake", "fake-model")
+    prompt = build_prompt(remote.tokenizer, QUESTION)
+    local = FakeBackend().generate_batch_until_stop([prompt], 600, {})[0]
+    result = remote.generate_batch_until_stop([prompt], 600, {})[0]
+    assert (result.text, result.tokens, result.stopped) == (local.text, local.tokens, local.stopped)
@@ -0,0 +1,65 @@
+from scripts.utils import STRUCTURE_KEYS, clean_response, has_structure, parse_response
+
+RESPONSE = """QUESTION: Why does the cache stampede?
+THOUGHT:
+1. FAILURE MODE: a
+2. NAIVE FIXES: b
+3. MECHANISM: c
+4. TRADE-OFF: d
+ARCHITECTURE: API Gateway -> Redis Cache (hot keys) -> Primary DB
+END_OF_ARCH
+
+trailing ramble"""
+
+
+def test_sections_exclude_next_enumerator():
+    parsed = parse_response(RESPONSE)
+    assert [parsed.section(k) for k in ("FAILURE MODE", "NAIVE FIXES", "MECHANISM", "TRADE-OFF")] == \
+        ["a", "b", "c", "d"]
+
+
+def test_empty_section_reads_empty():
+    parsed = parse_response(RESPONSE.replace("2. NAIVE FIXES: b", "2. NAIVE FIXES:"))
+    assert parsed.section("NAIVE FIXES") == ""
+    assert parsed.section("FAILURE MODE") == "a"
+
+
+def test_numbers_inside_a_body_are_kept():
+    parsed = parse_response(RESPONSE.replace("3. MECHANISM: c", "3. MECHANISM: move to HTTP 2."))
+    assert parsed.section("MECHANISM") == "move to HTTP 2."
+
+
+def test_components_and_structure():
+    parsed = parse_response(RESPONSE)
+    assert parsed.structured
+    assert parsed.missing == []
+    assert parsed.components == ["API Gateway", "Redis Cache (hot keys)", "Primary DB"]
+    assert parsed.clean() == clean_response(RESPONSE)
+    assert parsed.clean().endswith("Primary DB\nEND_OF_ARCH")
+
+
+def test_missing_markers():
+    parsed = parse_response("QUESTION: q\nTHOUGHT:\n1. FAILURE MODE: a\nARCHITECTURE: A -> B")
+    assert not parsed.structured
+    assert parsed.missing == [k for k in STRUCTURE_KEYS if k not in ("FAILURE MODE", "ARCHITECTURE")]
+    assert parsed.end is None
+    assert parsed.components == ["A", "B"]
+
+
+def test_marker_word_inside_an_earlier_section_is_not_its_label():
+    parsed = parse_response(RESPONSE.replace("1. FAILURE MODE: a", "1. FAILURE MODE: the ARCHITECTURE has no cache"))
+    assert parsed.section("FAILURE MODE") == "the ARCHITECTURE has no cache"
+    assert parsed.components == ["API Gateway", "Redis Cache (hot keys)", "Primary DB"]
+
+
+def test_out_of_order_markers_are_still_found():
+    swapped = RESPONSE.replace("3. MECHANISM: c\n4. TRADE-OFF: d", "3. TRADE-OFF: d\n4. MECHANISM: c")
+    parsed = parse_response(swapped)
+    assert parsed.structured
+    assert parsed.positions["MECHANISM"] > parsed.positions["TRADE-OFF"]
+    assert (parsed.section("MECHANISM"), parsed.section("TRADE-OFF")) == ("c", "d")
+
+
+def test_has_structure_matches_the_parse():
+    for text in (RESPONSE, RESPONSE.replace("END_OF_ARCH", ""), RESPONSE.replace("NAIVE FIXES", "FIXES"), ""):
+        assert has_structure(text) == parse_response(text).structured
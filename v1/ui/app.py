@@ -3,10 +3,22 @@ import os
 sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 
 import streamlit as st
-from mlx_lm import load, generate
 import time
 import html
-from scripts.utils import has_structure, format_prompt, clean_response, get_sampler
+from scripts.artifacts import ArtifactStore
+from scripts.inference import InferenceLayer
+from scripts.model_host import ModelHostClient
+from scripts.response_cache import ResponseCache
+
+VANILLA = "Llama-3.2-3B-Instruct"
+NEURAL_EDGE = "Neural Edge 3B"
+MODELS = {
+    VANILLA: "mlx-community/Llama-3.2-3B-Instruct-4bit",
+    # experiment:<id> serves that run's adapter from the artifact store on top of the shared base
+    NEURAL_EDGE: os.environ.get("NED_MODEL", "models/neural-edge-3b/"),
+}
+BACKEND = os.environ.get("NED_BACKEND", "mlx")  # "fake" renders the page without MLX weights
+CACHE_ENABLED = os.environ.get("NED_CACHE", "1") != "0"  # NED_CACHE=0 always runs the models
 
 st.set_page_config(layout="wide", page_title="Neural Edge Distiller", page_icon="⚡")
 
@@ -96,9 +108,21 @@ st.markdown("""
 
 @st.cache_resource
 def load_all_models():
-    v_model, v_tok = load("mlx-community/Llama-3.2-3B-Instruct-4bit")
-    n_model, n_tok = load("models/neural-edge-3b/")
-    return (v_model, v_tok), (n_model, n_tok)
+    # Both models load in parallel; the inference layer owns them from here on
+    cache = ResponseCache(os.path.join(os.path.dirname(__file__), "..", "data", "cache", "responses.sqlite"),
+                          enabled=CACHE_ENABLED)
+    store = ArtifactStore(os.environ.get("NED_ARTIFACTS", os.path.join(os.path.dirname(__file__), "..", "models", "store")))
+    # With `python -m scripts.model_host serve` running, the weights survive app restarts
+    return InferenceLayer.load(MODELS, backend_name=BACKEND, cache=cache, store=store, host=ModelHostClient())
+
+
+def render_response(placeholder, text, box_class):
+    placeholder.markdown(f'<div class="response-wrap"><div class="{box_class}">{html.escape(text)}</div></div>', unsafe_allow_html=True)
+
+
+def render_metrics(placeholder, gen, value_class):
+    sl = '<span class="struct-pass">✓ structured</span>' if gen.structured else '<span class="struct-fail">✗ unstructured</span>'
+    placeholder.markdown(f'<div class="metrics-row"><div class="metric-item"><span class="{value_class}">{gen.elapsed:.2f}s</span><span class="metric-label">{"Latency · cached" if gen.cached else "Latency"}</span></div><div class="metric-item"><span class="{value_class}">{gen.tps:.1f}</span><span class="metric-label">Tok / sec</span></div>{sl}</div>', unsafe_allow_html=True)
 
 
 st.markdown("""
@@ -109,42 +133,52 @@ st.markdown("""
 """, unsafe_allow_html=True)
 
 with st.spinner("Hydrating models into unified memory..."):
-    (v_model, v_tok), (n_model, n_tok) = load_all_models()
+    inference = load_all_models()
 
 st.markdown('<div class="input-label">System Design Scenario</div>', unsafe_allow_html=True)
 scenario = st.text_area("scenario", placeholder="e.g. Kafka consumer lag spiking to 48 hours under peak load with strict per-user event ordering. Recover throughput without violating ordering constraints.", height=85, label_visibility="collapsed")
 run = st.button("Run Dual Inference →", type="primary")
+fresh = st.checkbox("Bypass response cache", value=False, disabled=not CACHE_ENABLED)
 st.markdown("<hr style='border:none;border-top:1px solid #1a2236;margin:1.5rem 0'>", unsafe_allow_html=True)
 
 if run and scenario.strip():
-    sampler = get_sampler()
     col1, col2 = st.columns(2, gap="large")
 
     with col1:
         st.markdown('<div class="col-header"><div class="col-dot"></div><span class="col-model-name">Llama-3.2-3B-Instruct</span><span class="col-model-tag">Vanilla Baseline</span></div>', unsafe_allow_html=True)
-        with st.spinner("Generating..."):
-            t0 = time.time()
-            v_res = generate(v_model, v_tok, prompt=format_prompt(v_tok, scenario), max_tokens=500, sampler=sampler)
-            v_elapsed = time.time() - t0
-            v_res = clean_response(v_res)
-        v_tps = round(len(v_res.split()) / v_elapsed, 1)
-        v_struct = has_structure(v_res)
-        st.markdown(f'<div class="response-wrap"><div class="response-box">{html.escape(v_res)}</div></div>', unsafe_allow_html=True)
-        sl = '<span class="struct-pass">✓ structured</span>' if v_struct else '<span class="struct-fail">✗ unstructured</span>'
-        st.markdown(f'<div class="metrics-row"><div class="metric-item"><span class="metric-value">{v_elapsed:.2f}s</span><span class="metric-label">Latency</span></div><div class="metric-item"><span class="metric-value">{v_tps}</span><span class="metric-label">Tok / sec</span></div>{sl}</div>', unsafe_allow_html=True)
+        v_box, v_metrics = st.empty(), st.empty()
 
     with col2:
         st.markdown('<div class="col-header"><div class="col-dot-green"></div><span class="col-model-name">Neural Edge 3B</span><span class="col-model-tag-green">LoRA Distilled</span></div>', unsafe_allow_html=True)
-        with st.spinner("Generating..."):
-            t0 = time.time()
-            n_res = generate(n_model, n_tok, prompt=format_prompt(n_tok, scenario), max_tokens=500, sampler=sampler)
-            n_elapsed = time.time() - t0
-            n_res = clean_response(n_res)
-        n_tps = round(len(n_res.split()) / n_elapsed, 1)
-        n_struct = has_structure(n_res)
-        st.markdown(f'<div class="response-wrap"><div class="response-box-finetuned">{html.escape(n_res)}</div></div>', unsafe_allow_html=True)
-        sl = '<span class="struct-pass">✓ structured</span>' if n_struct else '<span class="struct-fail">✗ unstructured</span>'
-        st.markdown(f'<div class="metrics-row"><div class="metric-item"><span class="metric-value-green">{n_elapsed:.2f}s</span><span class="metric-label">Latency</span></div><div class="metric-item"><span class="metric-value-green">{n_tps}</span><span class="metric-label">Tok / sec</span></div>{sl}</div>', unsafe_allow_html=True)
+        n_box, n_metrics = st.empty(), st.empty()
+
+    boxes = {VANILLA: (v_box, "response-box"), NEURAL_EDGE: (n_box, "response-box-finetuned")}
+    partial = {label: "" for label in boxes}
+    results = {}
+    last_paint = {label: 0.0 for label in boxes}
+
+    # Both models decode concurrently; tokens are painted into their column as they arrive
+    with st.spinner("Generating..."):
+        for kind, label, payload in inference.stream(scenario, use_cache=not fresh):
+            if kind == "token":
+                partial[label] += payload
+                now = time.time()
+                if now - last_paint[label] > 0.05:
+                    render_response(boxes[label][0], partial[label], boxes[label][1])
+                    last_paint[label] = now
+            elif kind == "done":
+                results[label] = payload
+                render_response(boxes[label][0], payload.text, boxes[label][1])
+            else:
+                st.error(f"{label} failed: {payload}")
+                st.stop()
+
+    v_gen, n_gen = results[VANILLA], results[NEURAL_EDGE]
+    render_metrics(v_metrics, v_gen, "metric-value")
+    render_metrics(n_metrics, n_gen, "metric-value-green")
+    v_struct, n_struct = v_gen.structured, n_gen.structured
+    v_tps, n_tps = round(v_gen.tps, 1), round(n_gen.tps, 1)
+    v_elapsed, n_elapsed = v_gen.elapsed, n_gen.elapsed
 
     tps_d = round(n_tps - v_tps, 1)
     lat_d = round(n_elapsed - v_elapsed, 2)
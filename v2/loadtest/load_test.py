@@ -0,0 +1,140 @@
+"""
+Closed-loop load test for the gateway.
+
+Start the local stand-ins first:
+
+    docker compose up -d postgres redis
+    python loadtest/load_test.py --spawn --concurrency 64 --duration 30
+
+--spawn runs the gateway with uvicorn against localhost Postgres/Redis;
+without it the script targets an already running gateway at --url.
+"""
+import argparse
+import asyncio
+import os
+import random
+import subprocess
+import sys
+import time
+from collections import Counter, defaultdict
+
+import httpx
+
+GATEWAY_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "services", "gateway")
+
+LOCAL_ENV = {
+    "POSTGRES_HOST": "localhost",
+    "POSTGRES_DB": "neural_edge",
+    "POSTGRES_USER": "nova",
+    "POSTGRES_PASSWORD": "devpassword",
+    "REDIS_HOST": "localhost",
+    "REDIS_PORT": "6379",
+}
+
+
+def percentile(values, q):
+    if not values:
+        return None
+    ordered = sorted(values)
+    k = (len(ordered) - 1) * q / 100
+    lo = int(k)
+    hi = min(lo + 1, len(ordered) - 1)
+    return ordered[lo] + (ordered[hi] - ordered[lo]) * (k - lo)
+
+
+def spawn_gateway(port, workers):
+    env = {**os.environ, **{k: os.environ.get(k, v) for k, v in LOCAL_ENV.items()}}
+    return subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--port", str(port), "--workers", str(workers),
+         "--log-level", "warning"],
+        cwd=GATEWAY_DIR, env=env,
+    )
+
+
+async def wait_ready(client, timeout=30):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            if (await client.get("/ready")).status_code == 200:
+                return
+        except httpx.TransportError:
+            pass
+        await asyncio.sleep(0.5)
+    raise RuntimeError("Gateway did not become ready")
+
+
+async def user(client, deadline, read_ratio, known_ids, latencies, codes):
+    n = 0
+    while time.monotonic() < deadline:
+        if known_ids and random.random() < read_ratio:
+            endpoint = "GET /experiments/{id}"
+            call = client.get(f"/experiments/{random.choice(known_ids)}")
+        else:
+            endpoint = "POST /experiments"
+            call = client.post("/experiments", json={"name": f"load-{n}", "description": "load test"})
+        start = time.perf_counter()
+        try:
+            response = await call
+            codes[response.status_code] += 1
+            if endpoint.startswith("POST") and response.status_code == 200:
+                known_ids.append(response.json()["id"])
+        except httpx.HTTPError as e:
+            codes[type(e).__name__] += 1
+            continue
+        latencies[endpoint].append(time.perf_counter() - start)
+        n += 1
+
+
+async def run(args):
+    limits = httpx.Limits(max_connections=args.concurrency, max_keepalive_connections=args.concurrency)
+    async with httpx.AsyncClient(base_url=args.url, limits=limits, timeout=30) as client:
+        await wait_ready(client)
+        latencies, codes, known_ids = defaultdict(list), Counter(), []
+
+        start = time.monotonic()
+        deadline = start + args.duration
+        await asyncio.gather(*(user(client, deadline, args.read_ratio, known_ids, latencies, codes)
+                               for _ in range(args.concurrency)))
+        elapsed = time.monotonic() - start
+        pools = (await client.get("/metrics/pools")).json()
+        outbox = (await client.get("/metrics/outbox")).json()
+
+    total = sum(len(v) for v in latencies.values())
+    print(f"\n  {total} requests in {elapsed:.1f}s  →  {total / elapsed:.1f} req/s  (concurrency {args.concurrency})")
+    print(f"  Status codes: {dict(codes)}\n")
+    print(f"  {'Endpoint':<24} {'n':>7} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8}")
+    for endpoint, values in sorted(latencies.items()):
+        p50, p95, p99 = (percentile(values, q) * 1000 for q in (50, 95, 99))
+        print(f"  {endpoint:<24} {len(values):>7} {p50:>8.1f} {p95:>8.1f} {p99:>8.1f}")
+
+    # With --workers > 1 these numbers are from whichever worker answered
+    pg, rd = pools["postgres"], pools["redis"]
+    print(f"\n  Postgres pool: {pg['size']}/{pg['max_size']} open, {pg['acquires']} checkouts, "
+          f"wait avg {pg['acquire_wait_avg_ms']:.2f} ms / max {pg['acquire_wait_max_ms']:.1f} ms, "
+          f"{pg['acquire_timeouts']} timeouts")
+    print(f"  Redis pool:    {rd['size']}/{rd['max_size']} open")
+    print(f"  Outbox relay:  {outbox['relayed']} jobs in {outbox['batches']} batches, "
+          f"{outbox['pending']} pending, {outbox['errors']} errors\n")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Load-test the gateway's experiment endpoints.")
+    parser.add_argument("--url", default="http://localhost:8000")
+    parser.add_argument("--concurrency", type=int, default=32, help="Concurrent closed-loop clients")
+    parser.add_argument("--duration", type=float, default=20.0, help="Seconds")
+    parser.add_argument("--read-ratio", type=float, default=0.8, help="Share of GETs once ids exist")
+    parser.add_argument("--spawn", action="store_true", help="Start the gateway locally with uvicorn")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--workers", type=int, default=1)
+    args = parser.parse_args()
+
+    server = None
+    if args.spawn:
+        args.url = f"http://localhost:{args.port}"
+        server = spawn_gateway(args.port, args.workers)
+    try:
+        asyncio.run(run(args))
+    finally:
+        if server is not None:
+            server.terminate()
+            server.wait()
@@ -0,0 +1,3 @@
+-- Fencing token and attempt counter for at-least-once job delivery
+ALTER TABLE experiments ADD COLUMN IF NOT EXISTS lease TEXT;
+ALTER TABLE experiments ADD COLUMN IF NOT EXISTS attempts INTEGER NOT NULL DEFAULT 0;
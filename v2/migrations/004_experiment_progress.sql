@@ -0,0 +1,2 @@
+-- Latest training progress (step, loss, tokens/sec) written by the worker's status writer
+ALTER TABLE experiments ADD COLUMN IF NOT EXISTS progress JSONB;
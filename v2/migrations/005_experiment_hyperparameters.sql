@@ -0,0 +1,2 @@
+-- Hyperparameters the experiment was submitted with (merged with the training service defaults at run time)
+ALTER TABLE experiments ADD COLUMN IF NOT EXISTS hyperparameters JSONB;
@@ -0,0 +1,3 @@
+-- Keyset pagination for GET /experiments, newest first, with and without a status filter
+CREATE INDEX IF NOT EXISTS experiments_status_created ON experiments (status, created_at DESC, id DESC);
+CREATE INDEX IF NOT EXISTS experiments_created ON experiments (created_at DESC, id DESC);
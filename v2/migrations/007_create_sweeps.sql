@@ -0,0 +1,24 @@
+-- Hyperparameter sweeps: child experiments plus the validation loss each trial reported at every ASHA rung
+CREATE TABLE IF NOT EXISTS sweeps (
+    id UUID PRIMARY KEY,
+    name TEXT NOT NULL,
+    description TEXT,
+    search_space JSONB NOT NULL,
+    asha JSONB NOT NULL,
+    created_at TIMESTAMPTZ NOT NULL DEFAULT NOW()
+);
+
+ALTER TABLE experiments ADD COLUMN IF NOT EXISTS sweep_id UUID REFERENCES sweeps (id);
+CREATE INDEX IF NOT EXISTS experiments_sweep ON experiments (sweep_id) WHERE sweep_id IS NOT NULL;
+
+CREATE TABLE IF NOT EXISTS sweep_rungs (
+    sweep_id UUID NOT NULL REFERENCES sweeps (id),
+    experiment_id UUID NOT NULL REFERENCES experiments (id),
+    rung INTEGER NOT NULL,
+    iters INTEGER NOT NULL,
+    val_loss DOUBLE PRECISION NOT NULL,
+    decision TEXT NOT NULL,
+    created_at TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+    PRIMARY KEY (experiment_id, rung)
+);
+CREATE INDEX IF NOT EXISTS sweep_rungs_by_rung ON sweep_rungs (sweep_id, rung);
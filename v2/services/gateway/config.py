@@ -3,14 +3,37 @@ from pydantic_settings import BaseSettings
 
 class Settings(BaseSettings):
     postgres_host: str
+    postgres_port: int = 5432
     postgres_db: str
     postgres_user: str
     postgres_password: str
     redis_host: str
     redis_port: int
 
+    # Pools are per process: keep db_pool_max_size * uvicorn workers below Postgres max_connections (100)
+    db_pool_min_size: int = 2
+    db_pool_max_size: int = 10
+    db_pool_acquire_timeout_s: float = 5.0
+    db_pool_max_idle_s: float = 300.0
+    db_command_timeout_s: float = 10.0
+    redis_max_connections: int = 20
+    redis_pool_timeout_s: float = 5.0
+    health_check_timeout_s: float = 2.0
+
+    # Applied at startup so existing Postgres volumes pick up new migrations (initdb only runs on empty ones)
+    migrations_dir: str = "migrations"
+    apply_migrations: bool = True
+
+    # Outbox relay: drains committed jobs to Redis; NOTIFY wakes it early, polling is the fallback
+    outbox_relay_enabled: bool = True
+    outbox_batch_size: int = 500
+    outbox_poll_interval_s: float = 1.0
+
+    sse_keepalive_s: float = 15.0
+    sweep_max_trials: int = 256
+
     class Config:
         env_file = ".env"
 
 
-settings = Settings()
\ No newline at end of file
+settings = Settings()
@@ -0,0 +1,128 @@
+import asyncio
+import time
+from contextlib import asynccontextmanager
+
+import asyncpg
+import redis.asyncio as aioredis
+
+from config import settings
+from telemetry import DB_ACQUIRE, log_query, redis_timer
+
+
+async def init_connection(conn):
+    conn.add_query_logger(log_query)
+
+
+class DataLayer:
+    """
+    One asyncpg pool and one Redis connection pool per gateway process.
+
+    Connections are opened at startup and reused across requests, so a
+    request only pays for a pool checkout. When every connection is busy,
+    callers wait up to the acquire timeout and then get PoolExhausted.
+    """
+
+    def __init__(self):
+        self.pg = None
+        self.redis = None
+        self.stats = {"acquires": 0, "acquire_wait_s": 0.0, "acquire_wait_max_s": 0.0, "acquire_timeouts": 0}
+
+    async def connect(self):
+        self.pg = await asyncpg.create_pool(
+            host=settings.postgres_host,
+            port=settings.postgres_port,
+            database=settings.postgres_db,
+            user=settings.postgres_user,
+            password=settings.postgres_password,
+            min_size=settings.db_pool_min_size,
+            max_size=settings.db_pool_max_size,
+            max_inactive_connection_lifetime=settings.db_pool_max_idle_s,
+            command_timeout=settings.db_command_timeout_s,
+            init=init_connection,
+        )
+        # BlockingConnectionPool waits for a free connection instead of opening unbounded new ones
+        self.redis = aioredis.Redis(connection_pool=aioredis.BlockingConnectionPool(
+            host=settings.redis_host,
+            port=settings.redis_port,
+            max_connections=settings.redis_max_connections,
+            timeout=settings.redis_pool_timeout_s,
+            health_check_interval=30,
+            decode_responses=True,
+        ))
+
+    async def close(self):
+        if self.redis is not None:
+            await self.redis.aclose()
+        if self.pg is not None:
+            await self.pg.close()
+
+    @asynccontextmanager
+    async def connection(self):
+        start = time.perf_counter()
+        try:
+            conn = await self.pg.acquire(timeout=settings.db_pool_acquire_timeout_s)
+        except asyncio.TimeoutError:
+            self.stats["acquire_timeouts"] += 1
+            raise PoolExhausted("postgres")
+        wait = time.perf_counter() - start
+        DB_ACQUIRE.observe(wait)
+        self.stats["acquires"] += 1
+        self.stats["acquire_wait_s"] += wait
+        self.stats["acquire_wait_max_s"] = max(self.stats["acquire_wait_max_s"], wait)
+        try:
+            yield conn
+        finally:
+            await self.pg.release(conn)
+
+    async def _check(self, probe):
+        try:
+            await asyncio.wait_for(probe(), settings.health_check_timeout_s)
+            return True
+        except Exception:
+            return False
+
+    async def health(self):
+        async def pg_probe():
+            async with self.connection() as conn:
+                await conn.fetchval("SELECT 1")
+
+        async def redis_probe():
+            with redis_timer("ping"):
+                await self.redis.ping()
+
+        postgres, redis_ok = await asyncio.gather(self._check(pg_probe), self._check(redis_probe))
+        return {"postgres": postgres, "redis": redis_ok}
+
+    def postgres_metrics(self):
+        acquires = self.stats["acquires"]
+        return {
+            "size": self.pg.get_size(),
+            "idle": self.pg.get_idle_size(),
+            "in_use": self.pg.get_size() - self.pg.get_idle_size(),
+            "min_size": self.pg.get_min_size(),
+            "max_size": self.pg.get_max_size(),
+            "acquires": acquires,
+            "acquire_wait_avg_ms": self.stats["acquire_wait_s"] / acquires * 1000 if acquires else 0.0,
+            "acquire_wait_max_ms": self.stats["acquire_wait_max_s"] * 1000,
+            "acquire_timeouts": self.stats["acquire_timeouts"],
+        }
+
+    def redis_metrics(self):
+        return redis_pool_metrics(self.redis.connection_pool)
+
+    def pool_metrics(self):
+        return {"postgres": self.postgres_metrics(), "redis": self.redis_metrics()}
+
+
+def redis_pool_metrics(pool):
+    # redis-py keeps no public counters; the asyncio pools track these two lists
+    idle = len(pool._available_connections)
+    in_use = len(pool._in_use_connections)
+    return {"size": idle + in_use, "idle": idle, "in_use": in_use, "max_size": pool.max_connections}
+
+
+class PoolExhausted(Exception):
+    pass
+
+
+data = DataLayer()
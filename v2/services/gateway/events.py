@@ -0,0 +1,60 @@
+import asyncio
+import json
+from collections import defaultdict
+from contextlib import asynccontextmanager
+
+
+class EventHub:
+    """
+    Fans experiment events from Redis pub/sub out to SSE listeners.
+
+    One pattern subscription on experiments:* per gateway process, however
+    many clients are streaming, so open streams don't hold pool connections.
+    A listener that falls `queue_size` events behind loses its oldest ones.
+    """
+
+    def __init__(self, data, queue_size=100):
+        self.data = data
+        self.queue_size = queue_size
+        self.listeners = defaultdict(set)
+        self.stats = {"received": 0, "delivered": 0, "dropped": 0}
+
+    async def run(self):
+        while True:
+            pubsub = self.data.redis.pubsub()
+            try:
+                await pubsub.psubscribe("experiments:*")
+                async for message in pubsub.listen():
+                    if message["type"] == "pmessage":
+                        self._dispatch(message["channel"].split(":", 1)[1], json.loads(message["data"]))
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"[EVENTS] subscription lost, reconnecting — {e}")
+                await asyncio.sleep(1)
+            finally:
+                await pubsub.aclose()
+
+    def _dispatch(self, experiment_id, event):
+        self.stats["received"] += 1
+        for queue in self.listeners.get(experiment_id, ()):
+            if queue.full():
+                queue.get_nowait()
+                self.stats["dropped"] += 1
+            queue.put_nowait(event)
+            self.stats["delivered"] += 1
+
+    @asynccontextmanager
+    async def subscribe(self, experiment_id):
+        queue = asyncio.Queue(maxsize=self.queue_size)
+        self.listeners[experiment_id].add(queue)
+        try:
+            yield queue
+        finally:
+            self.listeners[experiment_id].discard(queue)
+            if not self.listeners[experiment_id]:
+                del self.listeners[experiment_id]
+
+    @property
+    def open_streams(self):
+        return sum(len(queues) for queues in self.listeners.values())
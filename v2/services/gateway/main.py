@@ -1,80 +1,398 @@
-from fastapi import FastAPI, HTTPException
-from pydantic import BaseModel
+import asyncio
+import base64
+import time
+from contextlib import asynccontextmanager
+from datetime import datetime
+from fastapi import FastAPI, Header, HTTPException, Query
+from fastapi.responses import JSONResponse, Response, StreamingResponse
+from pydantic import BaseModel, Field, ValidationError, model_validator
+from typing import Literal
+from redis.exceptions import ConnectionError as RedisConnectionError
 import uuid
-import redis
 import json
-import psycopg2
 from config import settings
+from db import PoolExhausted, data
+from events import EventHub
+from migrations import apply_migrations
+from outbox import OutboxRelay
+from sweeps import best_trial, expand
+from telemetry import (MetricsMiddleware, configure_logging, job_trace, log_span, render, scrape_failed,
+                       start_trace)
 
+configure_logging()
 
-app = FastAPI(title="Neural Edge Distiller — Control Plane")
+relay = OutboxRelay(data)
+hub = EventHub(data)
 
-redis_client = redis.Redis(host=settings.redis_host, port=settings.redis_port, decode_responses=True)
+Status = Literal["queued", "training", "completed", "failed", "stopped"]
+TERMINAL = ("completed", "failed", "stopped")
+EXPERIMENT_COLUMNS = "id, name, description, status, created_at, completed_at, hyperparameters, progress"
 
-def get_db_connection():
-    return psycopg2.connect(
-        host=settings.postgres_host,
-        dbname=settings.postgres_db,
-        user=settings.postgres_user,
-        password=settings.postgres_password
-    )
+# Row and outbox entry commit atomically in one statement; the relay enqueues the job
+INSERT_EXPERIMENT = (
+    "WITH experiment AS ("
+    "  INSERT INTO experiments (id, name, description, status, hyperparameters, sweep_id)"
+    "  VALUES ($1, $2, $3, 'queued', $4::jsonb, $5)"
+    ") INSERT INTO outbox (topic, payload) VALUES ('training_jobs', $6)"
+)
+
+
+@asynccontextmanager
+async def lifespan(app):
+    await data.connect()
+    if settings.apply_migrations:
+        async with data.connection() as conn:
+            await apply_migrations(conn, settings.migrations_dir)
+    tasks = [asyncio.create_task(hub.run())]
+    if settings.outbox_relay_enabled:
+        tasks.append(asyncio.create_task(relay.run()))
+    yield
+    for task in tasks:
+        task.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
+    await relay.close()
+    await data.close()
+
+
+app = FastAPI(title="Neural Edge Distiller — Control Plane", lifespan=lifespan)
+app.add_middleware(MetricsMiddleware)
+
+
+@app.exception_handler(PoolExhausted)
+@app.exception_handler(RedisConnectionError)
+async def pool_exhausted(request, exc):
+    return JSONResponse(status_code=503, content={"detail": "Backend busy, retry shortly"})
 
 
 @app.get("/health")
-def health():
+async def health():
     return {"status": "ok"}
 
 
+@app.get("/ready")
+async def ready():
+    checks = await data.health()
+    status = "ok" if all(checks.values()) else "degraded"
+    return JSONResponse(status_code=200 if status == "ok" else 503, content={"status": status, **checks})
+
+
+@app.get("/metrics")
+async def prometheus_metrics():
+    try:
+        pending = await relay.pending()
+    except Exception as e:
+        pending = None
+        scrape_failed("outbox", e)
+    body, content_type = render({"postgres": data.postgres_metrics, "redis": data.redis_metrics},
+                                pending, hub.open_streams)
+    return Response(body, media_type=content_type)
+
+
+@app.get("/metrics/pools")
+async def pool_metrics():
+    return data.pool_metrics()
+
+
+@app.get("/metrics/outbox")
+async def outbox_metrics():
+    return {"pending": await relay.pending(), **relay.stats}
+
+
+@app.get("/metrics/events")
+async def event_metrics():
+    return {"open_streams": hub.open_streams, **hub.stats}
+
+
+def experiment_out(row):
+    return {
+        "id": str(row["id"]),
+        "name": row["name"],
+        "description": row["description"],
+        "status": row["status"],
+        "created_at": row["created_at"],
+        "completed_at": row["completed_at"],
+        "hyperparameters": json.loads(row["hyperparameters"]) if row["hyperparameters"] else {},
+        "progress": json.loads(row["progress"]) if row["progress"] else None
+    }
+
+
+def encode_cursor(row):
+    return base64.urlsafe_b64encode(f"{row['created_at'].isoformat()}|{row['id']}".encode()).decode()
+
+
+def decode_cursor(cursor):
+    try:
+        created_at, experiment_id = base64.urlsafe_b64decode(cursor.encode()).decode().split("|")
+        return datetime.fromisoformat(created_at), uuid.UUID(experiment_id)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+
+class JobResources(BaseModel):
+    num_cpus: float = Field(1.0, gt=0)
+    memory_gb: float = Field(2.0, gt=0)
+
+
+class Hyperparameters(BaseModel):
+    model: str | None = None
+    trainer: Literal["auto", "mlx", "numpy"] | None = None
+    iters: int | None = Field(None, gt=0)
+    batch_size: int | None = Field(None, gt=0)
+    num_layers: int | None = Field(None, gt=0)
+    learning_rate: float | None = Field(None, gt=0)
+    lora_rank: int | None = Field(None, gt=0)
+    lora_alpha: float | None = Field(None, gt=0)
+    max_seq_len: int | None = Field(None, gt=0)
+    checkpoint_every: int | None = Field(None, gt=0)
+    report_every: int | None = Field(None, gt=0)
+
+
 class ExperimentCreate(BaseModel):
     name: str
     description: str
+    resources: JobResources | None = None
+    hyperparameters: Hyperparameters | None = None
 
 
-@app.post("/experiments")
-def create_experiment(experiment: ExperimentCreate):
-    experiment_id = str(uuid.uuid4())
-
-    conn = get_db_connection()
-    cur = conn.cursor()
-    cur.execute(
-        "INSERT INTO experiments (id, name, description, status) VALUES (%s, %s, %s, %s)",
-        (experiment_id, experiment.name, experiment.description, "queued")
-    )
-    conn.commit()
-    cur.close()
-    conn.close()
-
+def build_job(experiment_id, name, description, resources=None, hyperparameters=None, sweep=None, trace=None):
     job = {
         "id": experiment_id,
-        "name": experiment.name,
-        "description": experiment.description,
+        "name": name,
+        "description": description,
         "status": "queued"
     }
+    if trace is not None:
+        job["trace"] = job_trace(trace)
+    if resources is not None:
+        job["resources"] = resources.model_dump()
+    if hyperparameters:
+        job["hyperparameters"] = hyperparameters
+    if sweep is not None:
+        job["sweep"] = sweep
+    return job
+
+
+@app.post("/experiments")
+async def create_experiment(experiment: ExperimentCreate, traceparent: str | None = Header(None)):
+    start = time.perf_counter()
+    trace = start_trace(traceparent)
+    experiment_id = str(uuid.uuid4())
+    hyperparameters = experiment.hyperparameters.model_dump(exclude_none=True) if experiment.hyperparameters else {}
+    job = build_job(experiment_id, experiment.name, experiment.description, experiment.resources, hyperparameters,
+                    trace=trace)
 
-    redis_client.lpush("training_jobs", json.dumps(job))
+    async with data.connection() as conn:
+        await conn.execute(INSERT_EXPERIMENT, experiment_id, experiment.name, experiment.description,
+                           json.dumps(hyperparameters), None, json.dumps(job))
 
+    log_span(trace, "create_experiment", start, experiment_id=experiment_id)
     return job
 
+
+class SearchDimension(BaseModel):
+    values: list[float | int | str] | None = None
+    min: float | None = None
+    max: float | None = None
+    log: bool = False
+    integer: bool = False
+
+    @model_validator(mode="after")
+    def check_bounds(self):
+        if self.values is None:
+            if self.min is None or self.max is None or self.min >= self.max:
+                raise ValueError("give either values or min < max")
+            if self.log and self.min <= 0:
+                raise ValueError("log ranges need min > 0")
+        elif not self.values:
+            raise ValueError("values must not be empty")
+        return self
+
+
+class Asha(BaseModel):
+    min_iters: int = Field(10, gt=0)
+    max_iters: int = Field(100, gt=0)
+    reduction_factor: int = Field(3, ge=2)
+
+    @model_validator(mode="after")
+    def check_budget(self):
+        if self.min_iters >= self.max_iters:
+            raise ValueError("min_iters must be below max_iters")
+        return self
+
+
+class SweepCreate(BaseModel):
+    name: str
+    description: str
+    search_space: dict[str, SearchDimension]
+    num_trials: int | None = Field(None, gt=0)
+    seed: int = 0
+    hyperparameters: Hyperparameters | None = None
+    resources: JobResources | None = None
+    asha: Asha = Asha()
+
+
+@app.post("/sweeps")
+async def create_sweep(sweep: SweepCreate, traceparent: str | None = Header(None)):
+    """Expands the search space into child experiments; ASHA stops weak trials at each rung."""
+    start = time.perf_counter()
+    trace = start_trace(traceparent)
+    unknown = set(sweep.search_space) - set(Hyperparameters.model_fields) | ({"iters"} & set(sweep.search_space))
+    if unknown:
+        raise HTTPException(status_code=422, detail=f"Cannot sweep over: {', '.join(sorted(unknown))}")
+    try:
+        configs = expand(sweep.search_space, sweep.num_trials, sweep.seed, max_trials=settings.sweep_max_trials)
+    except ValueError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+
+    base = sweep.hyperparameters.model_dump(exclude_none=True) if sweep.hyperparameters else {}
+    sweep_id = str(uuid.uuid4())
+    job_sweep = {"id": sweep_id, **sweep.asha.model_dump()}
+    rows, trials = [], []
+    for i, config in enumerate(configs):
+        try:
+            hyperparameters = Hyperparameters(**{**base, **config, "iters": sweep.asha.max_iters}).model_dump(exclude_none=True)
+        except ValidationError as e:
+            raise HTTPException(status_code=422, detail=f"Trial {i} {config}: {e.errors()[0]['msg']}")
+        experiment_id = str(uuid.uuid4())
+        name = f"{sweep.name}/trial-{i}"
+        job = build_job(experiment_id, name, sweep.description, sweep.resources, hyperparameters, job_sweep, trace)
+        rows.append((experiment_id, name, sweep.description, json.dumps(hyperparameters), uuid.UUID(sweep_id),
+                     json.dumps(job)))
+        trials.append({"id": experiment_id, "name": name, "hyperparameters": hyperparameters})
+
+    async with data.connection() as conn:
+        async with conn.transaction():
+            await conn.execute(
+                "INSERT INTO sweeps (id, name, description, search_space, asha) VALUES ($1, $2, $3, $4::jsonb, $5::jsonb)",
+                sweep_id, sweep.name, sweep.description,
+                json.dumps({k: v.model_dump(exclude_none=True) for k, v in sweep.search_space.items()}),
+                json.dumps(sweep.asha.model_dump())
+            )
+            await conn.executemany(INSERT_EXPERIMENT, rows)
+
+    log_span(trace, "create_sweep", start, sweep_id=sweep_id, trials=len(trials))
+    return {"id": sweep_id, "name": sweep.name, "asha": sweep.asha.model_dump(), "trials": trials}
+
+
+@app.get("/sweeps/{sweep_id}")
+async def get_sweep(sweep_id: uuid.UUID):
+    async with data.connection() as conn:
+        sweep = await conn.fetchrow("SELECT id, name, description, search_space, asha, created_at FROM sweeps WHERE id = $1",
+                                    sweep_id)
+        if sweep is None:
+            raise HTTPException(status_code=404, detail="Sweep not found")
+        trials = await conn.fetch(
+            f"SELECT {EXPERIMENT_COLUMNS} FROM experiments WHERE sweep_id = $1 ORDER BY name", sweep_id
+        )
+        rungs = await conn.fetch(
+            "SELECT experiment_id, rung, iters, val_loss, decision FROM sweep_rungs WHERE sweep_id = $1 "
+            "ORDER BY rung, val_loss", sweep_id
+        )
+
+    by_trial = {}
+    for r in rungs:
+        by_trial.setdefault(str(r["experiment_id"]), []).append(
+            {"rung": r["rung"], "iters": r["iters"], "val_loss": r["val_loss"], "decision": r["decision"]})
+    counts = {}
+    for t in trials:
+        counts[t["status"]] = counts.get(t["status"], 0) + 1
+
+    return {
+        "id": str(sweep["id"]),
+        "name": sweep["name"],
+        "description": sweep["description"],
+        "search_space": json.loads(sweep["search_space"]),
+        "asha": json.loads(sweep["asha"]),
+        "created_at": sweep["created_at"],
+        "status": "completed" if all(t["status"] in TERMINAL for t in trials) else "running",
+        "counts": counts,
+        "best": best_trial([(str(r["experiment_id"]), r["rung"], r["val_loss"]) for r in rungs]),
+        "trials": [{**experiment_out(t), "rungs": by_trial.get(str(t["id"]), [])} for t in trials]
+    }
+
+
+@app.get("/experiments")
+async def list_experiments(
+    status: Status | None = None,
+    created_after: datetime | None = None,
+    created_before: datetime | None = None,
+    limit: int = Query(50, ge=1, le=200),
+    cursor: str | None = None,
+):
+    """Newest first. Keyset pagination on (created_at, id): pass next_cursor back as cursor."""
+    clauses, args = [], []
+
+    def arg(value):
+        args.append(value)
+        return f"${len(args)}"
+
+    if status is not None:
+        clauses.append(f"status = {arg(status)}")
+    if created_after is not None:
+        clauses.append(f"created_at >= {arg(created_after)}")
+    if created_before is not None:
+        clauses.append(f"created_at < {arg(created_before)}")
+    if cursor is not None:
+        after_created, after_id = decode_cursor(cursor)
+        clauses.append(f"(created_at, id) < ({arg(after_created)}, {arg(after_id)})")
+
+    where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+    async with data.connection() as conn:
+        rows = await conn.fetch(
+            f"SELECT {EXPERIMENT_COLUMNS} FROM experiments {where} "
+            f"ORDER BY created_at DESC, id DESC LIMIT {arg(limit + 1)}",
+            *args
+        )
+
+    page = rows[:limit]
+    return {
+        "items": [experiment_out(row) for row in page],
+        "next_cursor": encode_cursor(page[-1]) if len(rows) > limit else None
+    }
+
+
 @app.get("/experiments/{experiment_id}")
-def get_experiment(experiment_id: str):
-    conn = get_db_connection()
-    cur = conn.cursor()
-    cur.execute(
-        "SELECT id, name, description, status, created_at, completed_at FROM experiments WHERE id = %s",
-        (experiment_id,)
-    )
-    row = cur.fetchone()
-    cur.close()
-    conn.close()
+async def get_experiment(experiment_id: uuid.UUID):
+    async with data.connection() as conn:
+        row = await conn.fetchrow(
+            f"SELECT {EXPERIMENT_COLUMNS} FROM experiments WHERE id = $1",
+            experiment_id
+        )
 
     if row is None:
         raise HTTPException(status_code=404, detail="Experiment not found")
 
-    return {
-        "id": row[0],
-        "name": row[1],
-        "description": row[2],
-        "status": row[3],
-        "created_at": row[4],
-        "completed_at": row[5]
-    }
\ No newline at end of file
+    return experiment_out(row)
+
+
+@app.get("/experiments/{experiment_id}/events")
+async def stream_experiment(experiment_id: uuid.UUID):
+    """Server-sent events: the current state, then every status/progress change until the run finishes."""
+    async with data.connection() as conn:
+        if not await conn.fetchval("SELECT 1 FROM experiments WHERE id = $1", experiment_id):
+            raise HTTPException(status_code=404, detail="Experiment not found")
+    experiment_id = str(experiment_id)
+
+    async def events():
+        # Subscribe before reading the snapshot so nothing lands in between
+        async with hub.subscribe(experiment_id) as queue:
+            async with data.connection() as conn:
+                row = await conn.fetchrow(f"SELECT {EXPERIMENT_COLUMNS} FROM experiments WHERE id = $1",
+                                          uuid.UUID(experiment_id))
+            if row is None:
+                return
+            snapshot = experiment_out(row)
+            yield f"event: snapshot\ndata: {json.dumps(snapshot, default=str)}\n\n"
+            status = snapshot["status"]
+
+            while status not in TERMINAL:
+                try:
+                    event = await asyncio.wait_for(queue.get(), settings.sse_keepalive_s)
+                except asyncio.TimeoutError:
+                    yield ": keepalive\n\n"
+                    continue
+                status = event["status"]
+                yield f"event: update\ndata: {json.dumps(event)}\n\n"
+
+    return StreamingResponse(events(), media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
@@ -0,0 +1,37 @@
+import os
+
+# pg_advisory_lock key: with several uvicorn workers, one process migrates while the others wait
+MIGRATION_LOCK = 0x4E45_4430
+
+
+async def apply_migrations(conn, directory):
+    """
+    Applies every *.sql file in `directory` that schema_migrations doesn't
+    list yet, in name order, each in its own transaction.
+
+    Postgres only runs /docker-entrypoint-initdb.d on an empty data volume,
+    so an existing volume would otherwise never see migrations added later.
+    The files are idempotent, so a fresh volume that already ran them at
+    init just records them here. Returns the names applied.
+    """
+    await conn.execute("SELECT pg_advisory_lock($1)", MIGRATION_LOCK)
+    try:
+        await conn.execute(
+            "CREATE TABLE IF NOT EXISTS schema_migrations ("
+            "  name TEXT PRIMARY KEY, applied_at TIMESTAMPTZ NOT NULL DEFAULT NOW())"
+        )
+        applied = {r["name"] for r in await conn.fetch("SELECT name FROM schema_migrations")}
+        done = []
+        for name in sorted(f for f in os.listdir(directory) if f.endswith(".sql")):
+            if name in applied:
+                continue
+            with open(os.path.join(directory, name), "r") as f:
+                sql = f.read()
+            async with conn.transaction():
+                await conn.execute(sql)
+                await conn.execute("INSERT INTO schema_migrations (name) VALUES ($1)", name)
+            print(f"[MIGRATIONS] applied {name}")
+            done.append(name)
+        return done
+    finally:
+        await conn.execute("SELECT pg_advisory_unlock($1)", MIGRATION_LOCK)
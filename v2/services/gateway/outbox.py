@@ -0,0 +1,94 @@
+import asyncio
+import time
+
+import asyncpg
+
+from config import settings
+from telemetry import OUTBOX_LAG, OUTBOX_RELAYED, redis_timer
+
+
+class OutboxRelay:
+    """
+    Moves committed outbox rows to their Redis streams.
+
+    Each pass claims up to `batch_size` rows with FOR UPDATE SKIP LOCKED, so
+    every gateway process can run a relay without double-sending, pushes them
+    in one pipeline, and deletes them in the same transaction. If Redis fails
+    the transaction rolls back and the rows are retried on the next pass.
+    A crash between the push and the commit re-sends a batch, so delivery is
+    at-least-once.
+    """
+
+    def __init__(self, data, batch_size=None, poll_interval=None):
+        self.data = data
+        self.batch_size = batch_size or settings.outbox_batch_size
+        self.poll_interval = poll_interval or settings.outbox_poll_interval_s
+        self.wake = asyncio.Event()
+        self.listener = None
+        self.stats = {"batches": 0, "relayed": 0, "errors": 0, "last_batch_size": 0, "last_lag_ms": None}
+
+    async def _listen(self):
+        # Dedicated connection so LISTEN doesn't pin one of the pool's
+        try:
+            self.listener = await asyncpg.connect(
+                host=settings.postgres_host, port=settings.postgres_port, database=settings.postgres_db,
+                user=settings.postgres_user, password=settings.postgres_password,
+            )
+            await self.listener.add_listener("outbox", lambda *_: self.wake.set())
+        except (OSError, asyncpg.PostgresError) as e:
+            print(f"[OUTBOX] LISTEN unavailable, polling every {self.poll_interval}s — {e}")
+
+    async def drain_once(self):
+        async with self.data.connection() as conn:
+            async with conn.transaction():
+                rows = await conn.fetch(
+                    "DELETE FROM outbox WHERE id IN "
+                    "(SELECT id FROM outbox ORDER BY id LIMIT $1 FOR UPDATE SKIP LOCKED) "
+                    "RETURNING id, topic, payload, created_at",
+                    self.batch_size
+                )
+                if not rows:
+                    return 0
+
+                async with self.data.redis.pipeline(transaction=False) as pipe:
+                    for row in sorted(rows, key=lambda r: r["id"]):
+                        pipe.xadd(row["topic"], {"job": row["payload"]})
+                    with redis_timer("outbox_xadd"):
+                        await pipe.execute()
+
+        self.stats["batches"] += 1
+        self.stats["relayed"] += len(rows)
+        self.stats["last_batch_size"] = len(rows)
+        oldest = min(row["created_at"] for row in rows)
+        self.stats["last_lag_ms"] = (time.time() - oldest.timestamp()) * 1000
+        OUTBOX_RELAYED.inc(len(rows))
+        OUTBOX_LAG.observe(self.stats["last_lag_ms"] / 1000)
+        return len(rows)
+
+    async def run(self):
+        await self._listen()
+        while True:
+            self.wake.clear()
+            try:
+                moved = await self.drain_once()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                self.stats["errors"] += 1
+                print(f"[OUTBOX] relay failed, retrying — {e}")
+                await asyncio.sleep(self.poll_interval)
+                continue
+
+            if moved < self.batch_size:
+                try:
+                    await asyncio.wait_for(self.wake.wait(), self.poll_interval)
+                except asyncio.TimeoutError:
+                    pass
+
+    async def pending(self):
+        async with self.data.connection() as conn:
+            return await conn.fetchval("SELECT COUNT(*) FROM outbox")
+
+    async def close(self):
+        if self.listener is not None:
+            await self.listener.close()
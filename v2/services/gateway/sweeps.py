@@ -0,0 +1,55 @@
+import itertools
+import math
+import random
+
+
+def sample(dimension, rng):
+    if dimension.values is not None:
+        return rng.choice(dimension.values)
+    if dimension.log:
+        value = math.exp(rng.uniform(math.log(dimension.min), math.log(dimension.max)))
+    else:
+        value = rng.uniform(dimension.min, dimension.max)
+    return round(value) if dimension.integer else value
+
+
+def trial_count(search_space, num_trials=None):
+    """Number of configs expand() would return, without building them."""
+    if num_trials is not None:
+        return num_trials
+    return math.prod(len(search_space[name].values or ()) for name in search_space)
+
+
+def expand(search_space, num_trials=None, seed=0, max_trials=None):
+    """
+    Trial configs for a search space. Without num_trials every dimension must
+    list its values and the full grid is returned; with it, num_trials
+    configs are sampled (log-uniform where requested), reproducibly per seed.
+    A grid or sample larger than max_trials is rejected before anything is built.
+    """
+    names = sorted(search_space)
+    if num_trials is None:
+        ranged = [name for name in names if search_space[name].values is None]
+        if ranged:
+            raise ValueError(f"num_trials is required when sampling ranges: {', '.join(ranged)}")
+    count = trial_count(search_space, num_trials)
+    if max_trials is not None and count > max_trials:
+        raise ValueError(f"{count} trials exceeds the limit of {max_trials}")
+
+    if num_trials is None:
+        return [dict(zip(names, combo)) for combo in itertools.product(*(search_space[n].values for n in names))]
+
+    rng = random.Random(seed)
+    return [{name: sample(search_space[name], rng) for name in names} for _ in range(num_trials)]
+
+
+def best_trial(rungs):
+    """rungs: [(experiment_id, rung, val_loss)]. The trial that got furthest, lowest loss breaking ties."""
+    furthest = {}
+    for experiment_id, rung, val_loss in rungs:
+        if experiment_id not in furthest or rung > furthest[experiment_id][0]:
+            furthest[experiment_id] = (rung, val_loss)
+    if not furthest:
+        return None
+    experiment_id, (rung, val_loss) = min(furthest.items(), key=lambda kv: (-kv[1][0], kv[1][1]))
+    return {"experiment_id": experiment_id, "rung": rung, "val_loss": val_loss}
@@ -0,0 +1,151 @@
+import json
+import logging
+import os
+import re
+import time
+from contextlib import contextmanager
+
+from prometheus_client import CONTENT_TYPE_LATEST, Counter, Gauge, Histogram, generate_latest
+from starlette.routing import Match
+
+# Request latencies are mostly sub-10ms; keep resolution there, with a tail for slow DB waits
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+REQUEST_LATENCY = Histogram("gateway_request_duration_seconds",
+                            "Time to response headers, by route template",
+                            ["method", "route", "status"], buckets=LATENCY_BUCKETS)
+REQUESTS_IN_PROGRESS = Gauge("gateway_requests_in_progress", "Requests being handled")
+DB_QUERY = Histogram("gateway_db_query_seconds", "Postgres statement time, by leading SQL keyword",
+                     ["operation", "outcome"], buckets=LATENCY_BUCKETS)
+DB_ACQUIRE = Histogram("gateway_db_acquire_seconds", "Wait for a pool connection", buckets=LATENCY_BUCKETS)
+REDIS_LATENCY = Histogram("gateway_redis_seconds", "Redis round trips", ["operation"], buckets=LATENCY_BUCKETS)
+OUTBOX_RELAYED = Counter("gateway_outbox_relayed_total", "Jobs moved from the outbox to Redis")
+OUTBOX_LAG = Histogram("gateway_outbox_lag_seconds", "Outbox commit to Redis XADD, oldest row per batch",
+                       buckets=LATENCY_BUCKETS)
+
+# Point-in-time values copied from the existing stats dicts at scrape time
+DB_POOL = Gauge("gateway_db_pool_connections", "Postgres pool connections", ["state"])
+REDIS_POOL = Gauge("gateway_redis_pool_connections", "Redis pool connections", ["state"])
+OUTBOX_PENDING = Gauge("gateway_outbox_pending", "Rows waiting in the outbox")
+SSE_STREAMS = Gauge("gateway_sse_open_streams", "Open experiment event streams")
+
+SCRAPE_ERRORS = Counter("gateway_metrics_scrape_errors_total", "Metric sources that failed during a scrape",
+                        ["source"])
+
+SQL_VERB = re.compile(r"\s*(\w+)")
+LOG_FORMAT = "%(asctime)s %(levelname)s %(name)s: %(message)s"
+
+logger = logging.getLogger("gateway.telemetry")
+trace_logger = logging.getLogger("gateway.trace")
+
+
+def configure_logging(level=logging.INFO):
+    """Root handler for the process; without one, INFO records (spans included) are dropped."""
+    logging.basicConfig(level=level, format=LOG_FORMAT)
+
+
+def log_query(record):
+    """asyncpg query logger: called after every statement on a pooled connection."""
+    match = SQL_VERB.match(record.query)
+    DB_QUERY.labels(match.group(1).upper() if match else "OTHER",
+                    "error" if record.exception else "ok").observe(record.elapsed)
+
+
+@contextmanager
+def redis_timer(operation):
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        REDIS_LATENCY.labels(operation).observe(time.perf_counter() - start)
+
+
+def route_template(app, scope):
+    """Path template (/experiments/{experiment_id}) so labels don't grow with ids."""
+    for route in app.router.routes:
+        match, _ = route.matches(scope)
+        if match == Match.FULL:
+            return route.path
+    return "unmatched"
+
+
+class MetricsMiddleware:
+    """
+    Pure ASGI middleware, so streamed responses pass through untouched. Latency
+    is taken at http.response.start: for SSE that is time to the first byte,
+    not the lifetime of the stream.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        start = time.perf_counter()
+        REQUESTS_IN_PROGRESS.inc()
+        status = [500]
+
+        async def timed_send(message):
+            if message["type"] == "http.response.start":
+                status[0] = message["status"]
+                REQUEST_LATENCY.labels(scope["method"], route_template(scope["app"], scope),
+                                       str(message["status"])).observe(time.perf_counter() - start)
+            await send(message)
+
+        try:
+            await self.app(scope, receive, timed_send)
+        finally:
+            REQUESTS_IN_PROGRESS.dec()
+
+
+def scrape_failed(source, error):
+    """A source that can't be read keeps its gauges at the last value; the scrape itself still succeeds."""
+    SCRAPE_ERRORS.labels(source).inc()
+    logger.warning("metrics source %s failed: %r", source, error)
+
+
+def render(pool_collectors, outbox_pending, open_streams):
+    """
+    pool_collectors maps "postgres"/"redis" to zero-argument callables, each
+    read on its own so a pool that can't be introspected only skips its own
+    gauges. outbox_pending is None when it couldn't be read.
+    """
+    for source, gauge in (("postgres", DB_POOL), ("redis", REDIS_POOL)):
+        try:
+            pool = pool_collectors[source]()
+        except Exception as e:
+            scrape_failed(source, e)
+            continue
+        gauge.labels("in_use").set(pool["in_use"])
+        gauge.labels("idle").set(pool["idle"])
+        gauge.labels("max").set(pool["max_size"])
+    if outbox_pending is not None:
+        OUTBOX_PENDING.set(outbox_pending)
+    SSE_STREAMS.set(open_streams)
+    return generate_latest(), CONTENT_TYPE_LATEST
+
+
+TRACEPARENT = re.compile(r"^00-([0-9a-f]{32})-([0-9a-f]{16})-[0-9a-f]{2}$")
+
+
+def start_trace(traceparent=None):
+    """
+    W3C trace context for a new job. Continues the caller's trace when the
+    request carried a valid traceparent header, otherwise starts one.
+    """
+    match = TRACEPARENT.match(traceparent or "")
+    trace_id = match.group(1) if match else os.urandom(16).hex()
+    return {"trace_id": trace_id, "parent_id": match.group(2) if match else None, "span_id": os.urandom(8).hex()}
+
+
+def job_trace(trace):
+    """What travels in the job JSON: the gateway span becomes the worker's parent."""
+    return {"traceparent": f"00-{trace['trace_id']}-{trace['span_id']}-01", "created_at": time.time()}
+
+
+def log_span(trace, name, start, **attributes):
+    trace_logger.info(json.dumps({"trace_id": trace["trace_id"], "span_id": trace["span_id"],
+                                 "parent_id": trace["parent_id"], "name": name,
+                                 "duration_ms": round((time.perf_counter() - start) * 1000, 2), **attributes}))
@@ -0,0 +1,9 @@
+import os
+import sys
+
+# Gateway modules import each other by bare name, as they do inside the container
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+for name, value in {"POSTGRES_HOST": "localhost", "POSTGRES_DB": "neural_edge", "POSTGRES_USER": "nova",
+                    "POSTGRES_PASSWORD": "test", "REDIS_HOST": "localhost", "REDIS_PORT": "6379"}.items():
+    os.environ.setdefault(name, value)
@@ -0,0 +1,35 @@
+import asyncio
+
+import asyncpg
+import redis.asyncio as aioredis
+
+from db import DataLayer, redis_pool_metrics
+
+
+def test_redis_pool_metrics_on_a_real_pool():
+    pool = aioredis.BlockingConnectionPool(host="localhost", max_connections=4, timeout=1)
+    assert redis_pool_metrics(pool) == {"size": 0, "idle": 0, "in_use": 0, "max_size": 4}
+
+    # Checked out without connecting, as get_connection does before its health check
+    first = pool.get_available_connection()
+    second = pool.get_available_connection()
+    assert redis_pool_metrics(pool) == {"size": 2, "idle": 0, "in_use": 2, "max_size": 4}
+
+    asyncio.run(pool.release(first))
+    assert redis_pool_metrics(pool) == {"size": 2, "idle": 1, "in_use": 1, "max_size": 4}
+    asyncio.run(pool.release(second))
+    assert redis_pool_metrics(pool) == {"size": 2, "idle": 2, "in_use": 0, "max_size": 4}
+
+
+def test_pool_metrics_over_unconnected_pools():
+    async def collect():
+        layer = DataLayer()
+        layer.pg = asyncpg.create_pool(host="localhost", min_size=1, max_size=3)  # never awaited: no server needed
+        layer.redis = aioredis.Redis(connection_pool=aioredis.BlockingConnectionPool(host="localhost",
+                                                                                    max_connections=5))
+        return layer.pool_metrics()
+
+    metrics = asyncio.run(collect())
+    assert metrics["postgres"]["max_size"] == 3
+    assert metrics["postgres"]["in_use"] == 0
+    assert metrics["redis"] == {"size": 0, "idle": 0, "in_use": 0, "max_size": 5}
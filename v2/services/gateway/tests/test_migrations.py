@@ -0,0 +1,58 @@
+import asyncio
+import os
+from contextlib import asynccontextmanager
+
+import pytest
+
+from migrations import MIGRATION_LOCK, apply_migrations
+
+MIGRATIONS = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..", "..", "migrations"))
+
+
+class RecordingConnection:
+    """Just enough of asyncpg.Connection to follow what the runner sends."""
+
+    def __init__(self, applied=(), fail_on=None):
+        self.applied = list(applied)
+        self.fail_on = fail_on
+        self.statements = []
+        self.committed = []
+
+    async def execute(self, sql, *args):
+        if self.fail_on and self.fail_on in sql:
+            raise RuntimeError("syntax error")
+        self.statements.append((sql, args))
+        if sql.startswith("INSERT INTO schema_migrations"):
+            self.applied.append(args[0])
+
+    async def fetch(self, sql):
+        return [{"name": name} for name in self.applied]
+
+    @asynccontextmanager
+    async def transaction(self):
+        yield
+
+
+def test_applies_pending_files_in_order():
+    conn = RecordingConnection(applied=["001_create_experiments.sql"])
+    done = asyncio.run(apply_migrations(conn, MIGRATIONS))
+
+    expected = sorted(f for f in os.listdir(MIGRATIONS) if f.endswith(".sql"))[1:]
+    assert done == expected
+    assert conn.applied == ["001_create_experiments.sql"] + expected
+    assert conn.statements[0] == ("SELECT pg_advisory_lock($1)", (MIGRATION_LOCK,))
+    assert conn.statements[-1] == ("SELECT pg_advisory_unlock($1)", (MIGRATION_LOCK,))
+
+
+def test_nothing_to_do_once_recorded():
+    names = sorted(f for f in os.listdir(MIGRATIONS) if f.endswith(".sql"))
+    assert asyncio.run(apply_migrations(RecordingConnection(applied=names), MIGRATIONS)) == []
+
+
+def test_lock_released_when_a_migration_fails():
+    conn = RecordingConnection(fail_on="CREATE TABLE IF NOT EXISTS sweeps")
+    with pytest.raises(RuntimeError):
+        asyncio.run(apply_migrations(conn, MIGRATIONS))
+    assert "007_create_sweeps.sql" not in conn.applied
+    assert conn.statements[-1] == ("SELECT pg_advisory_unlock($1)", (MIGRATION_LOCK,))
+
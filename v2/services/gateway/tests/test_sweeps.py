@@ -0,0 +1,42 @@
+import time
+
+import pytest
+from fastapi.testclient import TestClient
+
+from config import settings
+from main import SearchDimension, app
+from sweeps import expand, trial_count
+
+HUGE_GRID = {f"p{i}": SearchDimension(values=list(range(10))) for i in range(20)}  # 10**20 trials
+
+
+def test_grid_is_counted_without_expanding():
+    assert trial_count(HUGE_GRID) == 10 ** 20
+    start = time.perf_counter()
+    with pytest.raises(ValueError, match="exceeds the limit of 256"):
+        expand(HUGE_GRID, max_trials=256)
+    assert time.perf_counter() - start < 0.1
+
+
+def test_sampled_trials_are_limited_too():
+    space = {"learning_rate": SearchDimension(min=1e-5, max=1e-3, log=True)}
+    with pytest.raises(ValueError, match="10000000 trials"):
+        expand(space, num_trials=10_000_000, max_trials=256)
+    assert len(expand(space, num_trials=4, max_trials=256)) == 4
+
+
+def test_grid_within_limit():
+    space = {"lora_rank": SearchDimension(values=[4, 8]), "learning_rate": SearchDimension(values=[1e-4, 3e-4, 1e-3])}
+    configs = expand(space, max_trials=6)
+    assert len(configs) == trial_count(space) == 6
+    assert {"learning_rate": 1e-4, "lora_rank": 4} in configs
+
+
+def test_oversized_sweep_is_rejected_before_touching_the_database():
+    client = TestClient(app)  # no lifespan: the pools are never opened
+    body = {"name": "big", "description": "grid", "search_space": {n: {"values": list(range(10))} for n in
+                                                                    ("lora_rank", "lora_alpha", "batch_size",
+                                                                     "num_layers", "learning_rate")}}
+    response = client.post("/sweeps", json=body)
+    assert response.status_code == 422
+    assert response.json()["detail"] == f"100000 trials exceeds the limit of {settings.sweep_max_trials}"
@@ -0,0 +1,41 @@
+import json
+import logging
+import time
+
+import redis.asyncio as aioredis
+from fastapi.testclient import TestClient
+from prometheus_client import REGISTRY
+
+from db import data
+from main import app
+from telemetry import log_span, start_trace
+
+
+def scrape_errors(source):
+    return REGISTRY.get_sample_value("gateway_metrics_scrape_errors_total", {"source": source}) or 0
+
+
+def test_metrics_survive_a_broken_source(monkeypatch):
+    # No lifespan: Postgres is never connected, so its pool and the outbox count both fail
+    monkeypatch.setattr(data, "redis", aioredis.Redis(
+        connection_pool=aioredis.BlockingConnectionPool(host="localhost", max_connections=7)))
+    before = {source: scrape_errors(source) for source in ("postgres", "redis", "outbox")}
+
+    response = TestClient(app).get("/metrics")
+
+    assert response.status_code == 200
+    assert 'gateway_redis_pool_connections{state="max"} 7.0' in response.text
+    assert scrape_errors("postgres") == before["postgres"] + 1
+    assert scrape_errors("outbox") == before["outbox"] + 1
+    assert scrape_errors("redis") == before["redis"]
+
+
+def test_spans_are_logged(caplog):
+    trace = start_trace("00-" + "a" * 32 + "-" + "b" * 16 + "-01")
+    with caplog.at_level(logging.INFO, logger="gateway.trace"):
+        log_span(trace, "create_experiment", time.perf_counter(), experiment_id="e1")
+
+    record = json.loads(caplog.records[-1].getMessage())
+    assert record["trace_id"] == "a" * 32
+    assert record["parent_id"] == "b" * 16
+    assert (record["name"], record["experiment_id"]) == ("create_experiment", "e1")
@@ -0,0 +1,104 @@
+import time
+
+from scripts.backends import FakeBackend, MLXBackend
+from scripts.utils import get_sampler
+
+
+class FakeBatchBackend:
+    """
+    CPU stand-in for load tests on Linux. Each sequence replays v1's
+    FakeModel answer for its prompt. A decode step sleeps
+    `step_s + per_seq_s * batch size`, so a step over 16 sequences costs
+    little more than a step over one, as on a real accelerator.
+    """
+
+    name = "fake"
+
+    def __init__(self, model_path="fake", adapter_path=None, step_s=0.02, per_seq_s=0.001, prefill_s=0.00005):
+        self.base = FakeBackend(model_path, adapter_path=adapter_path)
+        self.tokenizer = self.base.tokenizer
+        self.eos_token_ids = {self.tokenizer.eos_token_id}
+        self.step_s = step_s
+        self.per_seq_s = per_seq_s
+        self.prefill_s = prefill_s
+        self.sequences = {}
+
+    def add(self, uid, prompt, max_tokens, sampler_params):
+        tokens = self.base.encode(prompt)
+        time.sleep(self.prefill_s * len(tokens))
+        answer = self.tokenizer.encode(self.base.model.respond(prompt), add_special_tokens=False)
+        self.sequences[uid] = iter(answer[:max_tokens] + [self.tokenizer.eos_token_id])
+        return len(tokens)
+
+    def step(self):
+        """One decode step over every active sequence: [(uid, token)]."""
+        if not self.sequences:
+            return []
+        time.sleep(self.step_s + self.per_seq_s * len(self.sequences))
+        return [(uid, next(tokens, self.tokenizer.eos_token_id)) for uid, tokens in self.sequences.items()]
+
+    def remove(self, uid):
+        self.sequences.pop(uid, None)
+
+
+class MLXBatchBackend:
+    """
+    Continuous batching on Apple silicon through mlx_lm's BatchGenerator,
+    which prefills inserted prompts and folds them into the running decode
+    batch. BatchGenerator takes one sampler, so requests are batched per
+    distinct sampler settings; the defaults are the common case.
+    """
+
+    name = "mlx"
+
+    def __init__(self, model_path, adapter_path=None):
+        self.base = MLXBackend(model_path, adapter_path=adapter_path)
+        self.tokenizer = self.base.tokenizer
+        self.eos_token_ids = set(self.tokenizer.eos_token_ids)
+        self.generators = {}
+        self.owner = {}  # uid -> (sampler key, generator uid)
+        self.uids = {}
+
+    def _generator(self, sampler_params):
+        key = tuple(sorted(sampler_params.items()))
+        if key not in self.generators:
+            from mlx_lm.generate import BatchGenerator
+            self.generators[key] = BatchGenerator(self.base.model, stop_tokens=self.eos_token_ids,
+                                                  sampler=get_sampler(sampler_params))
+        return key, self.generators[key]
+
+    def add(self, uid, prompt, max_tokens, sampler_params):
+        tokens = self.base.encode(prompt)
+        key, generator = self._generator(sampler_params)
+        [generator_uid] = generator.insert([tokens], max_tokens=[max_tokens])
+        self.owner[uid] = (key, generator_uid)
+        self.uids[(key, generator_uid)] = uid
+        return len(tokens)
+
+    def step(self):
+        emitted = []
+        busy = {key for key, _ in self.owner.values()}
+        for key in busy:
+            for response in self.generators[key].next():
+                uid = self.uids.get((key, response.uid))
+                if uid is not None:
+                    emitted.append((uid, response.token))
+        return emitted
+
+    def remove(self, uid):
+        if uid not in self.owner:
+            return
+        key, generator_uid = self.owner.pop(uid)
+        self.uids.pop((key, generator_uid), None)
+        generator = self.generators[key]
+        if hasattr(generator, "remove"):  # older mlx_lm drops finished sequences itself
+            generator.remove([generator_uid])
+
+
+BATCH_BACKENDS = {"fake": FakeBatchBackend, "mlx": MLXBatchBackend}
+
+
+def get_batch_backend(name, model_path, **kwargs):
+    if name not in BATCH_BACKENDS:
+        raise ValueError(f"Unknown backend '{name}'. Choose from: {', '.join(BATCH_BACKENDS)}")
+    return BATCH_BACKENDS[name](model_path, **kwargs)
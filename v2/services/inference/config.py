@@ -0,0 +1,27 @@
+from pydantic_settings import BaseSettings
+
+
+class Settings(BaseSettings):
+    # "fake" is the CPU stand-in for load tests; "mlx" needs Apple silicon
+    backend: str = "fake"
+    # A path or hub id, or experiment:<id> / artifact:<id> from the artifact store
+    model: str = "models/neural-edge-3b"
+    artifact_dir: str = "models/store"
+
+    # Continuous batching: running batch size, and how many requests may queue before 429s
+    max_batch_size: int = 16
+    max_waiting: int = 64
+    max_tokens_limit: int = 1024
+    # A streaming client this many tokens behind is disconnected
+    stream_buffer_tokens: int = 256
+
+    # Fake backend cost model: fixed + per-sequence time per decode step, per-token prefill time
+    fake_step_ms: float = 20.0
+    fake_step_per_seq_ms: float = 1.0
+    fake_prefill_ms: float = 0.05
+
+    class Config:
+        env_file = ".env"
+
+
+settings = Settings()
@@ -0,0 +1,183 @@
+import asyncio
+import itertools
+import logging
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+from scripts.streaming import STOP_SEQUENCE, StopSequenceMatcher
+
+logger = logging.getLogger("inference.batcher")
+
+
+class QueueFull(Exception):
+    pass
+
+
+class Sequence:
+    __slots__ = ("uid", "prompt", "max_tokens", "sampler_params", "matcher", "events", "tokens", "text",
+                 "prompt_tokens", "finish_reason", "cancelled", "created", "admitted", "first_token")
+
+    def __init__(self, uid, prompt, max_tokens, sampler_params, stop):
+        self.uid = uid
+        self.prompt = prompt
+        self.max_tokens = max_tokens
+        self.sampler_params = sampler_params
+        self.matcher = StopSequenceMatcher(stop) if stop else None
+        self.events = asyncio.Queue()
+        self.tokens = []
+        self.text = ""
+        self.prompt_tokens = 0
+        self.finish_reason = None
+        self.cancelled = False
+        self.created = time.perf_counter()
+        self.admitted = None
+        self.first_token = None
+
+
+class ContinuousBatcher:
+    """
+    Continuous-batching decode loop over one batch backend.
+
+    Requests wait in a bounded queue and join the running batch between
+    decode steps as soon as a slot frees up, so short answers don't wait
+    behind long ones and the batch stays full under load. Backend calls run
+    on one dedicated thread; the event loop only routes tokens.
+
+    Backpressure: with `max_waiting` requests queued, submit() raises
+    QueueFull (429 upstream), and a stream whose client falls
+    `stream_buffer` tokens behind is aborted instead of buffered without bound.
+    """
+
+    def __init__(self, backend, max_batch_size=16, max_waiting=64, stream_buffer=256):
+        self.backend = backend
+        self.max_batch_size = max_batch_size
+        self.max_waiting = max_waiting
+        self.stream_buffer = stream_buffer
+        self.waiting = deque()
+        self.active = {}
+        self.ids = itertools.count()
+        self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="decode")
+        self.wake = asyncio.Event()
+        self.step_ms = deque(maxlen=1024)
+        self.queue_wait_ms = deque(maxlen=1024)
+        self.ttft_ms = deque(maxlen=1024)
+        self.stats = {"submitted": 0, "rejected": 0, "completed": 0, "aborted": 0, "errors": 0,
+                      "steps": 0, "tokens": 0, "batched_sequences": 0}
+
+    def submit(self, prompt, max_tokens, sampler_params, stop=STOP_SEQUENCE):
+        if len(self.waiting) >= self.max_waiting:
+            self.stats["rejected"] += 1
+            raise QueueFull(f"{len(self.waiting)} requests already waiting")
+        seq = Sequence(next(self.ids), prompt, max_tokens, sampler_params, stop)
+        self.waiting.append(seq)
+        self.stats["submitted"] += 1
+        self.wake.set()
+        return seq
+
+    def cancel(self, seq):
+        """Client went away; the sequence leaves the batch before the next step."""
+        if seq.finish_reason is None:
+            seq.cancelled = True
+            self.wake.set()
+
+    def _admit(self, batch):
+        for seq in batch:
+            seq.prompt_tokens = self.backend.add(seq.uid, seq.prompt, seq.max_tokens, seq.sampler_params)
+
+    def _remove(self, batch):
+        for seq in batch:
+            self.backend.remove(seq.uid)
+
+    def _finish(self, seq, reason):
+        seq.finish_reason = reason
+        seq.events.put_nowait(("done", reason))
+        self.stats["aborted" if reason == "abort" else "completed"] += 1
+
+    def _on_token(self, seq, token):
+        if seq.first_token is None:
+            seq.first_token = time.perf_counter()
+            self.ttft_ms.append((seq.first_token - seq.created) * 1000)
+        if token in self.backend.eos_token_ids:
+            return self._finish(seq, "stop")
+
+        seq.tokens.append(token)
+        self.stats["tokens"] += 1
+        text = self.backend.tokenizer.decode(seq.tokens)
+        delta = "" if text.endswith("\ufffd") else text[len(seq.text):]  # wait for the rest of a multi-byte char
+        end = seq.matcher.feed(delta) if seq.matcher and delta else -1
+        if end != -1:
+            delta = delta[:end]
+        if delta:
+            seq.text += delta
+            if seq.events.qsize() >= self.stream_buffer:
+                return self._finish(seq, "abort")
+            seq.events.put_nowait(("token", delta))
+        if end != -1:
+            self._finish(seq, "stop")
+        elif len(seq.tokens) >= seq.max_tokens:
+            self._finish(seq, "length")
+
+    async def run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            self.wake.clear()
+            for seq in [s for s in self.waiting if s.cancelled]:
+                self.waiting.remove(seq)
+                self._finish(seq, "abort")
+            for seq in [s for s in self.active.values() if s.cancelled]:
+                self._finish(seq, "abort")
+            done = [s for s in self.active.values() if s.finish_reason is not None]
+            for seq in done:
+                del self.active[seq.uid]
+
+            admitted = []
+            while self.waiting and len(self.active) + len(admitted) < self.max_batch_size:
+                seq = self.waiting.popleft()
+                seq.admitted = time.perf_counter()
+                self.queue_wait_ms.append((seq.admitted - seq.created) * 1000)
+                admitted.append(seq)
+
+            try:
+                if done:
+                    await loop.run_in_executor(self.executor, self._remove, done)
+                if admitted:
+                    await loop.run_in_executor(self.executor, self._admit, admitted)
+                    self.active.update((seq.uid, seq) for seq in admitted)
+                if not self.active:
+                    await self.wake.wait()
+                    continue
+
+                start = time.perf_counter()
+                emitted = await loop.run_in_executor(self.executor, self.backend.step)
+                self.step_ms.append((time.perf_counter() - start) * 1000)
+                self.stats["steps"] += 1
+                self.stats["batched_sequences"] += len(self.active)
+                for uid, token in emitted:
+                    seq = self.active.get(uid)
+                    if seq is not None and seq.finish_reason is None:
+                        self._on_token(seq, token)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                # A failed step leaves the backend's batch in an unknown state, so fail everything in it
+                self.stats["errors"] += 1
+                logger.error("decode step failed: %r", e)
+                for seq in list(self.active.values()) + admitted:
+                    if seq.finish_reason is None:
+                        seq.events.put_nowait(("error", str(e)))
+                        seq.finish_reason = "error"
+                    self.active[seq.uid] = seq
+
+    def metrics(self):
+        def pick(values, q):
+            ordered = sorted(values)
+            return round(ordered[min(int(len(ordered) * q), len(ordered) - 1)], 2) if ordered else None
+
+        steps = self.stats["steps"]
+        return {**self.stats, "active": len(self.active), "waiting": len(self.waiting),
+                "max_batch_size": self.max_batch_size,
+                "avg_batch_size": round(self.stats["batched_sequences"] / steps, 2) if steps else None,
+                "step_p50_ms": pick(self.step_ms, 0.5), "step_p95_ms": pick(self.step_ms, 0.95),
+                "queue_wait_p50_ms": pick(self.queue_wait_ms, 0.5), "queue_wait_p95_ms": pick(self.queue_wait_ms, 0.95),
+                "ttft_p50_ms": pick(self.ttft_ms, 0.5), "ttft_p95_ms": pick(self.ttft_ms, 0.95)}
@@ -0,0 +1,140 @@
+import os
+import sys
+# v1's scripts/ package (prompt format, backends, stop matcher); the image copies it next to this file
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..", "..", "v1")))
+
+import asyncio
+import json
+import logging
+import time
+import uuid
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, HTTPException
+from fastapi.responses import StreamingResponse
+from pydantic import BaseModel, Field
+from scripts.artifacts import ArtifactStore
+from scripts.streaming import STOP_SEQUENCE
+from scripts.utils import SAMPLER_PARAMS, clean_response, format_prompt
+from backends import get_batch_backend
+from config import settings
+from engine import ContinuousBatcher, QueueFull
+
+# Root handler for the process, in the gateway's format; the batcher logs failed steps through it
+logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(name)s: %(message)s")
+
+batcher = None
+
+
+def load_backend():
+    model_path, adapter_path = settings.model, None
+    if settings.model.startswith(("experiment:", "artifact:")):
+        model_path, adapter_path = ArtifactStore(settings.artifact_dir).resolve(settings.model)
+    kwargs = {}
+    if settings.backend == "fake":
+        kwargs = {"step_s": settings.fake_step_ms / 1000, "per_seq_s": settings.fake_step_per_seq_ms / 1000,
+                  "prefill_s": settings.fake_prefill_ms / 1000}
+    return get_batch_backend(settings.backend, model_path, adapter_path=adapter_path, **kwargs)
+
+
+@asynccontextmanager
+async def lifespan(app):
+    global batcher
+    backend = await asyncio.to_thread(load_backend)
+    batcher = ContinuousBatcher(backend, settings.max_batch_size, settings.max_waiting,
+                                settings.stream_buffer_tokens)
+    task = asyncio.create_task(batcher.run())
+    yield
+    task.cancel()
+    await asyncio.gather(task, return_exceptions=True)
+    batcher.executor.shutdown(wait=False)
+
+
+app = FastAPI(title="Neural Edge Distiller — Inference", lifespan=lifespan)
+
+
+class CompletionRequest(BaseModel):
+    model: str | None = None  # accepted for client compatibility; one model is served per process
+    prompt: str
+    max_tokens: int = Field(500, gt=0)
+    temperature: float = Field(SAMPLER_PARAMS["temp"], ge=0, le=2)
+    top_p: float = Field(SAMPLER_PARAMS["top_p"], gt=0, le=1)
+    min_p: float = Field(SAMPLER_PARAMS["min_p"], ge=0, le=1)
+    stream: bool = False
+    raw: bool = False  # prompt is already chat-templated; skip format_prompt
+    stop_at_end_of_arch: bool = True
+
+
+def completion_body(completion_id, created, choice, usage=None):
+    body = {"id": completion_id, "object": "text_completion", "created": created, "model": settings.model,
+            "choices": [{"index": 0, **choice}]}
+    if usage is not None:
+        body["usage"] = usage
+    return body
+
+
+@app.get("/health")
+async def health():
+    return {"status": "ok", "backend": settings.backend, "model": settings.model}
+
+
+@app.get("/metrics/scheduler")
+async def scheduler_metrics():
+    return batcher.metrics()
+
+
+@app.get("/v1/models")
+async def models():
+    return {"object": "list", "data": [{"id": settings.model, "object": "model", "owned_by": "neural-edge"}]}
+
+
+@app.post("/v1/completions")
+async def completions(request: CompletionRequest):
+    if request.max_tokens > settings.max_tokens_limit:
+        raise HTTPException(status_code=422, detail=f"max_tokens is capped at {settings.max_tokens_limit}")
+    prompt = request.prompt if request.raw else format_prompt(batcher.backend.tokenizer, request.prompt)
+    sampler_params = {"temp": request.temperature, "top_p": request.top_p, "min_p": request.min_p}
+    try:
+        seq = batcher.submit(prompt, request.max_tokens, sampler_params,
+                             STOP_SEQUENCE if request.stop_at_end_of_arch else None)
+    except QueueFull as e:
+        raise HTTPException(status_code=429, detail=f"Server busy: {e}", headers={"Retry-After": "1"})
+
+    completion_id = f"cmpl-{uuid.uuid4().hex}"
+    created = int(time.time())
+
+    def usage():
+        return {"prompt_tokens": seq.prompt_tokens, "completion_tokens": len(seq.tokens),
+                "total_tokens": seq.prompt_tokens + len(seq.tokens)}
+
+    if request.stream:
+        async def chunks():
+            try:
+                while True:
+                    kind, value = await seq.events.get()
+                    if kind == "token":
+                        yield f"data: {json.dumps(completion_body(completion_id, created, {'text': value, 'finish_reason': None}))}\n\n"
+                    elif kind == "error":
+                        yield f"data: {json.dumps({'error': {'message': value}})}\n\n"
+                        break
+                    else:
+                        yield f"data: {json.dumps(completion_body(completion_id, created, {'text': '', 'finish_reason': value}, usage()))}\n\n"
+                        break
+                yield "data: [DONE]\n\n"
+            finally:
+                # Runs on client disconnect too, freeing the batch slot
+                batcher.cancel(seq)
+
+        return StreamingResponse(chunks(), media_type="text/event-stream",
+                                 headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+    try:
+        while True:
+            kind, value = await seq.events.get()
+            if kind == "error":
+                raise HTTPException(status_code=500, detail=value)
+            if kind == "done":
+                break
+    finally:
+        batcher.cancel(seq)
+    text = clean_response(seq.text) if value == "stop" and request.stop_at_end_of_arch else seq.text
+    return completion_body(completion_id, created, {"text": text, "finish_reason": value}, usage())
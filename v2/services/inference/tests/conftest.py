@@ -0,0 +1,7 @@
+import os
+import sys
+
+# Inference modules import each other by bare name, and v1's scripts/ package sits next to them in the image
+here = os.path.dirname(__file__)
+sys.path.insert(0, os.path.abspath(os.path.join(here, "..")))
+sys.path.insert(0, os.path.abspath(os.path.join(here, "..", "..", "..", "..", "v1")))
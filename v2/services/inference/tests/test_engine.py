@@ -0,0 +1,150 @@
+import asyncio
+import logging
+
+from fastapi.testclient import TestClient
+
+import main
+from backends import FakeBatchBackend
+from engine import ContinuousBatcher
+
+PROMPT = "QUESTION: Kafka consumer lag spikes under peak load."
+
+
+def fast_backend(**kwargs):
+    return FakeBatchBackend(step_s=0.001, per_seq_s=0, prefill_s=0, **kwargs)
+
+
+def drive(batcher, scenario):
+    """Runs the decode loop alongside `scenario` and stops it afterwards."""
+    async def run():
+        task = asyncio.create_task(batcher.run())
+        try:
+            return await asyncio.wait_for(scenario(), 10)
+        finally:
+            task.cancel()
+            await asyncio.gather(task, return_exceptions=True)
+            batcher.executor.shutdown(wait=False)
+    return asyncio.run(run())
+
+
+async def drain(seq):
+    events = []
+    while not events or events[-1][0] == "token":
+        events.append(await seq.events.get())
+    return events
+
+
+async def until(condition):
+    while not condition():
+        await asyncio.sleep(0.001)
+
+
+def test_late_request_joins_the_running_batch():
+    batcher = ContinuousBatcher(fast_backend())
+
+    async def scenario():
+        first = batcher.submit(PROMPT, 200, {}, stop=None)
+        await first.events.get()
+        late = batcher.submit(PROMPT, 20, {}, stop=None)
+        kind, _ = await late.events.get()
+        assert kind == "token"
+        # Admitted and decoding while the first sequence is still running
+        assert first.finish_reason is None and len(first.tokens) < 200
+        await drain(late)
+        await drain(first)
+        return first, late
+
+    first, late = drive(batcher, scenario)
+    assert (first.finish_reason, late.finish_reason) == ("length", "length")
+    assert batcher.stats["batched_sequences"] > batcher.stats["steps"]
+
+
+def test_full_queue_is_a_429(monkeypatch):
+    monkeypatch.setattr(main, "batcher", ContinuousBatcher(fast_backend(), max_waiting=0))
+    response = TestClient(main.app).post("/v1/completions", json={"prompt": "Why does Kafka lag?"})
+    assert response.status_code == 429
+    assert response.headers["retry-after"] == "1"
+    assert main.batcher.stats["rejected"] == 1
+
+
+def test_slow_stream_is_aborted_at_the_buffer_limit():
+    batcher = ContinuousBatcher(fast_backend(), stream_buffer=3)
+
+    async def scenario():
+        seq = batcher.submit(PROMPT, 100, {}, stop=None)
+        await until(lambda: seq.finish_reason is not None)  # the client never reads
+        return seq, await drain(seq)
+
+    seq, events = drive(batcher, scenario)
+    assert seq.finish_reason == "abort"
+    assert [kind for kind, _ in events] == ["token"] * 3 + ["done"]
+    assert batcher.stats["aborted"] == 1
+
+
+def test_cancel_frees_the_slot_for_waiting_and_active_sequences():
+    backend = fast_backend()
+    batcher = ContinuousBatcher(backend, max_batch_size=1)
+
+    async def scenario():
+        active = batcher.submit(PROMPT, 400, {}, stop=None)
+        waiting = batcher.submit(PROMPT, 400, {}, stop=None)
+        await active.events.get()
+        batcher.cancel(waiting)
+        assert await drain(waiting) == [("done", "abort")]
+        assert waiting.admitted is None
+
+        batcher.cancel(active)
+        await until(lambda: active.uid not in backend.sequences)  # removed from the backend's batch
+        assert active.uid not in batcher.active
+        after = batcher.submit(PROMPT, 10, {}, stop=None)
+        await drain(after)
+        return active, after
+
+    active, after = drive(batcher, scenario)
+    assert (active.finish_reason, after.finish_reason) == ("abort", "length")
+    assert batcher.stats["aborted"] == 2
+
+
+class FlakyBackend(FakeBatchBackend):
+    """Fails its first decode step and its next prompt insert, then behaves."""
+
+    def __init__(self):
+        super().__init__(step_s=0.001, per_seq_s=0, prefill_s=0)
+        self.failures = {"step": 1, "add": 0}
+
+    def step(self):
+        if self.failures["step"]:
+            self.failures.update(step=0, add=1)
+            raise RuntimeError("device lost")
+        return super().step()
+
+    def add(self, uid, prompt, max_tokens, sampler_params):
+        if self.failures["add"]:
+            self.failures["add"] = 0
+            raise RuntimeError("prefill failed")
+        return super().add(uid, prompt, max_tokens, sampler_params)
+
+
+def test_failed_step_errors_the_batch_and_recovers(caplog):
+    backend = FlakyBackend()
+    batcher = ContinuousBatcher(backend)
+
+    async def scenario():
+        active = [batcher.submit(PROMPT, 10, {}, stop=None) for _ in range(2)]
+        failed = [await drain(seq) for seq in active]
+        admitted = batcher.submit(PROMPT, 10, {}, stop=None)  # its insert fails
+        failed.append(await drain(admitted))
+        recovered = batcher.submit(PROMPT, 10, {}, stop=None)
+        await drain(recovered)
+        return active + [admitted], failed, recovered
+
+    with caplog.at_level(logging.ERROR, logger="inference.batcher"):
+        errored, events, recovered = drive(batcher, scenario)
+
+    assert events == [[("error", "device lost")]] * 2 + [[("error", "prefill failed")]]
+    assert all(seq.finish_reason == "error" for seq in errored)
+    assert recovered.finish_reason == "length"
+    assert batcher.stats["errors"] == 2
+    assert not any(seq.uid in backend.sequences for seq in errored)  # the failed batch was cleared out
+    assert [r.getMessage() for r in caplog.records if r.name == "inference.batcher"] == [
+        "decode step failed: RuntimeError('device lost')", "decode step failed: RuntimeError('prefill failed')"]
@@ -9,6 +9,33 @@ class Settings(BaseSettings):
     redis_host: str
     redis_port: int
 
+    # Default Ray resource request per training job; a job's "resources" field overrides it
+    job_num_cpus: float = 1.0
+    job_memory_gb: float = 2.0
+    # Hard cap on concurrent jobs per worker process (0 = only limited by cluster resources)
+    max_jobs_in_flight: int = 0
+
+    # Reliable queue: unacked jobs idle this long are reclaimed by another worker
+    visibility_timeout_s: float = 300.0
+    max_attempts: int = 3
+    worker_name: str = ""  # consumer name in the group; defaults to hostname-pid
+
+    # Per-node status writer: coalesces updates and flushes them in batches over a small pool
+    status_flush_interval_s: float = 0.5
+    status_max_batch: int = 500
+    status_pool_size: int = 2
+    status_metrics_every_s: float = 60.0
+
+    # Prometheus exporter on the driver (0 disables); status writer actors are read at scrape time
+    metrics_port: int = 9100
+    metrics_scrape_timeout_s: float = 2.0
+
+    # Shared across nodes so a redelivered job resumes from its last adapter checkpoint
+    checkpoint_dir: str = "/data/checkpoints"
+    training_data_dir: str = "/data/training"
+    # Content-addressed adapter store shared with v1 serving (scripts/artifacts.py); empty disables it
+    artifact_dir: str = "/data/artifacts"
+
     class Config:
         env_file = ".env"
 
@@ -0,0 +1,95 @@
+import json
+import time
+
+from redis.exceptions import ResponseError
+
+
+class JobQueue:
+    """
+    At-least-once job queue on a Redis Stream with a consumer group.
+
+    A delivered job stays in the group's pending list until it is acked. The
+    consumer that owns it refreshes its idle time with heartbeat() while the
+    job runs. Entries idle longer than the visibility timeout belong to a dead
+    consumer and are reclaimed by whichever worker polls next. Each entry
+    gets `max_attempts` deliveries or explicit retries before it is moved to
+    the dead-letter list.
+    """
+
+    def __init__(self, redis_client, stream, group, consumer, visibility_timeout_s, max_attempts,
+                 on_dead_letter=None):
+        self.redis = redis_client
+        self.stream = stream
+        self.group = group
+        self.consumer = consumer
+        self.visibility_ms = int(visibility_timeout_s * 1000)
+        self.max_attempts = max_attempts
+        self.dead_letter_key = f"{stream}:dead"
+        self.on_dead_letter = on_dead_letter
+
+    def ensure_group(self):
+        try:
+            self.redis.xgroup_create(self.stream, self.group, id="0", mkstream=True)
+        except ResponseError as e:
+            if "BUSYGROUP" not in str(e):
+                raise
+
+    def _attempts(self, msg_id, job):
+        pending = self.redis.xpending_range(self.stream, self.group, min=msg_id, max=msg_id, count=1)
+        delivered = pending[0]["times_delivered"] if pending else 1
+        return job.get("attempts", 0) + delivered
+
+    def fetch(self, count, block_ms):
+        """Returns up to `count` [(msg_id, job)], reclaiming expired entries before reading new ones."""
+        jobs = []
+        _, claimed, _ = self.redis.xautoclaim(self.stream, self.group, self.consumer,
+                                              min_idle_time=self.visibility_ms, count=count)
+        for msg_id, fields in claimed:
+            job = json.loads(fields["job"])
+            if self._attempts(msg_id, job) > self.max_attempts:
+                self.dead_letter(msg_id, job, "visibility timeout exceeded on every attempt")
+                continue
+            print(f"[RECLAIMED] {job['name']} ({job['id']}) from a stalled consumer")
+            jobs.append((msg_id, job))
+
+        if len(jobs) < count:
+            response = self.redis.xreadgroup(self.group, self.consumer, {self.stream: ">"},
+                                             count=count - len(jobs), block=block_ms if not jobs else None)
+            for _, entries in response or []:
+                jobs.extend((msg_id, json.loads(fields["job"])) for msg_id, fields in entries)
+        return jobs
+
+    def heartbeat(self, msg_ids):
+        # XCLAIM by the current owner resets idle time; JUSTID leaves the delivery count alone
+        if msg_ids:
+            self.redis.xclaim(self.stream, self.group, self.consumer, min_idle_time=0,
+                              message_ids=list(msg_ids), justid=True)
+
+    def ack(self, msg_id):
+        pipe = self.redis.pipeline()
+        pipe.xack(self.stream, self.group, msg_id)
+        pipe.xdel(self.stream, msg_id)
+        pipe.execute()
+
+    def retry(self, msg_id, job, reason):
+        """Re-enqueues a failed job with its attempt count bumped. Returns False if it was dead-lettered instead."""
+        attempts = self._attempts(msg_id, job)
+        if attempts >= self.max_attempts:
+            self.dead_letter(msg_id, job, reason)
+            return False
+        pipe = self.redis.pipeline()
+        pipe.xadd(self.stream, {"job": json.dumps({**job, "attempts": attempts})})
+        pipe.xack(self.stream, self.group, msg_id)
+        pipe.xdel(self.stream, msg_id)
+        pipe.execute()
+        return True
+
+    def dead_letter(self, msg_id, job, reason):
+        pipe = self.redis.pipeline()
+        pipe.lpush(self.dead_letter_key, json.dumps({"job": job, "reason": reason, "failed_at": time.time()}))
+        pipe.xack(self.stream, self.group, msg_id)
+        pipe.xdel(self.stream, msg_id)
+        pipe.execute()
+        print(f"[DEAD LETTER] {job['name']} ({job['id']}) — {reason}")
+        if self.on_dead_letter is not None:
+            self.on_dead_letter(job)
@@ -0,0 +1,104 @@
+from collections import deque
+
+import time
+
+import ray
+
+GB = 1024 ** 3
+
+
+class JobScheduler:
+    """
+    Keeps as many training jobs in flight as the Ray cluster has room for.
+
+    Headroom is what Ray reports as available, capped by the cluster total
+    minus what this scheduler has already submitted: ray.available_resources()
+    doesn't count tasks that are submitted but not yet scheduled, so on its
+    own it over-submits. Each job is sized by its own "resources" request.
+    Fetched jobs wait locally, in order, until their request fits; adding
+    nodes raises concurrency without config changes. Finished jobs are
+    collected with ray.wait as they complete.
+    """
+
+    def __init__(self, remote_fn, default_cpus, default_memory_gb, max_in_flight=0):
+        self.remote_fn = remote_fn
+        self.default_cpus = default_cpus
+        self.default_memory_gb = default_memory_gb
+        self.max_in_flight = max_in_flight
+        self.in_flight = {}  # ObjectRef -> (msg_id, job, resources)
+        self.waiting = deque()  # (msg_id, job) fetched from the stream, not yet submitted
+
+    def resources(self, job):
+        requested = job.get("resources") or {}
+        return {
+            "num_cpus": requested.get("num_cpus", self.default_cpus),
+            "memory": int(requested.get("memory_gb", self.default_memory_gb) * GB),
+        }
+
+    def headroom(self):
+        available = ray.available_resources()
+        total = ray.cluster_resources()
+        reserved = {"CPU": 0.0, "memory": 0}
+        for _, _, r in self.in_flight.values():
+            reserved["CPU"] += r["num_cpus"]
+            reserved["memory"] += r["memory"]
+        return {k: min(available.get(k, 0), total.get(k, 0) - reserved[k]) for k in reserved}
+
+    def free_slots(self):
+        """How many more jobs to fetch, sized by the default request; none while fetched jobs are still waiting."""
+        if self.waiting:
+            return 0
+        headroom = self.headroom()
+        fit = min(int(headroom["CPU"] // self.default_cpus),
+                  int(headroom["memory"] // (self.default_memory_gb * GB)))
+        if self.max_in_flight:
+            fit = min(fit, self.max_in_flight - len(self.in_flight))
+        # Always keep one job submitted, even if it's bigger than what's free right now — Ray queues it
+        return max(fit, 0 if self.in_flight else 1)
+
+    def submit(self, msg_id, job):
+        """Queues a fetched job; it goes to Ray as soon as its own request fits. Returns the refs submitted."""
+        self.waiting.append((msg_id, job))
+        return self.dispatch()
+
+    def dispatch(self):
+        submitted = []
+        headroom = self.headroom() if self.waiting else None
+        while self.waiting:
+            msg_id, job = self.waiting[0]
+            resources = self.resources(job)
+            full = self.max_in_flight and len(self.in_flight) >= self.max_in_flight
+            fits = resources["num_cpus"] <= headroom["CPU"] and resources["memory"] <= headroom["memory"]
+            if self.in_flight and (full or not fits):
+                break  # strictly in order, so a large job isn't starved by smaller ones behind it
+            self.waiting.popleft()
+            job["submitted_at"] = time.time()
+            ref = self.remote_fn.options(**resources).remote(job)
+            self.in_flight[ref] = (msg_id, job, resources)
+            headroom["CPU"] -= resources["num_cpus"]
+            headroom["memory"] -= resources["memory"]
+            submitted.append(ref)
+        return submitted
+
+    def msg_ids(self):
+        """Every claimed stream entry, submitted or still waiting, so heartbeats cover both."""
+        return [msg_id for msg_id, _, _ in self.in_flight.values()] + [msg_id for msg_id, _ in self.waiting]
+
+    def collect(self, timeout):
+        """Returns [(msg_id, job, result_or_exception)] for jobs finished within `timeout` seconds."""
+        if not self.in_flight:
+            return []
+        refs = list(self.in_flight)
+        done, _ = ray.wait(refs, num_returns=1, timeout=timeout)
+        if done:
+            # Pick up anything else that finished at the same time
+            done, _ = ray.wait(refs, num_returns=len(refs), timeout=0)
+
+        finished = []
+        for ref in done:
+            msg_id, job, _ = self.in_flight.pop(ref)
+            try:
+                finished.append((msg_id, job, ray.get(ref)))
+            except Exception as e:  # training raised, or the task died (OOM kill, node loss)
+                finished.append((msg_id, job, e))
+        return finished
@@ -2,4 +2,7 @@ class ExperimentStatus:
     QUEUED = "queued"
     TRAINING = "training"
     COMPLETED = "completed"
-    FAILED = "failed"
\ No newline at end of file
+    FAILED = "failed"
+    STOPPED = "stopped"  # ended early by the sweep scheduler
+
+    TERMINAL = (COMPLETED, FAILED, STOPPED)
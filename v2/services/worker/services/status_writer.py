@@ -0,0 +1,208 @@
+import json
+import threading
+import time
+from collections import deque
+
+import ray
+import redis
+from psycopg2.extras import execute_values
+from psycopg2.pool import ThreadedConnectionPool
+from ray.util.scheduling_strategies import NodeAffinitySchedulingStrategy
+
+from services.status import ExperimentStatus
+from services.sweeps import record_rung
+from services.telemetry import LatencyBuckets
+
+# Rows without a lease (driver-side failures) may only touch experiments that haven't finished
+BATCH_UPDATE = f"""
+    UPDATE experiments AS e SET
+        status = COALESCE(v.status, e.status),
+        completed_at = CASE WHEN v.completed THEN NOW() ELSE e.completed_at END,
+        progress = COALESCE(v.progress::jsonb, e.progress)
+    FROM (VALUES %s) AS v (id, status, lease, completed, progress)
+    WHERE e.id = v.id::uuid
+      AND (e.lease = v.lease
+           OR (v.lease IS NULL AND e.status NOT IN ({", ".join(f"'{s}'" for s in ExperimentStatus.TERMINAL)})))
+    RETURNING e.id::text, e.status, e.progress::text
+"""
+ROW_TEMPLATE = "(%s, %s, %s::text, %s::boolean, %s::text)"
+
+ACTOR_PREFIX = "status-writer-"
+
+
+def _merge(older, newer):
+    merged = dict(older)
+    for field, value in newer.items():
+        if value is not None:
+            merged[field] = value
+    merged["completed"] = older["completed"] or newer["completed"]
+    return merged
+
+
+class StatusWriter:
+    """
+    Coalescing status/progress writer, one per Ray node.
+
+    Tasks send updates here instead of connecting to Postgres themselves.
+    Only the latest update per experiment is kept; a background thread
+    flushes them every `flush_interval_s` (or once `max_batch` experiments
+    are pending) as one UPDATE ... FROM (VALUES ...) over a small pool.
+    Rows the flush actually changed are then published to Redis on
+    experiments:<id> for the gateway's live event stream.
+    """
+
+    def __init__(self, db_kwargs, redis_kwargs=None, flush_interval_s=0.5, max_batch=500, pool_size=2):
+        self.pool = ThreadedConnectionPool(1, pool_size, **db_kwargs)
+        self.redis = redis.Redis(**redis_kwargs) if redis_kwargs else None
+        self.flush_interval_s = flush_interval_s
+        self.max_batch = max_batch
+        self.pending = {}
+        self.lock = threading.Lock()
+        self.flush_lock = threading.Lock()
+        self.wakeup = threading.Event()
+        self.flush_ms = deque(maxlen=1024)
+        self.latency = {"flush": LatencyBuckets(), "claim": LatencyBuckets()}
+        self.stats = {"updates": 0, "coalesced": 0, "flushes": 0, "rows_written": 0, "errors": 0}
+        threading.Thread(target=self._run, daemon=True).start()
+
+    def claim(self, experiment_id, lease):
+        """Synchronous: the caller needs to know whether it owns the experiment."""
+        start = time.perf_counter()
+        conn = self.pool.getconn()
+        try:
+            with conn.cursor() as cur:
+                cur.execute(
+                    "UPDATE experiments SET status = %s, lease = %s, attempts = attempts + 1 "
+                    "WHERE id = %s AND status IN %s RETURNING id",
+                    (ExperimentStatus.TRAINING, lease, experiment_id,
+                     (ExperimentStatus.QUEUED, ExperimentStatus.TRAINING))
+                )
+                claimed = cur.fetchone() is not None
+            conn.commit()
+        finally:
+            self.pool.putconn(conn)
+        self.latency["claim"].observe(time.perf_counter() - start)
+        if claimed:
+            self._publish([(experiment_id, ExperimentStatus.TRAINING, None)])
+        return claimed
+
+    def rung_decision(self, sweep_id, experiment_id, rung, iters, val_loss, reduction_factor, final=False):
+        """Synchronous ASHA check for sweep trials; see services/sweeps.py."""
+        conn = self.pool.getconn()
+        try:
+            return record_rung(conn, sweep_id, experiment_id, rung, iters, val_loss, reduction_factor, final)
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            self.pool.putconn(conn)
+
+    def update(self, experiment_id, status=None, lease=None, mark_completed=False, progress=None, flush=False):
+        entry = {"status": status, "lease": lease, "completed": mark_completed,
+                 "progress": json.dumps(progress) if progress is not None else None}
+        with self.lock:
+            self.stats["updates"] += 1
+            if experiment_id in self.pending:
+                self.stats["coalesced"] += 1
+                entry = _merge(self.pending[experiment_id], entry)
+            self.pending[experiment_id] = entry
+            full = len(self.pending) >= self.max_batch
+        if flush:
+            return self.flush()
+        if full:
+            self.wakeup.set()
+        return 0
+
+    def flush(self):
+        with self.flush_lock:
+            with self.lock:
+                batch, self.pending = self.pending, {}
+            if not batch:
+                return 0
+
+            start = time.perf_counter()
+            conn = self.pool.getconn()
+            try:
+                with conn.cursor() as cur:
+                    rows = [(experiment_id, e["status"], e["lease"], e["completed"], e["progress"])
+                            for experiment_id, e in batch.items()]
+                    applied = execute_values(cur, BATCH_UPDATE, rows, template=ROW_TEMPLATE,
+                                             page_size=len(rows), fetch=True)
+                conn.commit()
+            except Exception:
+                conn.rollback()
+                self.stats["errors"] += 1
+                # Put the batch back underneath anything that arrived meanwhile
+                with self.lock:
+                    for experiment_id, entry in batch.items():
+                        newer = self.pending.get(experiment_id)
+                        self.pending[experiment_id] = _merge(entry, newer) if newer else entry
+                raise
+            finally:
+                self.pool.putconn(conn)
+
+            elapsed = time.perf_counter() - start
+            self.flush_ms.append(elapsed * 1000)
+            self.latency["flush"].observe(elapsed)
+            self.stats["flushes"] += 1
+            self.stats["rows_written"] += len(applied)
+            self._publish(applied)
+            return len(applied)
+
+    def _publish(self, applied):
+        if self.redis is None or not applied:
+            return
+        try:
+            pipe = self.redis.pipeline(transaction=False)
+            for experiment_id, status, progress in applied:
+                pipe.publish(f"experiments:{experiment_id}", json.dumps(
+                    {"id": experiment_id, "status": status, "progress": json.loads(progress) if progress else None}))
+            pipe.execute()
+        except redis.RedisError as e:
+            # Live events are best effort; Postgres already has the update
+            print(f"[STATUS WRITER] publish failed — {e}")
+
+    def _run(self):
+        while True:
+            self.wakeup.wait(self.flush_interval_s)
+            self.wakeup.clear()
+            try:
+                self.flush()
+            except Exception as e:
+                print(f"[STATUS WRITER] flush failed, will retry — {e}")
+
+    def metrics(self):
+        ordered = sorted(self.flush_ms)
+
+        def pick(q):
+            return round(ordered[min(int(len(ordered) * q), len(ordered) - 1)], 2) if ordered else None
+
+        with self.lock:
+            pending = len(self.pending)
+        return {**self.stats, "pending": pending,
+                "flush_p50_ms": pick(0.50), "flush_p95_ms": pick(0.95), "flush_max_ms": pick(1.0),
+                "latency": {op: h.snapshot() for op, h in self.latency.items()}}
+
+
+StatusWriterActor = ray.remote(num_cpus=0, max_concurrency=8)(StatusWriter)
+
+_writer = None
+
+
+def get_status_writer(db_kwargs, redis_kwargs=None, **options):
+    """Handle to this node's writer, creating it on first use."""
+    global _writer
+    if _writer is None:
+        node_id = ray.get_runtime_context().get_node_id()
+        _writer = StatusWriterActor.options(
+            name=f"{ACTOR_PREFIX}{node_id}",
+            get_if_exists=True,
+            scheduling_strategy=NodeAffinitySchedulingStrategy(node_id, soft=False),
+        ).remote(db_kwargs, redis_kwargs, **options)
+    return _writer
+
+
+def all_writer_metrics(timeout=None):
+    handles = {name: ray.get_actor(name) for name in ray.util.list_named_actors()
+               if name.startswith(ACTOR_PREFIX)}
+    return dict(zip(handles, ray.get([h.metrics.remote() for h in handles.values()], timeout=timeout)))
@@ -0,0 +1,45 @@
+def rung_iters(min_iters, max_iters, reduction_factor):
+    """Iteration counts at which a trial reports validation loss: r, r*eta, r*eta^2, ... below max_iters."""
+    rungs = []
+    iters = min_iters
+    while iters < max_iters:
+        rungs.append(iters)
+        iters *= reduction_factor
+    return rungs
+
+
+def asha_continue(losses, loss, reduction_factor):
+    """
+    Asynchronous successive halving: a trial continues while its loss is
+    within the best 1/eta of everything recorded at this rung so far.
+    Until eta results exist there is too little evidence, so it continues.
+    """
+    if len(losses) < reduction_factor:
+        return True
+    ranked = sorted(losses)
+    return loss <= ranked[len(ranked) // reduction_factor - 1]
+
+
+def record_rung(conn, sweep_id, experiment_id, rung, iters, val_loss, reduction_factor, final=False):
+    """Stores one rung result and returns the decision: "promote", "stop", or "complete" for the last one."""
+    with conn.cursor() as cur:
+        # Serialise decisions within a sweep so concurrent trials see each other's results
+        cur.execute("SELECT pg_advisory_xact_lock(hashtext(%s))", (sweep_id,))
+        cur.execute(
+            "SELECT val_loss FROM sweep_rungs WHERE sweep_id = %s AND rung = %s AND experiment_id <> %s",
+            (sweep_id, rung, experiment_id)
+        )
+        losses = [row[0] for row in cur.fetchall()] + [val_loss]
+        if final:
+            decision = "complete"
+        else:
+            decision = "promote" if asha_continue(losses, val_loss, reduction_factor) else "stop"
+        cur.execute(
+            "INSERT INTO sweep_rungs (sweep_id, experiment_id, rung, iters, val_loss, decision) "
+            "VALUES (%s, %s, %s, %s, %s, %s) "
+            "ON CONFLICT (experiment_id, rung) DO UPDATE "
+            "SET iters = EXCLUDED.iters, val_loss = EXCLUDED.val_loss, decision = EXCLUDED.decision",
+            (sweep_id, experiment_id, rung, iters, val_loss, decision)
+        )
+    conn.commit()
+    return decision
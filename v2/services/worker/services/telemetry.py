@@ -0,0 +1,131 @@
+import bisect
+import json
+import logging
+import os
+import re
+import time
+from contextlib import contextmanager
+
+from prometheus_client import Counter, Gauge, Histogram
+from prometheus_client.core import CounterMetricFamily, GaugeMetricFamily, HistogramMetricFamily
+
+# Jobs wait and run for seconds to hours; status writes take milliseconds
+JOB_BUCKETS = (0.1, 0.5, 1, 5, 15, 30, 60, 120, 300, 600, 1800, 3600, 7200, 14400)
+WRITE_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+
+QUEUE_WAIT = Histogram("worker_queue_wait_seconds", "Time a job sat in the training_jobs stream before pickup",
+                       buckets=JOB_BUCKETS)
+SCHEDULE_DELAY = Histogram("worker_schedule_delay_seconds", "Ray submit to task start", buckets=JOB_BUCKETS)
+JOB_DURATION = Histogram("worker_job_duration_seconds", "Ray submit to result, by outcome", ["outcome"],
+                         buckets=JOB_BUCKETS)
+JOBS = Counter("worker_jobs_total", "Finished deliveries, by outcome", ["outcome"])
+JOBS_IN_FLIGHT = Gauge("worker_jobs_in_flight", "Jobs submitted to Ray and not yet collected")
+
+LOG_FORMAT = "%(asctime)s %(levelname)s %(name)s: %(message)s"
+
+trace_logger = logging.getLogger("worker.trace")
+
+
+def configure_logging():
+    """
+    Root handler at INFO, so span records aren't dropped. Called by the
+    driver and at the start of each Ray task; repeat calls are no-ops.
+    """
+    logging.basicConfig(level=logging.INFO, format=LOG_FORMAT)
+
+
+def stream_entry_time(msg_id):
+    """Redis stream ids start with the XADD time in milliseconds."""
+    return int(msg_id.split("-", 1)[0]) / 1000
+
+
+class LatencyBuckets:
+    """
+    Cumulative histogram kept inside the status writer actor. The driver reads
+    the counts at scrape time; nothing is sent per observation.
+    """
+
+    def __init__(self, buckets=WRITE_BUCKETS):
+        self.bounds = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+
+    def observe(self, seconds):
+        self.counts[bisect.bisect_left(self.bounds, seconds)] += 1
+        self.sum += seconds
+
+    def snapshot(self):
+        return {"bounds": list(self.bounds), "counts": list(self.counts), "sum": self.sum}
+
+
+class StatusWriterCollector:
+    """Exports every node's status writer (see status_writer.py) when Prometheus scrapes the driver."""
+
+    def __init__(self, fetch):
+        self.fetch = fetch
+
+    def collect(self):
+        latency = HistogramMetricFamily("worker_status_write_seconds", "Status writer Postgres round trips",
+                                        labels=["writer", "operation"])
+        pending = GaugeMetricFamily("worker_status_pending", "Updates waiting for the next flush", labels=["writer"])
+        rows = CounterMetricFamily("worker_status_rows_written", "Experiment rows changed by flushes",
+                                   labels=["writer"])
+        coalesced = CounterMetricFamily("worker_status_coalesced", "Updates superseded before they were written",
+                                        labels=["writer"])
+        errors = CounterMetricFamily("worker_status_errors", "Failed flushes", labels=["writer"])
+        try:
+            writers = self.fetch()
+        except Exception as e:
+            print(f"[METRICS] status writer scrape failed — {e}")
+            writers = {}
+        for name, m in writers.items():
+            for operation, h in m["latency"].items():
+                cumulative, buckets = 0, []
+                for bound, count in zip(h["bounds"] + [float("inf")], h["counts"]):
+                    cumulative += count
+                    buckets.append(("+Inf" if bound == float("inf") else str(bound), cumulative))
+                latency.add_metric([name, operation], buckets, h["sum"])
+            pending.add_metric([name], m["pending"])
+            rows.add_metric([name], m["rows_written"])
+            coalesced.add_metric([name], m["coalesced"])
+            errors.add_metric([name], m["errors"])
+        return [latency, pending, rows, coalesced, errors]
+
+
+TRACEPARENT = re.compile(r"^00-([0-9a-f]{32})-([0-9a-f]{16})-[0-9a-f]{2}$")
+
+
+def job_context(job):
+    """
+    Trace context the gateway put in the job JSON. Jobs enqueued before
+    tracing existed get a fresh trace, stored back on the job so every span
+    of this delivery shares it.
+    """
+    match = TRACEPARENT.match((job.get("trace") or {}).get("traceparent", ""))
+    if match:
+        return {"trace_id": match.group(1), "span_id": match.group(2)}
+    job["trace"] = {"traceparent": f"00-{os.urandom(16).hex()}-{os.urandom(8).hex()}-01"}
+    return job_context(job)
+
+
+def log_span(parent, name, duration_s, span_id=None, **attributes):
+    trace_logger.info(json.dumps({"trace_id": parent["trace_id"], "span_id": span_id or os.urandom(8).hex(),
+                                 "parent_id": parent["span_id"], "name": name,
+                                 "duration_ms": round(duration_s * 1000, 2), **attributes}))
+
+
+@contextmanager
+def span(parent, name, **attributes):
+    """Times the block and logs it as a child of `parent`; yields the context for grandchildren."""
+    context = {"trace_id": parent["trace_id"], "span_id": os.urandom(8).hex()}
+    start = time.perf_counter()
+    error = None
+    try:
+        yield context
+    except BaseException as e:
+        error = repr(e)
+        raise
+    finally:
+        if error is not None:
+            attributes["error"] = error
+        log_span(parent, name, time.perf_counter() - start, span_id=context["span_id"], **attributes)
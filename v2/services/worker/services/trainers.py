@@ -0,0 +1,293 @@
+import glob
+import hashlib
+import json
+import os
+import platform
+import re
+import subprocess
+import sys
+import time
+
+
+def load_texts(data_dir, split="train"):
+    """Assistant turns from an MLX chat-format split (v1's prepare_data.py output)."""
+    path = os.path.join(data_dir, f"{split}.jsonl")
+    texts = []
+    with open(path, "r") as f:
+        for line in f:
+            if line.strip():
+                messages = json.loads(line)["messages"]
+                texts.extend(m["content"] for m in messages if m["role"] == "assistant")
+    if not texts:
+        raise ValueError(f"No assistant turns in {path}")
+    return texts
+
+
+def latest_checkpoint(checkpoint_dir, pattern):
+    paths = sorted(glob.glob(os.path.join(checkpoint_dir, pattern)))
+    return paths[-1] if paths else None
+
+
+class NumpyLoRATrainer:
+    """
+    CPU LoRA on a small byte-level language model, for Linux nodes without MLX.
+
+    The base model (embedding, one hidden projection, output head) is frozen
+    and either loaded from an .npz file or seeded from the model name; only
+    the low-rank A/B matrices on the hidden projection and their Adam state
+    are trained and checkpointed.
+    """
+
+    name = "numpy"
+
+    def __init__(self, hp, checkpoint_dir):
+        import numpy as np
+        self.np = np
+        self.hp = hp
+        self.checkpoint_dir = checkpoint_dir
+        self.base = self._load_base(hp["model"], hp.get("model_dim", 128))
+        d, r = self.base["W"].shape[0], hp["lora_rank"]
+        rng = np.random.default_rng(0)
+        self.scale = hp["lora_alpha"] / r
+        self.params = {"A": rng.normal(0, 1 / np.sqrt(d), (d, r)).astype(np.float32),
+                       "B": np.zeros((r, d), dtype=np.float32)}
+        self.moments = {f"{k}_{m}": np.zeros_like(v) for k, v in self.params.items() for m in ("m", "v")}
+        self.step = 0
+
+    def _load_base(self, model, dim):
+        np = self.np
+        if model.endswith(".npz") and os.path.exists(model):
+            with np.load(model) as f:
+                return {k: f[k].astype(np.float32) for k in ("E", "W", "O")}
+        seed = int(hashlib.sha256(model.encode()).hexdigest()[:8], 16)
+        rng = np.random.default_rng(seed)
+        return {"E": rng.normal(0, 1, (256, dim)).astype(np.float32),
+                "W": rng.normal(0, 1 / np.sqrt(dim), (dim, dim)).astype(np.float32),
+                "O": rng.normal(0, 1 / np.sqrt(dim), (dim, 256)).astype(np.float32)}
+
+    def resume(self):
+        path = latest_checkpoint(self.checkpoint_dir, "step_*.npz")
+        if path is None:
+            return 0
+        with self.np.load(path) as f:
+            for k in self.params:
+                self.params[k] = f[k]
+            for k in self.moments:
+                self.moments[k] = f[k]
+            self.step = int(f["step"])
+        return self.step
+
+    def save(self, final=False):
+        os.makedirs(self.checkpoint_dir, exist_ok=True)
+        name = "adapters.npz" if final else f"step_{self.step:07d}.npz"
+        path = os.path.join(self.checkpoint_dir, name)
+        tmp = path + ".tmp.npz"
+        self.np.savez(tmp, step=self.step, **self.params, **self.moments)
+        os.replace(tmp, path)
+        # Keep the two newest step checkpoints
+        for old in sorted(glob.glob(os.path.join(self.checkpoint_dir, "step_*.npz")))[:-2]:
+            os.remove(old)
+        return path
+
+    def _batch(self, data, rng):
+        np = self.np
+        seq_len = self.hp["max_seq_len"]
+        xs, ys = [], []
+        for i in rng.integers(0, len(data), self.hp["batch_size"]):
+            seq = data[i][:seq_len + 1]
+            xs.append(seq[:-1])
+            ys.append(seq[1:])
+        return np.concatenate(xs), np.concatenate(ys)
+
+    def _forward(self, x, y):
+        np = self.np
+        A, B = self.params["A"], self.params["B"]
+        e = self.base["E"][x]
+        h = np.tanh(e @ (self.base["W"] + self.scale * A @ B))
+        logits = h @ self.base["O"]
+        logits -= logits.max(axis=1, keepdims=True)
+        p = np.exp(logits)
+        p /= p.sum(axis=1, keepdims=True)
+        loss = float(-np.log(p[np.arange(len(y)), y] + 1e-9).mean())
+        return loss, e, h, p
+
+    def _loss_and_grads(self, x, y):
+        np = self.np
+        A, B, s = self.params["A"], self.params["B"], self.scale
+        loss, e, h, p = self._forward(x, y)
+        n = len(y)
+        p[np.arange(n), y] -= 1
+        dz = (p / n) @ self.base["O"].T * (1 - h ** 2)
+        dw = e.T @ dz
+        return loss, {"A": s * dw @ B.T, "B": s * A.T @ dw}
+
+    def _adam(self, grads, lr, b1=0.9, b2=0.999, eps=1e-8):
+        t = self.step
+        for k, g in grads.items():
+            m = self.moments[f"{k}_m"] = b1 * self.moments[f"{k}_m"] + (1 - b1) * g
+            v = self.moments[f"{k}_v"] = b2 * self.moments[f"{k}_v"] + (1 - b2) * g * g
+            self.params[k] -= lr * (m / (1 - b1 ** t)) / (self.np.sqrt(v / (1 - b2 ** t)) + eps)
+
+    def _encode(self, texts):
+        np = self.np
+        data = [np.frombuffer(t.encode(), dtype=np.uint8).astype(np.int64) for t in texts]
+        return [d for d in data if len(d) > 1]
+
+    def validate(self, valid, max_sequences=32):
+        seq_len = self.hp["max_seq_len"]
+        seqs = [d[:seq_len + 1] for d in valid[:max_sequences]]
+        x = self.np.concatenate([d[:-1] for d in seqs])
+        y = self.np.concatenate([d[1:] for d in seqs])
+        return self._forward(x, y)[0]
+
+    def train(self, data_dir, on_step, on_eval=None, eval_every=0):
+        """on_eval(step, val_loss) runs every `eval_every` steps; returning False stops training there."""
+        np = self.np
+        data = self._encode(load_texts(data_dir))
+        valid = self._encode(load_texts(data_dir, "valid")) if on_eval is not None else None
+        rng = np.random.default_rng(self.step)  # a resumed run doesn't replay the same batches
+
+        loss = None
+        self.stopped = False
+        while self.step < self.hp["iters"]:
+            start = time.perf_counter()
+            x, y = self._batch(data, rng)
+            loss, grads = self._loss_and_grads(x, y)
+            self.step += 1
+            self._adam(grads, self.hp["learning_rate"])
+            on_step(self.step, loss, len(x) / (time.perf_counter() - start))
+            if self.step % self.hp["checkpoint_every"] == 0:
+                self.save()
+            at_eval = eval_every and (self.step % eval_every == 0 or self.step == self.hp["iters"])
+            if at_eval and not on_eval(self.step, self.validate(valid)):
+                self.stopped = True
+                break
+        return loss, self.save(final=True)
+
+
+def eval_aligned_runs(start, iters, eval_every):
+    """
+    [(from_step, to_step)] runs covering start..iters. mlx_lm counts from 1
+    again after a resume and evals at multiples of its own count, so a resume
+    point off the eval grid gets a short first run up to the next multiple;
+    every later eval then lands on an absolute multiple of eval_every.
+    """
+    if start >= iters:
+        return []
+    if not eval_every or start % eval_every == 0:
+        return [(start, iters)]
+    aligned = min(iters, (start // eval_every + 1) * eval_every)
+    return [(start, aligned)] + eval_aligned_runs(aligned, iters, eval_every)
+
+
+class MLXLoRATrainer:
+    """
+    Runs mlx_lm.lora as a subprocess (Apple silicon) and parses its report lines.
+
+    mlx_lm restarts its iteration count on --resume-adapter-file, so the step
+    reached so far is tracked in progress.json and only the remaining
+    iterations are requested on resume.
+    """
+
+    name = "mlx"
+    REPORT_RE = re.compile(r"Iter (\d+): Train loss ([\d.]+).*?Tokens/sec ([\d.]+)")
+    VAL_RE = re.compile(r"Iter (\d+): Val loss ([\d.]+)")
+    SAVE_RE = re.compile(r"Iter (\d+): Saved adapter weights")
+
+    def __init__(self, hp, checkpoint_dir):
+        self.hp = hp
+        self.checkpoint_dir = checkpoint_dir
+        self.progress_path = os.path.join(checkpoint_dir, "progress.json")
+        self.step = 0
+
+    def resume(self):
+        if os.path.exists(self.progress_path):
+            with open(self.progress_path, "r") as f:
+                self.step = json.load(f)["step"]
+        return self.step
+
+    def _write_progress(self, step):
+        tmp = self.progress_path + ".tmp"
+        with open(tmp, "w") as f:
+            json.dump({"step": step}, f)
+        os.replace(tmp, self.progress_path)
+
+    def train(self, data_dir, on_step, on_eval=None, eval_every=0):
+        os.makedirs(self.checkpoint_dir, exist_ok=True)
+        # JSON is valid YAML, which is what mlx_lm.lora -c expects
+        config_path = os.path.join(self.checkpoint_dir, "lora_config.yaml")
+        with open(config_path, "w") as f:
+            json.dump({"lora_parameters": {"rank": self.hp["lora_rank"], "scale": self.hp["lora_alpha"] / self.hp["lora_rank"],
+                                           "dropout": 0.0}}, f)
+
+        loss = None
+        self.stopped = False
+        for offset, end in eval_aligned_runs(self.step, self.hp["iters"], eval_every):
+            loss = self._run(data_dir, config_path, offset, end, on_step, on_eval, eval_every) or loss
+            if self.stopped:
+                break
+            self._write_progress(end)
+        return loss, os.path.join(self.checkpoint_dir, "adapters.safetensors")
+
+    def _run(self, data_dir, config_path, offset, end, on_step, on_eval, eval_every):
+        """One mlx_lm.lora process for iterations offset+1..end; returns its last train loss."""
+        cmd = [sys.executable, "-m", "mlx_lm.lora", "--model", self.hp["model"], "--train", "--data", data_dir,
+               "--iters", str(end - offset), "--batch-size", str(self.hp["batch_size"]),
+               "--num-layers", str(self.hp["num_layers"]), "--learning-rate", str(self.hp["learning_rate"]),
+               "--max-seq-length", str(self.hp["max_seq_len"]), "--steps-per-report", str(self.hp["report_every"]),
+               "--save-every", str(self.hp["checkpoint_every"]), "--adapter-path", self.checkpoint_dir,
+               "-c", config_path]
+        if eval_every:
+            # offset is on the eval grid, or this run ends on it (mlx_lm also evals at its last iteration)
+            cmd += ["--steps-per-eval", str(eval_every)]
+        else:
+            cmd += ["--val-batches", "0"]
+        adapter = os.path.join(self.checkpoint_dir, "adapters.safetensors")
+        if offset and os.path.exists(adapter):
+            cmd += ["--resume-adapter-file", adapter]
+
+        loss = None
+        proc = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, text=True,
+                                env={**os.environ, "PYTHONUNBUFFERED": "1"})
+        for line in proc.stdout:
+            report = self.REPORT_RE.search(line)
+            if report:
+                self.step = offset + int(report.group(1))
+                loss = float(report.group(2))
+                on_step(self.step, loss, float(report.group(3)))
+            saved = self.SAVE_RE.search(line)
+            if saved:
+                self._write_progress(offset + int(saved.group(1)))
+            val = self.VAL_RE.search(line)
+            if val and on_eval is not None:
+                step = offset + int(val.group(1))
+                # Skip mlx_lm's eval at its first iteration; only absolute grid points and the end count
+                if step % eval_every and step != self.hp["iters"]:
+                    continue
+                if not on_eval(step, float(val.group(2))):
+                    self.stopped = True
+                    proc.terminate()
+                    break
+        if proc.wait() != 0 and not self.stopped:
+            raise RuntimeError(f"mlx_lm.lora exited with {proc.returncode}")
+        return loss
+
+
+TRAINERS = {"numpy": NumpyLoRATrainer, "mlx": MLXLoRATrainer}
+
+
+def default_trainer():
+    if sys.platform == "darwin" and platform.machine() == "arm64":
+        try:
+            import mlx_lm  # noqa: F401
+            return "mlx"
+        except ImportError:
+            pass
+    return "numpy"
+
+
+def get_trainer(name, hp, checkpoint_dir):
+    name = default_trainer() if name in (None, "auto") else name
+    if name not in TRAINERS:
+        raise ValueError(f"Unknown trainer '{name}'. Choose from: {', '.join(TRAINERS)}")
+    return TRAINERS[name](hp, checkpoint_dir)
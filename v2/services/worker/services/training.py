@@ -1,9 +1,98 @@
+import os
+import sys
 import time
 
+# v1's scripts/ package (artifact store); the image copies it next to worker.py
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..", "..", "..", "v1")))
+
+from scripts.artifacts import ArtifactStore
+from services.sweeps import rung_iters
+from services.trainers import get_trainer
+
+# Same defaults as v1's scripts/train.sh
+DEFAULT_HYPERPARAMETERS = {
+    "model": "mlx-community/Llama-3.2-3B-Instruct-4bit",
+    "trainer": "auto",
+    "iters": 100,
+    "batch_size": 2,
+    "num_layers": 8,
+    "learning_rate": 1e-4,
+    "lora_rank": 8,
+    "lora_alpha": 16,
+    "max_seq_len": 512,
+    "checkpoint_every": 25,
+    "report_every": 10,
+}
+
 
 class TrainingService:
-    def train(self, job):
-        print(f"[TrainingService] Starting training for {job['name']}")
-        time.sleep(5)  # placeholder — real training (Kaggle) goes here later
-        print(f"[TrainingService] Finished training for {job['name']}")
-        return {"final_loss": None, "adapter_path": None}
\ No newline at end of file
+    """
+    Runs LoRA fine-tuning for one experiment job.
+
+    Hyperparameters come from the job (falling back to the train.sh
+    defaults). Checkpoints live under checkpoint_dir/<experiment id>, so a
+    redelivered job picks up from its last checkpoint instead of step 0.
+    Sweep trials report validation loss at each ASHA rung through
+    `on_rung` and stop when it says so. Finished MLX adapters are recorded
+    in the artifact store under the experiment id.
+    """
+
+    def __init__(self, checkpoint_dir, data_dir, artifact_dir=None):
+        self.checkpoint_dir = checkpoint_dir
+        self.data_dir = data_dir
+        self.artifact_dir = artifact_dir
+
+    def hyperparameters(self, job):
+        return {**DEFAULT_HYPERPARAMETERS, **(job.get("hyperparameters") or {})}
+
+    def train(self, job, on_progress=None, on_rung=None):
+        hp = self.hyperparameters(job)
+        trainer = get_trainer(hp["trainer"], hp, os.path.join(self.checkpoint_dir, job["id"]))
+        start_step = trainer.resume()
+        print(f"[TrainingService] {job['name']}: {trainer.name} trainer, "
+              f"{'resuming at step ' + str(start_step) if start_step else 'starting'} of {hp['iters']}")
+
+        started = time.time()
+        last_report = {"step": start_step}
+
+        def on_step(step, loss, tokens_per_sec):
+            last_report.update(step=step, loss=loss, tokens_per_sec=tokens_per_sec)
+            if on_progress is not None and (step % hp["report_every"] == 0 or step == hp["iters"]):
+                on_progress({"step": step, "iters": hp["iters"], "loss": round(loss, 5),
+                             "tokens_per_sec": round(tokens_per_sec, 1), "elapsed_s": round(time.time() - started, 1)})
+
+        sweep = job.get("sweep")
+        if sweep and on_rung is not None:
+            rungs = rung_iters(sweep["min_iters"], hp["iters"], sweep["reduction_factor"])
+            # Every rung is a multiple of min_iters; trainers eval on absolute steps, so resumes don't skip rungs
+            eval_every = sweep["min_iters"]
+
+            def on_eval(step, val_loss):
+                last_report["val_loss"] = val_loss
+                if step == hp["iters"]:
+                    on_rung(len(rungs), step, val_loss, True)
+                elif step in rungs:
+                    return on_rung(rungs.index(step), step, val_loss, False) != "stop"
+                return True
+        else:
+            on_eval, eval_every = None, 0
+
+        final_loss, adapter_path = trainer.train(job.get("data_dir") or self.data_dir, on_step, on_eval, eval_every)
+        stopped = getattr(trainer, "stopped", False)
+        print(f"[TrainingService] {'Stopped early' if stopped else 'Finished training'} for {job['name']} "
+              f"at step {last_report['step']} — loss {final_loss}")
+
+        artifact = None
+        # The numpy trainer's adapter belongs to its own toy model, not hp["model"]; nothing can serve it
+        if self.artifact_dir and not stopped and trainer.name == "mlx":
+            files = [adapter_path]
+            config = os.path.join(os.path.dirname(adapter_path), "adapter_config.json")
+            if os.path.exists(config):
+                files.append(config)
+            artifact = ArtifactStore(self.artifact_dir).put(files, "adapter", job["id"], hp["model"],
+                                                            {"trainer": trainer.name, "final_loss": final_loss, **hp})
+            print(f"[TrainingService] Stored adapter {artifact['id'][:12]} for {job['name']}")
+        return {"final_loss": final_loss, "val_loss": last_report.get("val_loss"), "adapter_path": adapter_path,
+                "artifact_id": artifact["id"] if artifact else None,
+                "trainer": trainer.name, "iters": last_report["step"], "resumed_from": start_step,
+                "stopped_early": stopped, "tokens_per_sec": last_report.get("tokens_per_sec")}
@@ -0,0 +1,5 @@
+import os
+import sys
+
+# Worker modules import as `services.x` and `config`, relative to the service root
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
@@ -0,0 +1,79 @@
+import time
+
+import pytest
+import ray
+
+from services.scheduler import GB, JobScheduler
+
+
+@pytest.fixture(scope="module", autouse=True)
+def cluster():
+    ray.init(num_cpus=2, _memory=4 * GB, include_dashboard=False, log_to_driver=False)
+    yield
+    ray.shutdown()
+
+
+@ray.remote
+def train(job):
+    time.sleep(job.get("seconds", 0.5))
+    return job["id"]
+
+
+def job(i, **resources):
+    return {"id": f"job-{i}", "name": f"job-{i}", "resources": resources, "seconds": 0.5}
+
+
+def drain(scheduler, timeout=10):
+    finished = []
+    deadline = time.monotonic() + timeout
+    while (scheduler.in_flight or scheduler.waiting) and time.monotonic() < deadline:
+        finished += scheduler.collect(timeout=0.2)
+        scheduler.dispatch()
+    return finished
+
+
+def test_submitted_jobs_count_before_ray_schedules_them():
+    scheduler = JobScheduler(train, default_cpus=1, default_memory_gb=1)
+    assert scheduler.free_slots() == 2
+    scheduler.submit("1-0", job(1))
+    scheduler.submit("2-0", job(2))
+    # Ray may not have placed either task yet; the local reservations already fill the cluster
+    assert scheduler.free_slots() == 0
+    assert len(drain(scheduler)) == 2
+    deadline = time.monotonic() + 5
+    while scheduler.free_slots() < 2 and time.monotonic() < deadline:
+        time.sleep(0.05)  # Ray hands finished tasks' resources back asynchronously
+    assert scheduler.free_slots() == 2
+
+
+def test_each_job_is_sized_by_its_own_request():
+    scheduler = JobScheduler(train, default_cpus=1, default_memory_gb=1)
+    scheduler.submit("1-0", job(1, num_cpus=1))
+    scheduler.submit("2-0", job(2, num_cpus=2))
+    scheduler.submit("3-0", job(3, num_cpus=1))
+    # The 2-CPU job doesn't fit beside the first, and the one behind it keeps its place
+    assert len(scheduler.in_flight) == 1
+    assert [msg_id for msg_id, _ in scheduler.waiting] == ["2-0", "3-0"]
+    assert scheduler.free_slots() == 0
+    assert sorted(scheduler.msg_ids()) == ["1-0", "2-0", "3-0"]
+
+    order = [j["id"] for _, j, _ in drain(scheduler)]
+    assert order == ["job-1", "job-2", "job-3"]
+
+
+def test_memory_request_limits_concurrency():
+    scheduler = JobScheduler(train, default_cpus=1, default_memory_gb=1)
+    scheduler.submit("1-0", job(1, memory_gb=3))
+    assert scheduler.free_slots() == 1  # 1 CPU and 1 GB left for a default-sized job
+    scheduler.submit("2-0", job(2, memory_gb=3))
+    assert len(scheduler.in_flight) == 1 and len(scheduler.waiting) == 1
+    assert len(drain(scheduler)) == 2
+
+
+def test_max_in_flight_caps_submissions():
+    scheduler = JobScheduler(train, default_cpus=0.5, default_memory_gb=0.5, max_in_flight=2)
+    assert scheduler.free_slots() == 2
+    for i in range(3):
+        scheduler.submit(f"{i}-0", job(i))
+    assert len(scheduler.in_flight) == 2 and len(scheduler.waiting) == 1
+    assert len(drain(scheduler)) == 3
@@ -0,0 +1,147 @@
+import json
+import os
+
+import pytest
+
+from services import trainers
+from services.trainers import MLXLoRATrainer, eval_aligned_runs
+from services.training import TrainingService
+
+
+def test_eval_aligned_runs():
+    assert eval_aligned_runs(0, 100, 10) == [(0, 100)]
+    assert eval_aligned_runs(30, 100, 10) == [(30, 100)]
+    assert eval_aligned_runs(25, 100, 10) == [(25, 30), (30, 100)]
+    assert eval_aligned_runs(25, 28, 10) == [(25, 28)]
+    assert eval_aligned_runs(25, 100, 0) == [(25, 100)]
+    assert eval_aligned_runs(100, 100, 10) == []
+
+
+class ScriptedLora:
+    """Popen stand-in that prints what mlx_lm.lora would for the iterations it was asked for."""
+
+    calls = []
+
+    def __init__(self, cmd, **kwargs):
+        args = dict(zip(cmd, cmd[1:]))
+        iters, report = int(args["--iters"]), int(args["--steps-per-report"])
+        evals = int(args.get("--steps-per-eval", 0))
+        ScriptedLora.calls.append(cmd)
+        lines = []
+        for it in range(1, iters + 1):
+            if evals and (it == 1 or it % evals == 0 or it == iters):
+                lines.append(f"Iter {it}: Val loss {1.0 / it:.3f}, Val took 0.1s\n")
+            if it % report == 0 or it == iters:
+                lines.append(f"Iter {it}: Train loss 1.000, Learning Rate 1e-4, It/sec 1.0, Tokens/sec 100.0\n")
+        self.stdout = iter(lines)
+        self.returncode = 0
+
+    def terminate(self):
+        pass
+
+    def wait(self):
+        return self.returncode
+
+
+@pytest.fixture
+def scripted(monkeypatch):
+    ScriptedLora.calls = []
+    monkeypatch.setattr(trainers.subprocess, "Popen", ScriptedLora)
+    return ScriptedLora
+
+
+def hyperparameters(**overrides):
+    return {"model": "m", "iters": 100, "batch_size": 1, "num_layers": 1, "learning_rate": 1e-4,
+            "lora_rank": 8, "lora_alpha": 16, "max_seq_len": 64, "checkpoint_every": 25, "report_every": 10,
+            **overrides}
+
+
+def test_mlx_resume_keeps_evals_on_absolute_steps(tmp_path, scripted):
+    (tmp_path / "progress.json").write_text(json.dumps({"step": 25}))
+    trainer = MLXLoRATrainer(hyperparameters(), str(tmp_path))
+    assert trainer.resume() == 25
+
+    evals = []
+    trainer.train("data", lambda *a: None, lambda step, loss: evals.append(step) or True, eval_every=10)
+
+    assert [c[c.index("--iters") + 1] for c in scripted.calls] == ["5", "70"]
+    assert evals == list(range(30, 101, 10))
+    assert json.loads((tmp_path / "progress.json").read_text()) == {"step": 100}
+
+
+def test_mlx_stop_at_rung_ends_the_run(tmp_path, scripted):
+    trainer = MLXLoRATrainer(hyperparameters(), str(tmp_path))
+    trainer.train("data", lambda *a: None, lambda step, loss: step < 30, eval_every=10)
+    assert trainer.stopped
+    assert len(scripted.calls) == 1
+    assert not (tmp_path / "progress.json").exists()  # a stopped trial is never marked finished
+
+
+def write_split(data_dir, split, n):
+    with open(data_dir / f"{split}.jsonl", "w") as f:
+        for i in range(n):
+            f.write(json.dumps({"messages": [{"role": "user", "content": f"q{i}"},
+                                             {"role": "assistant", "content": f"ARCHITECTURE: A{i} -> B{i}"}]}) + "\n")
+
+
+def test_resumed_sweep_trial_reports_every_rung(tmp_path):
+    data_dir = tmp_path / "data"
+    data_dir.mkdir()
+    write_split(data_dir, "train", 8)
+    write_split(data_dir, "valid", 4)
+    job = {"id": "exp-1", "name": "trial", "sweep": {"min_iters": 10, "reduction_factor": 3},
+           "hyperparameters": {"trainer": "numpy", "model": "toy", "iters": 100, "max_seq_len": 32,
+                               "checkpoint_every": 25, "model_dim": 16}}
+    service = TrainingService(str(tmp_path / "checkpoints"), str(data_dir))
+
+    def crash_at_40(progress):
+        if progress["step"] == 40:
+            raise KeyboardInterrupt
+
+    first = []
+    with pytest.raises(KeyboardInterrupt):
+        service.train(job, on_progress=crash_at_40, on_rung=lambda *a: first.append(a[:2]) or "promote")
+    assert first == [(0, 10), (1, 30)]
+
+    second = []
+    result = service.train(job, on_rung=lambda *a: second.append(a[:2]) or "promote")
+    # Resumed from the step-25 checkpoint, so rung 1 (30 iters) is reported again before 90 and the end
+    assert result["resumed_from"] == 25
+    assert second == [(1, 30), (2, 90), (3, 100)]
+
+
+def test_finished_adapter_is_stored_under_the_experiment(tmp_path, scripted):
+    from scripts.artifacts import ArtifactStore
+
+    checkpoint_dir = tmp_path / "checkpoints" / "exp-2"
+    checkpoint_dir.mkdir(parents=True)
+    (checkpoint_dir / "adapters.safetensors").write_bytes(b"weights")  # what mlx_lm.lora leaves behind
+    job = {"id": "exp-2", "name": "stored", "hyperparameters": {"trainer": "mlx", "model": "some/base", "iters": 5}}
+    service = TrainingService(str(tmp_path / "checkpoints"), "data", str(tmp_path / "store"))
+
+    result = service.train(job)
+
+    store = ArtifactStore(str(tmp_path / "store"))
+    assert store.for_experiment("exp-2")["id"] == result["artifact_id"]
+    base, adapter = store.resolve("experiment:exp-2")
+    assert base == "some/base"
+    assert os.listdir(adapter) == ["adapters.safetensors"]
+
+
+def test_numpy_adapter_is_not_stored(tmp_path):
+    from scripts.artifacts import ArtifactStore
+
+    data_dir = tmp_path / "data"
+    data_dir.mkdir()
+    write_split(data_dir, "train", 8)
+    write_split(data_dir, "valid", 4)
+    job = {"id": "exp-3", "name": "toy",
+           "hyperparameters": {"trainer": "numpy", "model": "some/base", "iters": 5, "max_seq_len": 32,
+                               "model_dim": 16}}
+    service = TrainingService(str(tmp_path / "checkpoints"), str(data_dir), str(tmp_path / "store"))
+
+    result = service.train(job)
+
+    assert result["artifact_id"] is None
+    with pytest.raises(KeyError):
+        ArtifactStore(str(tmp_path / "store")).for_experiment("exp-3")
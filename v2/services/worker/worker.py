@@ -1,68 +1,159 @@
 import redis
-import json
+import os
+import socket
 import time
+import uuid
 import ray
-import psycopg2
+from prometheus_client import REGISTRY, start_http_server
 from services.training import TrainingService
 from services.status import ExperimentStatus
+from services.scheduler import JobScheduler
+from services.queue import JobQueue
+from services.status_writer import all_writer_metrics, get_status_writer
+from services.telemetry import (JOB_DURATION, JOBS, JOBS_IN_FLIGHT, QUEUE_WAIT, SCHEDULE_DELAY,
+                                StatusWriterCollector, configure_logging, job_context, log_span, span,
+                                stream_entry_time)
 from config import settings
 
+configure_logging()
 ray.init()
 
 redis_client = redis.Redis(host=settings.redis_host, port=settings.redis_port, decode_responses=True)
-training_service = TrainingService()
+training_service = TrainingService(settings.checkpoint_dir, settings.training_data_dir, settings.artifact_dir)
 
 
-def get_db_connection():
-    return psycopg2.connect(
-        host=settings.postgres_host,
-        dbname=settings.postgres_db,
-        user=settings.postgres_user,
-        password=settings.postgres_password
-    )
+DB = {
+    "host": settings.postgres_host,
+    "dbname": settings.postgres_db,
+    "user": settings.postgres_user,
+    "password": settings.postgres_password,
+}
 
 
-def update_status(experiment_id, status, mark_completed=False):
-    conn = get_db_connection()
-    cur = conn.cursor()
+def status_writer():
+    return get_status_writer(DB, {"host": settings.redis_host, "port": settings.redis_port},
+                             flush_interval_s=settings.status_flush_interval_s,
+                             max_batch=settings.status_max_batch, pool_size=settings.status_pool_size)
+
+
+def claim_experiment(experiment_id, lease):
+    """
+    Takes ownership of an experiment for one delivery. Returns False if it
+    already reached a terminal status, so a redelivered job is not retrained.
+    """
+    return ray.get(status_writer().claim.remote(experiment_id, lease))
+
+
+def update_status(experiment_id, status, lease=None, mark_completed=False, progress=None):
+    """
+    Writes are fenced on the lease: once a job has been reclaimed by another
+    worker, updates from the stale owner match no row and are dropped.
+    Without a lease only non-terminal rows are touched. Terminal states are
+    flushed before returning so the queue ack never gets ahead of the row.
+    """
+    ref = status_writer().update.remote(experiment_id, status, lease, mark_completed, progress, flush=mark_completed)
     if mark_completed:
-        cur.execute(
-            "UPDATE experiments SET status = %s, completed_at = NOW() WHERE id = %s",
-            (status, experiment_id)
-        )
-    else:
-        cur.execute(
-            "UPDATE experiments SET status = %s WHERE id = %s",
-            (status, experiment_id)
-        )
-    conn.commit()
-    cur.close()
-    conn.close()
+        ray.get(ref)
+
+
+def train_claimed(job, trace):
+    with span(trace, "claim"):
+        claimed = claim_experiment(job["id"], job["lease"])
+    if not claimed:
+        print(f"[SKIPPED] {job['name']} ({job['id']}) — already finished")
+        return None
+
+    def report(progress):
+        # Coalesced by the node's status writer; only the latest step per experiment reaches Postgres
+        status_writer().update.remote(job["id"], lease=job["lease"], progress=progress)
+
+    def rung(index, iters, val_loss, final):
+        sweep = job["sweep"]
+        return ray.get(status_writer().rung_decision.remote(
+            sweep["id"], job["id"], index, iters, val_loss, sweep["reduction_factor"], final))
+
+    print(f"[TRAINING STARTED] {job['name']} ({job['id']}) trace={trace['trace_id']}")
+    with span(trace, "train"):
+        result = training_service.train(job, on_progress=report, on_rung=rung)
+    status = ExperimentStatus.STOPPED if result["stopped_early"] else ExperimentStatus.COMPLETED
+    with span(trace, "write_final_status", status=status):
+        update_status(job["id"], status, lease=job["lease"], mark_completed=True, progress=result)
+    print(f"[TRAINING {status.upper()}] {job['name']} ({job['id']})")
+    return result
 
 
 @ray.remote
 def run_training_job(job):
-    print(f"[TRAINING STARTED] {job['name']} ({job['id']})")
-    update_status(job["id"], ExperimentStatus.TRAINING)
-
-    try:
-        result = training_service.train(job)
-        update_status(job["id"], ExperimentStatus.COMPLETED, mark_completed=True)
-        print(f"[TRAINING COMPLETE] {job['name']} ({job['id']})")
-        return result
-
-    except Exception as e:
-        print(f"[TRAINING FAILED] {job['name']} ({job['id']}) — {e}")
-        update_status(job["id"], ExperimentStatus.FAILED, mark_completed=True)
-        return None
+    configure_logging()  # Ray worker processes start without a root handler
+    schedule_delay = time.time() - job["submitted_at"]
+    with span(job_context(job), "run_training_job", experiment_id=job["id"], attempt=job.get("attempts", 0),
+              schedule_delay_ms=round(schedule_delay * 1000, 1)) as trace:
+        result = train_claimed(job, trace)
+    # The driver turns this into worker_schedule_delay_seconds; it is not part of the stored progress
+    return {**result, "schedule_delay_s": schedule_delay} if result is not None else None
+
+
+def mark_dead(job):
+    update_status(job["id"], ExperimentStatus.FAILED, mark_completed=True)
+
 
+consumer = settings.worker_name or f"{socket.gethostname()}-{os.getpid()}"
+job_queue = JobQueue(redis_client, "training_jobs", "workers", consumer, settings.visibility_timeout_s,
+                     settings.max_attempts, on_dead_letter=mark_dead)
+job_queue.ensure_group()
+scheduler = JobScheduler(run_training_job, settings.job_num_cpus, settings.job_memory_gb,
+                         settings.max_jobs_in_flight)
 
-print("Worker started. Watching queue: training_jobs")
+if settings.metrics_port:
+    REGISTRY.register(StatusWriterCollector(lambda: all_writer_metrics(timeout=settings.metrics_scrape_timeout_s)))
+    start_http_server(settings.metrics_port)
+
+print(f"Worker {consumer} started. Consuming stream: training_jobs")
+
+heartbeat_every = settings.visibility_timeout_s / 3
+last_heartbeat = last_metrics = time.monotonic()
 
 while True:
-    _, raw_job = redis_client.brpop("training_jobs")
-    job = json.loads(raw_job)
-    print(f"[PICKED UP] {job['name']}")
+    # Fill free slots; wait on Redis for long only while nothing is running
+    slots = scheduler.free_slots()
+    if slots:
+        for msg_id, job in job_queue.fetch(slots, block_ms=1000 if scheduler.in_flight else 5000):
+            job["lease"] = str(uuid.uuid4())
+            queued = time.time() - stream_entry_time(msg_id)
+            QUEUE_WAIT.observe(max(queued, 0))
+            log_span(job_context(job), "queue_wait", queued, experiment_id=job["id"], msg_id=msg_id)
+            scheduler.submit(msg_id, job)
+            print(f"[PICKED UP] {job['name']} ({len(scheduler.in_flight)} in flight, "
+                  f"{len(scheduler.waiting)} waiting for resources)")
+
+    for msg_id, job, outcome in scheduler.collect(timeout=0 if slots else 1.0):
+        failed = isinstance(outcome, Exception)
+        JOB_DURATION.labels("failed" if failed else "ok").observe(time.time() - job["submitted_at"])
+        if not failed:
+            if outcome is not None:
+                SCHEDULE_DELAY.observe(outcome["schedule_delay_s"])
+            JOBS.labels("completed" if outcome is not None else "skipped").inc()
+            job_queue.ack(msg_id)
+            continue
+        print(f"[TRAINING FAILED] {job['name']} ({job['id']}) — {outcome}")
+        # Out of attempts: retry() dead-letters the job and mark_dead fails the experiment
+        if job_queue.retry(msg_id, job, repr(outcome)):
+            JOBS.labels("retried").inc()
+            update_status(job["id"], ExperimentStatus.QUEUED, lease=job["lease"])
+        else:
+            JOBS.labels("dead_lettered").inc()
+    # Resources freed by finished jobs go to jobs fetched earlier that didn't fit yet
+    scheduler.dispatch()
+    JOBS_IN_FLIGHT.set(len(scheduler.in_flight))
+
+    # Keep long-running jobs from looking abandoned to other workers
+    if time.monotonic() - last_heartbeat > heartbeat_every:
+        job_queue.heartbeat(scheduler.msg_ids())
+        last_heartbeat = time.monotonic()
 
-    future = run_training_job.remote(job)
-    ray.get(future)
\ No newline at end of file
+    if time.monotonic() - last_metrics > settings.status_metrics_every_s:
+        for name, m in all_writer_metrics().items():
+            print(f"[STATUS WRITER] {name}: {m['rows_written']} rows in {m['flushes']} flushes, "
+                  f"{m['coalesced']} coalesced, {m['pending']} pending, flush p50/p95 "
+                  f"{m['flush_p50_ms']}/{m['flush_p95_ms']} ms, {m['errors']} errors")
+        last_metrics = time.monotonic()